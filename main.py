@@ -28,30 +28,6 @@ from petitbrain import Flock
 from petitbrain.constants import TRACE_HEADERS, TRACE_FILE
 import os
 
-# Try to fix some mouse-press issue on Mac but it does not solve the problem
-# https://github.com/pyglet/pyglet/issues/171
-pyglet.options['osx_alt_loop'] = True
-
-# Configure the logger
-
-# File handler formatter
-file_formatter = logging.Formatter('%(message)s')
-# Console handler formatter
-console_formatter = logging.Formatter('TRACE: %(message)s')
-# console_formatter = logging.Formatter('%(levelname)s: %(name)s: %(message)s')
-# Create the log directory if it does not exist to avoid error
-if not os.path.exists("log"):
-    os.makedirs("log")
-# File handler
-file_handler = logging.FileHandler(TRACE_FILE)
-file_handler.setLevel(logging.INFO)  # Set the log level for the file
-file_handler.setFormatter(file_formatter)
-# Console handler
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)  # Set the log level for the console
-console_handler.setFormatter(console_formatter)
-logging.basicConfig(level=logging.INFO, handlers=[file_handler, console_handler])
-
 
 # Define a custom processor to format the log into a CSV row
 def csv_processor(logger, method_name, event_dict):
@@ -61,32 +37,57 @@ def csv_processor(logger, method_name, event_dict):
     return ','.join(values)
 
 
-# Configure structlog
-structlog.configure(
-    processors=[
-        structlog.processors.TimeStamper(fmt="%H:%M:%S", utc=False),
-        csv_processor
-    ],
-    logger_factory=structlog.stdlib.LoggerFactory(),
-    wrapper_class=structlog.stdlib.BoundLogger,
-    cache_logger_on_first_use=True,
-)
-# Reset the trace file
-with open(TRACE_FILE, mode='w', newline='') as file:
-    csv_writer = csv.writer(file)
-    csv_writer.writerow(TRACE_HEADERS)
+# The plot worker process is spawned and imports this module: do not start the GUI again
+if __name__ == "__main__":
+    # Try to fix some mouse-press issue on Mac but it does not solve the problem
+    # https://github.com/pyglet/pyglet/issues/171
+    pyglet.options['osx_alt_loop'] = True
+
+    # Configure the logger
+
+    # File handler formatter
+    file_formatter = logging.Formatter('%(message)s')
+    # Console handler formatter
+    console_formatter = logging.Formatter('TRACE: %(message)s')
+    # console_formatter = logging.Formatter('%(levelname)s: %(name)s: %(message)s')
+    # Create the log directory if it does not exist to avoid error
+    if not os.path.exists("log"):
+        os.makedirs("log")
+    # File handler
+    file_handler = logging.FileHandler(TRACE_FILE)
+    file_handler.setLevel(logging.INFO)  # Set the log level for the file
+    file_handler.setFormatter(file_formatter)
+    # Console handler
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)  # Set the log level for the console
+    console_handler.setFormatter(console_formatter)
+    logging.basicConfig(level=logging.INFO, handlers=[file_handler, console_handler])
 
+    # Configure structlog
+    structlog.configure(
+        processors=[
+            structlog.processors.TimeStamper(fmt="%H:%M:%S", utc=False),
+            csv_processor
+        ],
+        logger_factory=structlog.stdlib.LoggerFactory(),
+        wrapper_class=structlog.stdlib.BoundLogger,
+        cache_logger_on_first_use=True,
+    )
+    # Reset the trace file
+    with open(TRACE_FILE, mode='w', newline='') as file:
+        csv_writer = csv.writer(file)
+        csv_writer.writerow(TRACE_HEADERS)
 
-# Check for the presence of the launch arguments
-if len(sys.argv) < 3:  # Argument 0 is "main.py" when launched in -m mode
-    print("Please provide the arena ID and the robot ID as arguments")
-    exit()
+    # Check for the presence of the launch arguments
+    if len(sys.argv) < 3:  # Argument 0 is "main.py" when launched in -m mode
+        print("Please provide the arena ID and the robot ID as arguments")
+        exit()
 
-# Initialize the flock of robots
-flock = Flock(sys.argv)
+    # Initialize the flock of robots
+    flock = Flock(sys.argv)
 
-# Schedule the GUI update every 100ms
-pyglet.clock.schedule_interval(flock.main, 0.1)
+    # Schedule the GUI update every 100ms
+    pyglet.clock.schedule_interval(flock.main, 0.1)
 
-# Launch the GUI
-pyglet.app.run()
+    # Launch the GUI
+    pyglet.app.run()
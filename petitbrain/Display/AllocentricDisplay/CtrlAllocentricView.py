@@ -1,5 +1,4 @@
 import time
-import numpy as np
 from pyglet.window import key, mouse
 from .AllocentricView import AllocentricView
 from ...Memory.AllocentricMemory.Geometry import point_to_cell
@@ -7,8 +6,8 @@ from ...Memory.AllocentricMemory.Geometry import point_to_cell
 from ...Enaction import ENACTION_STEP_RENDERING, ENACTION_STEP_ENACTING
 from ...Memory.EgocentricMemory.Experience import EXPERIENCE_FLOOR, EXPERIENCE_ALIGNED_ECHO
 from ...Memory.AllocentricMemory.AllocentricMemory import CELL_UNKNOWN
-from ...Memory.AllocentricMemory import STATUS_FLOOR, STATUS_2, STATUS_ECHO, STATUS_3, STATUS_4, COLOR_INDEX, CLOCK_FOCUS, \
-    CLOCK_PLACE, PHENOMENON_ID, PLACE_CELL_ID, CLOCK_UPDATED, CLOCK_PROMPT
+from ...Memory.AllocentricMemory import STATUS_FLOOR, STATUS_ECHO, STATUS_4, COLOR_INDEX, CLOCK_FOCUS, CLOCK_PLACE, \
+    PHENOMENON_ID, PLACE_CELL_ID, CLOCK_UPDATED
 from ...Memory import PLACE_GRID_DURABILITY
 from ..CtrlWindow import KEY_SAVE
 
@@ -20,6 +19,11 @@ class CtrlAllocentricView:
         self.view = AllocentricView()
         self.view.set_caption("Allocentric " + workspace.robot_id)
         self.next_time_refresh = 0
+        # The allocentric memory and its write count at the last update of the view
+        self.synced_memory = None
+        self.synced_write_count = -1
+        # The cells updated during the max durability lapse keep fading
+        self.recent_cells = set()
 
         # Handlers of event functions that need access to workspace
         def on_text(text):
@@ -35,11 +39,14 @@ class CtrlAllocentricView:
         def on_mouse_press(x, y, button, modifiers):
             """Display the label of this cell"""
             click_point = self.view.mouse_coordinates_to_point(x, y)
-            cell_x, cell_y = point_to_cell(click_point)
-            selected_cell = self.workspace.memory.allocentric_memory.grid[cell_x][cell_y]
+            allocentric_memory = self.workspace.memory.allocentric_memory
+            cell_x, cell_y = point_to_cell(click_point, allocentric_memory.cell_radius, not allocentric_memory.is_tiled)
+            selected_cell = self.workspace.memory.allocentric_memory.grid[cell_x, cell_y]
 
             # Change cell status
             if button == mouse.RIGHT:
+                # The grid may be shared with a memory snapshot
+                grid = self.workspace.memory.allocentric_memory.own_grid()
                 # SHIFT clear the cell and the prompts
                 if modifiers & key.MOD_SHIFT:
                     self.delete_prompt()
@@ -50,8 +57,8 @@ class CtrlAllocentricView:
                 # CTRL ALT: toggle COLOR FLOOR
                 elif modifiers & key.MOD_CTRL and modifiers & key.MOD_ALT:
                     if selected_cell[STATUS_FLOOR] == EXPERIENCE_FLOOR and selected_cell[COLOR_INDEX] > 0:
-                        selected_cell[STATUS_FLOOR] = CELL_UNKNOWN
-                        selected_cell[COLOR_INDEX] = 0
+                        grid[cell_x, cell_y, STATUS_FLOOR] = CELL_UNKNOWN
+                        grid[cell_x, cell_y, COLOR_INDEX] = 0
                         #cell.color_index = 0
                         if (cell_x, cell_y) in self.workspace.memory.allocentric_memory.user_cells:
                             self.workspace.memory.allocentric_memory.user_cells.remove((cell_x, cell_y))
@@ -63,7 +70,7 @@ class CtrlAllocentricView:
                 # CTRL: Toggle FLOOR
                 elif modifiers & key.MOD_CTRL:
                     if selected_cell[STATUS_FLOOR] == EXPERIENCE_FLOOR and selected_cell[COLOR_INDEX] == 0:
-                        selected_cell[STATUS_FLOOR] = CELL_UNKNOWN
+                        grid[cell_x, cell_y, STATUS_FLOOR] = CELL_UNKNOWN
                         if (cell_x, cell_y) in self.workspace.memory.allocentric_memory.user_cells:
                             self.workspace.memory.allocentric_memory.user_cells.remove((cell_x, cell_y))
                     else:
@@ -74,8 +81,8 @@ class CtrlAllocentricView:
                 # ALT: Toggle ECHO
                 elif modifiers & key.MOD_ALT:
                     if selected_cell[STATUS_ECHO] == EXPERIENCE_ALIGNED_ECHO:
-                        selected_cell[STATUS_ECHO] = CELL_UNKNOWN
-                        selected_cell[COLOR_INDEX] = 0
+                        grid[cell_x, cell_y, STATUS_ECHO] = CELL_UNKNOWN
+                        grid[cell_x, cell_y, COLOR_INDEX] = 0
                         if (cell_x, cell_y) in self.workspace.memory.allocentric_memory.user_cells:
                             self.workspace.memory.allocentric_memory.user_cells.remove((cell_x, cell_y))
                     else:
@@ -92,15 +99,18 @@ class CtrlAllocentricView:
                     ego_point = self.workspace.memory.allocentric_to_egocentric(click_point)
                     self.workspace.memory.egocentric_memory.prompt_point = ego_point
 
+                # The cell may have been written directly
+                self.workspace.memory.allocentric_memory.mark_changed((cell_x, cell_y))
                 self.update_view()
 
             # Display this phenomenon in phenomenon window
-            # if self.workspace.memory.allocentric_memory.grid[cell_x][cell_y][PHENOMENON_ID] != -1:
-            #     self.workspace.ctrl_phenomenon_view.view.set_caption(f"Phenomenon {self.workspace.memory.allocentric_memory.grid[cell_x][cell_y][PHENOMENON_ID]}")
-            #     self.workspace.ctrl_phenomenon_view.phenomenon_id = self.workspace.memory.allocentric_memory.grid[cell_x][cell_y][PHENOMENON_ID]
+            # if self.workspace.memory.allocentric_memory.grid[cell_x, cell_y, PHENOMENON_ID] != -1:
+            #     self.workspace.ctrl_phenomenon_view.view.set_caption(f"Phenomenon {self.workspace.memory.allocentric_memory.grid[cell_x, cell_y, PHENOMENON_ID]}")
+            #     self.workspace.ctrl_phenomenon_view.phenomenon_id = self.workspace.memory.allocentric_memory.grid[cell_x, cell_y, PHENOMENON_ID]
             #     self.workspace.ctrl_phenomenon_view.update_affordance_displays()
 
-            # Display the grid cell status
+            # Display the grid cell status (selected_cell is a copy that may have been modified)
+            selected_cell = self.workspace.memory.allocentric_memory.grid[cell_x, cell_y]
             self.view.label2.text = f"Place {selected_cell[PLACE_CELL_ID]} " \
                                     f"Phen. {selected_cell[PHENOMENON_ID]} " \
                                     f"Update {selected_cell[CLOCK_UPDATED]} " \
@@ -130,22 +140,26 @@ class CtrlAllocentricView:
     def update_view(self):
         """Update the allocentric view from the status in the allocentric grid cells"""
         start_time = time.time()
-        # Select the cells that have been updated during the max durability lapse
-        # updated_ij = np.where(self.workspace.memory.allocentric_memory.grid[:, :, STATUS_0:CLOCK_PLACE+1] != 0)
-        updated_ij = np.where((self.workspace.memory.allocentric_memory.grid[:, :, CLOCK_UPDATED]
-                               >= self.workspace.memory.clock - PLACE_GRID_DURABILITY) & (
-                              (self.workspace.memory.allocentric_memory.grid[:, :, STATUS_FLOOR] != 0)
-                              | (self.workspace.memory.allocentric_memory.grid[:, :, STATUS_ECHO] != 0)
-                              | (self.workspace.memory.allocentric_memory.grid[:, :, STATUS_2] != 0)
-                              | (self.workspace.memory.allocentric_memory.grid[:, :, STATUS_3] != 0)
-                              | (self.workspace.memory.allocentric_memory.grid[:, :, CLOCK_FOCUS] >=
-                                 self.workspace.memory.clock - PLACE_GRID_DURABILITY)
-                              | (self.workspace.memory.allocentric_memory.grid[:, :, CLOCK_PROMPT] >=
-                                 self.workspace.memory.clock - PLACE_GRID_DURABILITY)))
-        for i, j in zip(updated_ij[0], updated_ij[1]):
-            self.view.update_hexagon(i, j, self.workspace.memory.allocentric_memory.grid[i][j][:],
-                                     self.workspace.memory.clock)
-        # print(f"Update alloview: {len(updated_ij[0])} cells in {time.time() - start_time:.3f} seconds")
+        allocentric_memory = self.workspace.memory.allocentric_memory
+        clock = self.workspace.memory.clock
+        # If the memory has been replaced by a memory snapshot, the snapshot shares the write stamps until it was saved.
+        # Only refresh the cells written in the replaced memory or in the snapshot since then.
+        # A new grid was never saved from the replaced memory and a rolled grid has all its cells written.
+        if allocentric_memory is not self.synced_memory:
+            if self.synced_memory is not None:
+                self.synced_write_count = min(self.synced_write_count, allocentric_memory.saved_write_count)
+                replaced_i, replaced_j, _ = self.synced_memory.changed_cells(self.synced_write_count)
+                self.recent_cells.update(zip(replaced_i.tolist(), replaced_j.tolist()))
+            self.synced_memory = allocentric_memory
+        # Pull the cells changed since the last update
+        changed_i, changed_j, self.synced_write_count = allocentric_memory.changed_cells(self.synced_write_count)
+        self.recent_cells.update(zip(changed_i.tolist(), changed_j.tolist()))
+        for i, j in self.recent_cells:
+            self.view.update_hexagon(i, j, allocentric_memory.grid[i, j], clock)
+        # Stop refreshing the cells that have not been updated during the max durability lapse
+        self.recent_cells = {(i, j) for i, j in self.recent_cells
+                             if allocentric_memory.grid[i, j, CLOCK_UPDATED] >= clock - PLACE_GRID_DURABILITY}
+        # print(f"Update alloview: {len(changed_i)} cells in {time.time() - start_time:.3f} seconds")
 
         # Update the other robot
         # if ROBOT1 in self.workspace.memory.phenomenon_memory.phenomena:
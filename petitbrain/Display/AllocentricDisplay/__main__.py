@@ -27,32 +27,32 @@ workspace.memory.body_memory.body_quaternion = Quaternion.from_z_rotation(math.p
 i, j = point_to_cell([250, 200], CELL_RADIUS)
 workspace.memory.allocentric_memory.apply_status_to_cell(i, j, EXPERIENCE_ALIGNED_ECHO, 0, 0)
 # Add focus
-workspace.memory.allocentric_memory.grid[i][j][STATUS_3] = EXPERIENCE_FOCUS
+workspace.memory.allocentric_memory.grid[i, j, STATUS_3] = EXPERIENCE_FOCUS
 # Add no echo
-workspace.memory.allocentric_memory.grid[1][5][STATUS_2] = CELL_NO_ECHO
+workspace.memory.allocentric_memory.grid[1, 5, STATUS_2] = CELL_NO_ECHO
 
 # Add place
-workspace.memory.allocentric_memory.grid[1][0][STATUS_FLOOR] = EXPERIENCE_PLACE
-workspace.memory.allocentric_memory.grid[1][2][STATUS_FLOOR] = EXPERIENCE_FLOOR
-workspace.memory.allocentric_memory.grid[-1][-2][STATUS_FLOOR] = EXPERIENCE_PLACE
-workspace.memory.allocentric_memory.grid[-1][-3][STATUS_FLOOR] = EXPERIENCE_PLACE
+workspace.memory.allocentric_memory.grid[1, 0, STATUS_FLOOR] = EXPERIENCE_PLACE
+workspace.memory.allocentric_memory.grid[1, 2, STATUS_FLOOR] = EXPERIENCE_FLOOR
+workspace.memory.allocentric_memory.grid[-1, -2, STATUS_FLOOR] = EXPERIENCE_PLACE
+workspace.memory.allocentric_memory.grid[-1, -3, STATUS_FLOOR] = EXPERIENCE_PLACE
 
 # Pool cells
-workspace.memory.allocentric_memory.grid[-2][1][STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
-workspace.memory.allocentric_memory.grid[-1][-4][STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
-workspace.memory.allocentric_memory.grid[0][0][STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
-workspace.memory.allocentric_memory.grid[0][5][STATUS_ECHO] = EXPERIENCE_PLACE
-workspace.memory.allocentric_memory.grid[0][-5][STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
-workspace.memory.allocentric_memory.grid[1][4][STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
-workspace.memory.allocentric_memory.grid[1][-6][STATUS_FLOOR] = EXPERIENCE_PLACE
-workspace.memory.allocentric_memory.grid[1][-1][STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
-workspace.memory.allocentric_memory.grid[2][-2][STATUS_FLOOR] = EXPERIENCE_PLACE
-workspace.memory.allocentric_memory.grid[2][3][STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
-workspace.memory.allocentric_memory.grid[3][2][STATUS_FLOOR] = EXPERIENCE_PLACE
-workspace.memory.allocentric_memory.grid[3][-2][STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
-workspace.memory.allocentric_memory.grid[4][2][STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
-workspace.memory.allocentric_memory.grid[2][-6][STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
-workspace.memory.allocentric_memory.grid[3][-7][STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
+workspace.memory.allocentric_memory.grid[-2, 1, STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
+workspace.memory.allocentric_memory.grid[-1, -4, STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
+workspace.memory.allocentric_memory.grid[0, 0, STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
+workspace.memory.allocentric_memory.grid[0, 5, STATUS_ECHO] = EXPERIENCE_PLACE
+workspace.memory.allocentric_memory.grid[0, -5, STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
+workspace.memory.allocentric_memory.grid[1, 4, STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
+workspace.memory.allocentric_memory.grid[1, -6, STATUS_FLOOR] = EXPERIENCE_PLACE
+workspace.memory.allocentric_memory.grid[1, -1, STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
+workspace.memory.allocentric_memory.grid[2, -2, STATUS_FLOOR] = EXPERIENCE_PLACE
+workspace.memory.allocentric_memory.grid[2, 3, STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
+workspace.memory.allocentric_memory.grid[3, 2, STATUS_FLOOR] = EXPERIENCE_PLACE
+workspace.memory.allocentric_memory.grid[3, -2, STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
+workspace.memory.allocentric_memory.grid[4, 2, STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
+workspace.memory.allocentric_memory.grid[2, -6, STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
+workspace.memory.allocentric_memory.grid[3, -7, STATUS_ECHO] = EXPERIENCE_ALIGNED_ECHO
 
 # Other robot
 pose_matrix = quaternion_translation_to_matrix(Quaternion.from_z_rotation(math.radians(170)), [0, 0, 0])
@@ -3,6 +3,7 @@ import numpy as np
 from .InteractiveWindow import InteractiveWindow
 from pyglet.window import key
 from ..Memory.PlaceMemory.PlaceGeometry import compare_all_place_cells
+from ..Memory.PhenomenonMemory.PhenomenonMemory import TER
 from ..Enaction import KEY_ENGAGEMENT_ROBOT, KEY_CONTROL_DECIDER, KEY_ENGAGEMENT_IMAGINARY
 from ..Proposer.Action import create_actions, ACTION_FORWARD, ACTIONS, ACTION_TURN, ACTION_BACKWARD
 from ..Enaction.CompositeEnaction import CompositeEnaction
@@ -72,7 +73,7 @@ class CtrlWindow:
         elif user_key.upper() in ACTIONS:
             i0 = self.workspace.primitive_interactions[(user_key.upper(), OUTCOME_PROMPT)]
             self.workspace.manual_composite_interaction = CompositeEnaction(
-                None, 'Manual', np.array([1, 1, 1]), [i0], self.workspace.memory.save())
+                None, 'Manual', np.array([1, 1, 1]), [i0], self.workspace.memory.save(is_prediction=True))
             # if the stack is empty then add this interaction to the stack
             if self.workspace.composite_enaction is None:
                 self.workspace.composite_enaction = self.workspace.manual_composite_interaction
@@ -84,7 +85,7 @@ class CtrlWindow:
             # If key ALIGN then turn and move forward to the prompt
             self.workspace.manual_composite_interaction = CompositeEnaction(
                 None, 'Manual', np.array([1, 1, 1]), self.workspace.sequence_interactions["TF-P"],
-                self.workspace.memory.save())
+                self.workspace.memory.save(is_prediction=True))
             if self.workspace.composite_enaction is None:
                 self.workspace.composite_enaction = self.workspace.manual_composite_interaction
                 self.workspace.manual_composite_interaction = None
@@ -94,7 +95,7 @@ class CtrlWindow:
             # if self.enacter.interaction_step == ENACTION_STEP_IDLE:
                 # The first enaction: turn the back to the prompt
                 i0 = self.workspace.primitive_interactions[(ACTION_TURN, OUTCOME_PROMPT)]
-                e0 = Enaction(i0, self.workspace.memory.save(), direction=DIRECTION_BACK)
+                e0 = Enaction(i0, self.workspace.memory.save(is_prediction=True), direction=DIRECTION_BACK)
                 # Second enaction: move forward to the prompt
                 i1 = self.workspace.primitive_interactions[(ACTION_BACKWARD, OUTCOME_PROMPT)]
                 e1 = Enaction(i1, e0.predicted_memory.save())
@@ -128,7 +129,7 @@ class CtrlWindow:
             self.workspace.memory = self.workspace.enacter.memory_snapshot
             self.workspace.memory.body_memory.neurotransmitters[:] = neurotransmitter_point
             if self.workspace.memory.phenomenon_memory.terrain() is not None:
-                self.workspace.memory.phenomenon_memory.terrain().confidence = confidence
+                self.workspace.memory.phenomenon_memory.own_phenomenon(TER).confidence = confidence
             self.workspace.enacter.interaction_step = ENACTION_STEP_RENDERING
             # TODO: prevent a crash when the enaction has been cleared and then an outcome is received after
         elif user_key.upper() == KEY_PREDICTION_ERROR:
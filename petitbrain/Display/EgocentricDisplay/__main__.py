@@ -46,7 +46,7 @@ workspace.memory.egocentric_memory.experiences[2] = experience2
 swipe = Interaction(Action(ACTION_SWIPE, np.array([0, 300, 0], dtype=float), 0, 1.), OUTCOME_NO_FOCUS, 0)
 #turn = Interaction(Action(ACTION_TURN, np.array([0, 0, 0], dtype=float), 0, 1.), OUTCOME_NO_FOCUS, 0)
 workspace.memory.clock += 1
-enaction = Enaction(swipe, workspace.memory.save())
+enaction = Enaction(swipe, workspace.memory.save(is_prediction=True))
 enaction.outcome = Outcome({'action': ACTION_SWIPE, 'clock': 0, 'duration1': 500, 'head_angle': 0, 'yaw': 00,
                             'echo_distance': 200})
 enaction.terminate()
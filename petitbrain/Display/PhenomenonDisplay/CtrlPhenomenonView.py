@@ -24,7 +24,7 @@ class CtrlPhenomenonView:
         def on_text(text):
             """Handle user keypress"""
             if self.phenomenon_id is not None and text.upper() == KEY_ENCLOSE:
-                phenomenon = self.workspace.memory.phenomenon_memory.phenomena[self.phenomenon_id]
+                phenomenon = self.workspace.memory.phenomenon_memory.own_phenomenon(self.phenomenon_id)
                 if self.selected_clock > 0:
                     clock = self.selected_clock
                 else:
@@ -58,7 +58,7 @@ class CtrlPhenomenonView:
             # If scroll below the footer then modify the confidence
             if y < 50 and self.phenomenon_id in self.workspace.memory.phenomenon_memory.phenomena:
                 # Modify the confidence
-                phenomenon = self.workspace.memory.phenomenon_memory.phenomena[self.phenomenon_id]
+                phenomenon = self.workspace.memory.phenomenon_memory.own_phenomenon(self.phenomenon_id)
                 phenomenon.confidence += int(np.sign(dy))
                 phenomenon.confidence = min(max(phenomenon.confidence, 0), 100)
             # If scroll above the footer then zoom
@@ -40,7 +40,7 @@ class CtrlPlaceCellView(CtrlWindow):
             """ Zoom or modify the phenomenon's confidence """
             # If scroll in the footer then modify the confidence
             if y < 50 and self.place_cell_id > 0:
-                place_cell = self.workspace.memory.place_memory.place_cells[self.place_cell_id]
+                place_cell = self.workspace.memory.place_memory.own_place_cell(self.place_cell_id)
                 place_cell.position_confidence += int(np.sign(dy)) * 10
                 place_cell.position_confidence = min(max(place_cell.position_confidence, 0), 100)
             # If scroll above the footer then zoom
@@ -4,6 +4,7 @@ import socket
 from . import ENACTION_STEP_IDLE, ENACTION_STEP_COMMANDING, ENACTION_STEP_ENACTING, ENACTION_STEP_INTEGRATING, \
     ENACTION_STEP_RENDERING
 from ..Memory.PhenomenonMemory import TERRAIN_ORIGIN_CONFIDENCE
+from ..Memory.PhenomenonMemory.PhenomenonMemory import TER
 from ..Integrator.OutcomeCode import outcome_code, outcome_code_focus
 from . import KEY_ENGAGEMENT_ROBOT, KEY_ENGAGEMENT_IMAGINARY
 from ..Robot.RobotDefine import ROBOT_FLOOR_SENSOR_X, ROBOT_SETTINGS
@@ -151,9 +152,10 @@ class Enacter:
             self.workspace.memory = self.memory_snapshot
             self.workspace.memory.body_memory.neurotransmitters[:] = neurotransmitters
             if self.workspace.memory.phenomenon_memory.terrain() is not None:
-                self.workspace.memory.phenomenon_memory.terrain().confidence = confidence
+                self.workspace.memory.phenomenon_memory.own_phenomenon(TER).confidence = confidence
             if self.workspace.memory.place_memory.current_place_cell() is not None:
-                self.workspace.memory.place_memory.current_place_cell().position_confidence = position_confidence
+                self.workspace.memory.place_memory.own_place_cell(
+                    self.workspace.memory.place_memory.current_cell_id).position_confidence = position_confidence
 
             # Retrieve possible message from other robot
             if self.workspace.memory.phenomenon_memory.terrain_confidence() >= TERRAIN_ORIGIN_CONFIDENCE and \
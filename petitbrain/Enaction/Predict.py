@@ -17,8 +17,9 @@ from ..Memory.PhenomenonMemory import ARRANGE_OBJECT_RADIUS
 # RETREAT_YAW = 35
 
 
-def generate_prediction(command, memory):
-    """Apply the command to memory. Return the predicted outcome."""
+def generate_prediction(command, memory, mark_cells=True):
+    """Apply the command to memory. Return the predicted outcome, outcome code, and trajectory.
+    If not mark_cells then the cells traversed by the robot are not marked in allocentric memory"""
 
     # By default, predict the intended duration1, yaw, and floor: 0.
     outcome_dict = {"clock": command.clock, "action": command.action.action_code, "duration1": command.duration,
@@ -28,23 +29,20 @@ def generate_prediction(command, memory):
 
     # Predict crossing enclosed terrain
 
-    if memory.phenomenon_memory.terrain_confidence() >= PHENOMENON_ENCLOSED_CONFIDENCE:
+    # The distance field tells in a few lookups when the floor sensor cannot reach the terrain outline
+    if memory.phenomenon_memory.terrain_confidence() >= PHENOMENON_ENCLOSED_CONFIDENCE and \
+            not is_clear_of_terrain(command, memory):
         # The shape of the terrain in egocentric coordinates
-        ego_shape = np.apply_along_axis(memory.terrain_centric_to_egocentric, 1,
-                                        memory.phenomenon_memory.terrain().shape)
+        ego_shape = memory.terrain_centric_to_egocentric_points(memory.phenomenon_memory.terrain().shape)
         if command.action.action_code == ACTION_FORWARD:
             # Find the nearest intersection with the terrain on x axis
-            intersections = []
-            for i in np.where(np.diff(np.sign(ego_shape[:, 1])))[0]:
-                intersection = x_intersection([ego_shape[i], ego_shape[i + 1]])
-                if intersection is not None:
-                    intersections.append(intersection)
+            intersections = x_intersections(ego_shape)
             if len(intersections) > 0:
-                closest_intersection = intersections[np.argmin(np.array(intersections)[:, 0])]
+                closest_intersection = intersections[np.argmin(intersections[:, 0])]
                 duration1 = (closest_intersection[0] - ROBOT_FLOOR_SENSOR_X) * 1000 / ROBOT_SETTINGS[memory.robot_id]["forward_speed"]
                 if duration1 < command.duration:
                     outcome_dict["duration1"] = round(duration1)
-                    outcome_dict["floor"] = closest_intersection[1]
+                    outcome_dict["floor"] = int(closest_intersection[1])
                     outcome_dict["color_index"] = cell_color(np.array([closest_intersection[0], 0, 0]), memory)
                     outcome_dict["confidence"] = memory.phenomenon_memory.terrain_confidence()
                     if closest_intersection[1] == 1:
@@ -54,18 +52,12 @@ def generate_prediction(command, memory):
         elif command.action.action_code in [ACTION_SWIPE, ACTION_RIGHTWARD]:
             # Translate the shape by the position of the floor sensor so we can check the sign of the x coordinate
             ego_shape -= np.array([ROBOT_FLOOR_SENSOR_X, 0, 0])  #
-            # Loop over the points where the x coordinate pass the floor sensor
-            intersections_left = []
-            intersections_right = []
-            for i in np.where(np.diff(np.sign(ego_shape[:, 0])))[0]:
-                intersection = y_intersection([ego_shape[i], ego_shape[i + 1]])
-                if intersection is not None:
-                    if intersection > 0:
-                        intersections_left.append(intersection)
-                    else:
-                        intersections_right.append(intersection)
+            # The intersections where the x coordinate pass the floor sensor
+            intersections = y_intersections(ego_shape)
+            intersections_left = intersections[intersections > 0]
+            intersections_right = intersections[intersections <= 0]
             if command.speed[1] > 0 and len(intersections_left) > 0:  # Swipe left
-                closest_intersection = intersections_left[np.argmin(np.array(intersections_left))]
+                closest_intersection = intersections_left[np.argmin(intersections_left)]
                 duration1 = closest_intersection * 1000 / ROBOT_SETTINGS[memory.robot_id]["lateral_speed"]
                 if duration1 < command.duration:
                     outcome_dict["duration1"] = round(duration1)
@@ -74,7 +66,7 @@ def generate_prediction(command, memory):
                     outcome_dict["color_index"] = cell_color(np.array([ROBOT_FLOOR_SENSOR_X, closest_intersection, 0]), memory)
                     outcome_dict["confidence"] = memory.phenomenon_memory.terrain_confidence()
             elif command.speed[1] < 0 < len(intersections_right):  # Swipe right
-                closest_intersection = intersections_right[np.argmax(np.array(intersections_right))]
+                closest_intersection = intersections_right[np.argmax(intersections_right)]
                 duration1 = -closest_intersection * 1000 / ROBOT_SETTINGS[memory.robot_id]["lateral_speed"]
                 if duration1 < command.duration:
                     outcome_dict["duration1"] = round(duration1)
@@ -115,7 +107,7 @@ def generate_prediction(command, memory):
 
     # Apply the displacement to memory
 
-    memory.allocentric_memory.move(memory.body_memory.body_quaternion, trajectory, command.clock)
+    memory.allocentric_memory.move(memory.body_memory.body_quaternion, trajectory, command.clock, mark_cells)
     memory.body_memory.body_quaternion = memory.body_memory.body_quaternion.cross(trajectory.yaw_quaternion)
     memory.body_memory.set_head_direction_degree(trajectory.head_direction_degree)
     memory.egocentric_memory.focus_point = trajectory.focus_point
@@ -144,7 +136,27 @@ def generate_prediction(command, memory):
     trajectory.track_focus(predicted_outcome)
     code = outcome_code(memory, trajectory, predicted_outcome)
 
-    return predicted_outcome, code
+    return predicted_outcome, code, trajectory
+
+
+def is_clear_of_terrain(command, memory):
+    """Return True if the distance field shows that the floor sensor cannot cross the terrain outline during the
+    command. Return False if the field cannot tell"""
+    if command.action.action_code == ACTION_FORWARD:
+        # The intersections are searched from the robot center
+        reach = ROBOT_FLOOR_SENSOR_X + command.duration * ROBOT_SETTINGS[memory.robot_id]["forward_speed"] / 1000
+        ego_start, ego_end = [0, 0, 0], [reach, 0, 0]
+    elif command.action.action_code in [ACTION_SWIPE, ACTION_RIGHTWARD]:
+        reach = command.duration * ROBOT_SETTINGS[memory.robot_id]["lateral_speed"] / 1000
+        ego_start, ego_end = [ROBOT_FLOOR_SENSOR_X, 0, 0], [ROBOT_FLOOR_SENSOR_X, math.copysign(reach, command.speed[1]), 0]
+    else:
+        return True
+    field = memory.allocentric_memory.floor_field(memory.phenomenon_memory.terrain())
+    if field is None:
+        return False
+    free_distance = field.free_distance(memory.egocentric_to_allocentric(np.array(ego_start, dtype=float)),
+                                        memory.egocentric_to_allocentric(np.array(ego_end, dtype=float)))
+    return free_distance == np.inf
 
 
 def cell_color(ego_point, memory):
@@ -152,8 +164,8 @@ def cell_color(ego_point, memory):
     floor_i, floor_j = point_to_cell(memory.egocentric_to_allocentric(ego_point))
     if (memory.allocentric_memory.min_i <= floor_i <= memory.allocentric_memory.max_i) and \
             (memory.allocentric_memory.min_j <= floor_j <= memory.allocentric_memory.max_j) and \
-            memory.allocentric_memory.grid[floor_i][floor_j][STATUS_FLOOR] == EXPERIENCE_FLOOR:
-        return int(memory.allocentric_memory.grid[floor_i][floor_j][COLOR_INDEX])
+            memory.allocentric_memory.grid[floor_i, floor_j, STATUS_FLOOR] == EXPERIENCE_FLOOR:
+        return int(memory.allocentric_memory.grid[floor_i, floor_j, COLOR_INDEX])
     else:
         return 0
 
@@ -162,8 +174,9 @@ def push_objects(trajectory, memory, floor):
     """Update the position of the phenomena that are on the robot's trajectory. Must be called before moving robot."""
     alo_covered_area = trajectory.covered_area + memory.allocentric_memory.robot_point
     path = mpath.Path(alo_covered_area[:, 0:2])
-    for p in [p for p in memory.phenomenon_memory.phenomena.values() if p.category is not None and
-              p.phenomenon_type == EXPERIENCE_ALIGNED_ECHO and path.contains_point(p.point[0:2])]:
+    for p_id in [k for k, p in memory.phenomenon_memory.phenomena.items() if p.category is not None and
+                 p.phenomenon_type == EXPERIENCE_ALIGNED_ECHO and path.contains_point(p.point[0:2])]:
+        p = memory.phenomenon_memory.own_phenomenon(p_id)
         ego_point = memory.allocentric_to_egocentric(p.point)
         ego_point[0] = trajectory.translation[0] + ROBOT_FLOOR_SENSOR_X + p.category.short_radius
         # If floor then push beyond the retreat distance
@@ -198,6 +211,35 @@ def x_intersection(line):
         return [x, 2]
 
 
+def x_intersections(points):
+    """Return the array of [x, floor code] of the segments of the polyline that intersect the x axis like
+    x_intersection() applied to each segment where the sign of y changes"""
+    i = np.where(np.diff(np.sign(points[:, 1])))[0]
+    x1, y1, x2, y2 = points[i, 0], points[i, 1], points[i + 1, 0], points[i + 1, 1]
+    dx = x2 - x1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(dx == 0, np.inf, (y2 - y1) / np.where(dx == 0, 1, dx))
+        x = np.where(dx == 0, x1, x1 - y1 / slope)
+    # The line segments that intersect before the robot
+    intersect = ~((x < 0) | (y1 * y2 > 0))
+    # Line segment in front: 3, to the right: 1, to the left: 2
+    floor = np.where((dx == 0) | (np.abs(slope) > 10), 3,
+                     np.where(((x1 < x2) & (y1 < y2)) | ((x1 > x2) & (y1 > y2)), 1, 2))
+    return np.stack((x[intersect], floor[intersect]), axis=1)
+
+
+def y_intersections(points):
+    """Return the array of y values where the segments of the polyline intersect the y axis like
+    y_intersection() applied to each segment where the sign of x changes"""
+    i = np.where(np.diff(np.sign(points[:, 0])))[0]
+    x1, y1, x2, y2 = points[i, 0], points[i, 1], points[i + 1, 0], points[i + 1, 1]
+    dy = y2 - y1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (x2 - x1) / np.where(dy == 0, 1, dy)
+        y = np.where(dy == 0, y1, y1 - x1 / slope)
+    return y[~(x1 * x2 > 0)]
+
+
 def y_intersection(line):
     """Return the y value where the segment intersects the y axis or None"""
     # line1 = x1, y1, x2, y2
@@ -0,0 +1,97 @@
+########################################################################################
+# The headless rollout engine that enacts candidate plans in imagination in worker processes
+# A plan is a list of steps (action, prompt_point, direction, span) like the candidates of WhatIf
+# Each step is enacted as in KEY_ENGAGEMENT_IMAGINARY: the outcome is the predicted outcome,
+# memory is updated, and the outcome code is computed in the updated memory
+# The memory snapshot is pickled once per evaluation. The pickled bytes are sent with each plan
+# and unpickled once in each worker process that caches the latest snapshot
+# The worker processes are spawned so that they do not fork the pyglet and registration threads
+########################################################################################
+
+import contextlib
+import io
+import itertools
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor, wait
+import numpy as np
+from . import ROLLOUT_WORKERS, ROLLOUT_TIME_BUDGET
+from .Simulator import predicted_outcome_dict
+from ..Robot.Enaction import Enaction
+from ..Robot.Outcome import Outcome
+from ..Integrator.OutcomeCode import outcome_code
+from ..Proposer.Interaction import Interaction, OUTCOME_PROMPT
+
+SNAPSHOT_IDS = itertools.count()
+WORKER_SNAPSHOT = {}  # The memory snapshot cached in the worker process: {snapshot_id: memory}
+
+
+class Rollout:
+    """The result of enacting a plan in imagination"""
+    def __init__(self, keys, robot_point, body_azimuth):
+        """Record the enacted interactions and the final position of the robot"""
+        self.keys = keys  # [(action_code, predicted_outcome_code, outcome_code)] of the enacted steps
+        self.robot_point = robot_point
+        self.body_azimuth = body_azimuth
+
+    def score(self, interactions):
+        """Return the sum of the valences of the enacted primitive interactions {(action_code, outcome): interaction}"""
+        return sum(interactions[(action_code, code)].valence for action_code, _, code in self.keys
+                   if (action_code, code) in interactions)
+
+
+def imagine(memory, plan):
+    """Enact the steps of the plan in imagination. Memory is modified. Return the Rollout.
+    Stop after a step whose outcome differs from the prediction like CompositeEnaction"""
+    keys = []
+    for action, prompt_point, direction, span in plan:
+        e_memory = memory.save(is_prediction=True)
+        e_memory.egocentric_memory.prompt_point = None if prompt_point is None else np.array(prompt_point)
+        enaction = Enaction(Interaction(action, OUTCOME_PROMPT, 0), e_memory, direction, span)
+        enaction.outcome = Outcome(predicted_outcome_dict(enaction))
+        enaction.terminate()
+        memory.update(enaction)
+        enaction.outcome_code = outcome_code(memory, enaction.trajectory, enaction.outcome)
+        memory.clock += 1
+        keys.append((action.action_code, enaction.predicted_outcome_code, enaction.outcome_code))
+        if not enaction.succeed():
+            break
+    return Rollout(keys, memory.allocentric_memory.robot_point.copy(), memory.body_memory.body_azimuth())
+
+
+def rollout_worker(snapshot, plan):
+    """Enact the plan in a copy of the memory snapshot (snapshot_id, pickled memory) in the worker process"""
+    snapshot_id, pickled_memory = snapshot
+    if snapshot_id not in WORKER_SNAPSHOT:
+        WORKER_SNAPSHOT.clear()
+        WORKER_SNAPSHOT[snapshot_id] = pickle.loads(pickled_memory)
+    # Do not print the traces of the imagined enactions
+    with contextlib.redirect_stdout(io.StringIO()):
+        return imagine(WORKER_SNAPSHOT[snapshot_id].save(), plan)
+
+
+class RolloutEngine:
+    """Evaluate plans in imagination in a pool of worker processes"""
+    def __init__(self, workers=ROLLOUT_WORKERS):
+        """The pool is created on the first evaluation"""
+        self.workers = workers
+        self.executor = None
+
+    def evaluate(self, memory, plans, time_budget=ROLLOUT_TIME_BUDGET):
+        """Return the Rollout of each plan in memory (not modified).
+        Return None for the plans that were not evaluated within the time budget (s)"""
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        snapshot = (next(SNAPSHOT_IDS), pickle.dumps(memory))
+        futures = [self.executor.submit(rollout_worker, snapshot, plan) for plan in plans]
+        done, not_done = wait(futures, timeout=time_budget)
+        # The plans that have not started are dropped. The running plans finish in the background
+        for future in not_done:
+            future.cancel()
+        return [future.result() if future in done else None for future in futures]
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -16,6 +16,19 @@ from ..Utils import assert_almost_equal_angles, translation_quaternion_to_matrix
 SIMULATION_SPEED = 1  # 0.5
 
 
+def predicted_outcome_dict(enaction):
+    """Return the outcome dictionary of the enaction initialized from its predicted outcome"""
+    return {"clock": enaction.clock,
+            "action": enaction.action.action_code,
+            "head_angle": enaction.predicted_outcome.head_angle,
+            "echo_distance": enaction.predicted_outcome.echo_distance,
+            'floor': enaction.predicted_outcome.floor,
+            'yaw': enaction.predicted_outcome.yaw,
+            'duration1': enaction.predicted_outcome.duration1,
+            'color_index': enaction.predicted_outcome.color_index
+            }
+
+
 class Simulator:
     def __init__(self, workspace):
         self.workspace = workspace
@@ -31,15 +44,28 @@ class Simulator:
         self.simulation_duration = self.workspace.enaction.command.duration / SIMULATION_SPEED / 1000.
 
         # Initialize all the required fields of the outcome because sometimes simulate() is not called
-        self.simulated_outcome_dict = {"clock": self.workspace.enaction.clock,
-                                       "action": self.workspace.enaction.action.action_code,
-                                       "head_angle": self.workspace.enaction.predicted_outcome.head_angle,
-                                       "echo_distance": self.workspace.enaction.predicted_outcome.echo_distance,
-                                       'floor': self.workspace.enaction.predicted_outcome.floor,
-                                       'yaw': self.workspace.enaction.predicted_outcome.yaw,
-                                       'duration1': self.workspace.enaction.predicted_outcome.duration1,
-                                       'color_index': self.workspace.enaction.predicted_outcome.color_index
-                                       }
+        self.simulated_outcome_dict = predicted_outcome_dict(self.workspace.enaction)
+
+    def floor_sensor_point(self):
+        """Return the allocentric point of the floor sensor"""
+        memory = self.workspace.memory
+        return memory.allocentric_memory.robot_point + \
+            memory.body_memory.body_quaternion * Vector3([ROBOT_FLOOR_SENSOR_X, 0, 0])
+
+    def floor_cell(self, start, end):
+        """Return the first FLOOR cell (i, j) crossed by the floor sensor from start to end or None"""
+        allocentric_memory = self.workspace.memory.allocentric_memory
+        # Trace the whole segment so that a long tick does not jump over a line
+        field = allocentric_memory.floor_field()
+        if field is not None:
+            return field.first_floor_cell(start, end)
+        # The tiled grid only checks the cell of the end point
+        i, j = point_to_cell(end, allocentric_memory.cell_radius, False)
+        if (allocentric_memory.min_i <= i <= allocentric_memory.max_i) and \
+                (allocentric_memory.min_j <= j <= allocentric_memory.max_j) and \
+                allocentric_memory.grid[i, j, STATUS_FLOOR] == EXPERIENCE_FLOOR:
+            return i, j
+        return None
 
     def simulate(self, dt):
         """Simulate the enaction in the current memory"""
@@ -63,8 +89,7 @@ class Simulator:
         displacement_matrix = translation_quaternion_to_matrix(-translation, yaw_quaternion.inverse)
 
         # Simulate the displacement of experiences
-        for experience in memory.egocentric_memory.experiences.values():
-            experience.displace(displacement_matrix)
+        memory.egocentric_memory.displace_experiences(displacement_matrix)
         # Simulate the displacement of the focus and prompt
         if memory.egocentric_memory.focus_point is not None:
             memory.egocentric_memory.focus_point = matrix44.apply_to_vector(displacement_matrix,
@@ -89,18 +114,17 @@ class Simulator:
             memory.body_memory.set_head_direction_degree(head_angle)
 
         # Simulate the displacement in allocentric memory
+        sensor_start = self.floor_sensor_point()
         memory.allocentric_memory.robot_point += memory.body_memory.body_quaternion * Vector3(translation)
 
         # If terrain is not enclosed then check for floor cells
         if memory.phenomenon_memory.terrain_confidence() < PHENOMENON_ENCLOSED_CONFIDENCE:
             if enaction.action.action_code in [ACTION_FORWARD, ACTION_SWIPE, ACTION_BACKWARD]:
-                i, j = point_to_cell(memory.allocentric_memory.robot_point +
-                                     memory.body_memory.body_quaternion * Vector3([ROBOT_FLOOR_SENSOR_X, 0, 0]))
+                floor_cell = self.floor_cell(sensor_start, self.floor_sensor_point())
                 # If crossed the line then stop the simulation
                 # Must check before marking the place, and terminate to prevent overriding duration1
-                if (memory.allocentric_memory.min_i <= i <= memory.allocentric_memory.max_i) and \
-                        (memory.allocentric_memory.min_j <= j <= memory.allocentric_memory.max_j) and \
-                        memory.allocentric_memory.grid[i][j][STATUS_FLOOR] == EXPERIENCE_FLOOR:
+                if floor_cell is not None:
+                    i, j = floor_cell
                     self.is_simulating = False
                     # The simulated distance is shorter than the phenomenon location due to cell radius
                     self.simulated_outcome_dict['duration1'] = round(self.simulation_time * 1000)
@@ -115,7 +139,7 @@ class Simulator:
                             # Swipe right
                             self.simulated_outcome_dict['floor'] = 1
                             self.simulated_outcome_dict['yaw'] = -memory.body_memory.retreat_yaw
-                    self.simulated_outcome_dict['color_index'] = int(memory.allocentric_memory.grid[i][j][COLOR_INDEX])
+                    self.simulated_outcome_dict['color_index'] = int(memory.allocentric_memory.grid[i, j, COLOR_INDEX])
                 else:
                     self.simulated_outcome_dict['floor'] = 0
 
@@ -129,7 +153,7 @@ class Simulator:
         echoes = [[enaction.predicted_outcome.head_angle, enaction.predicted_outcome.echo_distance]]
         # The echoes added by the user
         for ij in memory.allocentric_memory.user_cells:
-            cell = memory.allocentric_memory.grid[ij[0]][ij[1]]
+            cell = memory.allocentric_memory.grid[ij[0], ij[1]]
             if cell[STATUS_ECHO] == EXPERIENCE_ALIGNED_ECHO:
                 p = [cell[POINT_X], cell[POINT_Y], 0]
                 a, d = point_to_head_direction_distance(memory.allocentric_to_egocentric(p))
@@ -0,0 +1,43 @@
+########################################################################################
+# Predict the outcomes of many candidate commands without modifying memory
+# Each candidate is predicted in a memory snapshot that shares the state of memory until written
+# The cells traversed by the robot are not marked because the prediction does not read them
+# Used to score candidates before materializing the selected one as an Enaction
+########################################################################################
+
+import numpy as np
+from ..Robot.Command import Command, DIRECTION_FRONT
+from .Predict import generate_prediction
+
+
+class WhatIf:
+    """The predicted outcome of a candidate command"""
+    def __init__(self, action, command, predicted_outcome, predicted_outcome_code, trajectory):
+        """Record the prediction"""
+        self.action = action
+        self.command = command
+        self.predicted_outcome = predicted_outcome
+        self.predicted_outcome_code = predicted_outcome_code
+        self.trajectory = trajectory
+        # The same key as the Enaction of this candidate
+        self.key = (action.action_code, predicted_outcome_code)
+
+    def __str__(self):
+        """Return a representation of the key tuple (action, predicted outcome)"""
+        return self.key.__str__()
+
+
+def predict_candidates(memory, candidates, caution=0):
+    """Return the WhatIf of each candidate (action, prompt_point, direction, span). Memory is not modified.
+    The prompt_point is egocentric or None. Direction and span may be None for the Enaction defaults"""
+    what_ifs = []
+    for action, prompt_point, direction, span in candidates:
+        candidate_memory = memory.save(is_prediction=True)
+        candidate_memory.egocentric_memory.prompt_point = None if prompt_point is None else np.array(prompt_point)
+        command = Command(action, candidate_memory, DIRECTION_FRONT if direction is None else direction,
+                          40 if span is None else span, caution)
+        # Like the predicted memory of Enaction
+        candidate_memory.clock += 1
+        predicted_outcome, predicted_outcome_code, trajectory = generate_prediction(command, candidate_memory, False)
+        what_ifs.append(WhatIf(action, command, predicted_outcome, predicted_outcome_code, trajectory))
+    return what_ifs
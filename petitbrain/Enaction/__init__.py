@@ -7,3 +7,6 @@ ENACTION_STEP_COMMANDING = 1
 ENACTION_STEP_ENACTING = 2
 ENACTION_STEP_INTEGRATING = 3
 ENACTION_STEP_RENDERING = 4
+
+ROLLOUT_WORKERS = 4  # The number of worker processes that enact the plans in imagination
+ROLLOUT_TIME_BUDGET = 0.2  # (s) The time given to the workers to evaluate the plans in each cycle
@@ -1,6 +1,7 @@
 import time
 from .Workspace import Workspace
 from .SoundPlayer import SoundPlayer, SOUND_STARTUP
+from .Memory.PlaceMemory.PlotWorker import PlotWorker
 from .Proposer.Decider import Decider
 from .Display.EgocentricDisplay.CtrlEgocentricView import CtrlEgocentricView
 from .Display.AllocentricDisplay.CtrlAllocentricView import CtrlAllocentricView
@@ -16,6 +17,8 @@ class Flock:
         # Try to load sounds (it may not work on all platforms)
         SoundPlayer.initialize()
         SoundPlayer.play(SOUND_STARTUP)
+        # Start the process that saves the comparison plots before the threads of the workspaces
+        PlotWorker.start()
 
         self.workspaces = {}
         self.deciders = {}
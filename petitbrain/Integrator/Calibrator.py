@@ -1,10 +1,10 @@
 import numpy as np
 import circle_fit as cf
 from pyrr import Matrix44, Vector3, vector3
+from ..Memory import RUNNING_WINDOW_AZIMUTH
 from ..Memory.EgocentricMemory.Experience import EXPERIENCE_NORTH, EXPERIENCE_COMPASS
 from ..Proposer.Action import ACTION_FORWARD
 
-RUNNING_WINDOW_AZIMUTH = 100
 MAX_OFFSET_DISTANCE = 100
 MIN_OFFSET_RADIUS = 130
 MAX_OFFSET_RADIUS = 550  # 400
@@ -46,18 +46,16 @@ class Calibrator:
 
     def calibrate_compass(self):
         """Update the compass offset and the compass experiences"""
-        points = np.array([e.point()[0: 2] for e in self.workspace.memory.egocentric_memory.experiences.values()
-                           if e.clock >= self.workspace.memory.clock - RUNNING_WINDOW_AZIMUTH and
-                           e.type == EXPERIENCE_NORTH])
+        points = np.array([e.point()[0: 2] for e in self.workspace.memory.egocentric_memory.experiences.since(
+                           self.workspace.memory.clock - RUNNING_WINDOW_AZIMUTH, [EXPERIENCE_NORTH])])
         offset_2d = compass_calibration(points)
         if offset_2d is not None:
             print("Calibrate compass by", offset_2d, f"distance: {np.linalg.norm(offset_2d):.1f}")
             offset_point = np.array([*offset_2d, 0], dtype=int)
             self.workspace.memory.body_memory.compass_offset += offset_point
             offset_matrix = Matrix44.from_translation(-offset_point).astype('float64')
-            for e in self.workspace.memory.egocentric_memory.experiences.values():
-                if e.type in [EXPERIENCE_COMPASS, EXPERIENCE_NORTH]:
-                    e.displace(offset_matrix)
+            self.workspace.memory.egocentric_memory.displace_experiences(
+                offset_matrix, experience_types=[EXPERIENCE_COMPASS, EXPERIENCE_NORTH])
 
     def calibrate_retreat(self):
         """Calibrate the retreat yaw """
@@ -11,8 +11,8 @@ def integrate(memory):
     """Create phenomena and update cells in allocentric memory"""
 
     # The new experiences generated during this step that indicate affordances
-    new_experiences = [e for e in memory.egocentric_memory.experiences.values() if (e.clock >= memory.clock)
-                       and e.type in [EXPERIENCE_FLOOR, EXPERIENCE_ALIGNED_ECHO]]
+    new_experiences = memory.egocentric_memory.experiences.since(memory.clock,
+                                                                 [EXPERIENCE_FLOOR, EXPERIENCE_ALIGNED_ECHO])
     # The new affordances
     new_affordances = []
     for e in new_experiences:
@@ -26,8 +26,8 @@ def integrate(memory):
 
     # Mark the area covered by the echo in allocentric memory
     if DISPLAY_CONE:
-        for a in [a for a in new_affordances if a.type in [EXPERIENCE_CENTRAL_ECHO, EXPERIENCE_ALIGNED_ECHO]]:
-            memory.allocentric_memory.mark_echo_area(a)
+        memory.allocentric_memory.mark_echo_areas([a for a in new_affordances if a.type in
+                                                   [EXPERIENCE_CENTRAL_ECHO, EXPERIENCE_ALIGNED_ECHO]])
 
     # Try to attach the new affordances to existing phenomena and remove these affordances
     new_affordances, position_correction = memory.phenomenon_memory.update_phenomena(new_affordances)
@@ -1,37 +1,53 @@
-import matplotlib.path as mpath
 import time
 import numpy as np
 from pyrr import quaternion
 
 from . import STATUS_FLOOR, STATUS_ECHO, STATUS_2, STATUS_3, STATUS_4, PHENOMENON_ID, COLOR_INDEX, CLOCK_FOCUS, \
     CLOCK_INTERACTION, CLOCK_PROMPT, CLOCK_PHENOMENON, CLOCK_NO_ECHO, CLOCK_PLACE, POINT_X, POINT_Y, IS_POOL, \
-    PLACE_CELL_ID, CLOCK_UPDATED
+    PLACE_CELL_ID, CLOCK_UPDATED, CELL_UNKNOWN, CELL_NO_ECHO
 from ..EgocentricMemory.Experience import EXPERIENCE_FLOOR, EXPERIENCE_PLACE, EXPERIENCE_FOCUS, EXPERIENCE_PROMPT, \
     EXPERIENCE_ALIGNED_ECHO, EXPERIENCE_IMPACT
 from ...Robot.RobotDefine import CHECK_OUTSIDE
 from ...Memory.PhenomenonMemory.PhenomenonMemory import TER, ROBOT1
 from ..PhenomenonMemory import PHENOMENON_RECOGNIZABLE_CONFIDENCE, PHENOMENON_ENCLOSED_CONFIDENCE
-from .Geometry import is_inside_rectangle, cell_to_point, point_to_cell, is_pool
+from .. import GRID_TILED, GRID_TILED_EXTENT
+from .Geometry import is_inside_rectangle, is_inside_triangles, point_to_cell, points_to_cells, points_to_axial
+from .HexGrid import HexGrid, WRITE_STAMP
+from .TiledHexGrid import TiledHexGrid
+from .PoolPyramid import PoolPyramid
+from .FloorDistanceField import FloorDistanceField
 
-CELL_UNKNOWN = 0
-CELL_NO_ECHO = -4
+
+def affordance_drawing(affordances, point, phenomenon_id, clock=None):
+    """Return the drawing (points, status, clock, color_index, phenomenon_id) of the affordances relative to point.
+    If clock is None then use the clock of each affordance"""
+    return (np.array([a.point + point for a in affordances]).reshape(-1, 3), [a.type for a in affordances],
+            [a.clock if clock is None else clock for a in affordances], [a.color_index for a in affordances],
+            phenomenon_id)
 
 
 class AllocentricMemory:
     """The agent's allocentric memory made with an hexagonal grid."""
 
-    def __init__(self, width, height, cell_radius):
+    def __init__(self, width, height, cell_radius, tiled=GRID_TILED, grid=None):
         """Construct the allocentric memory of the robot, child class of HexaGrid
         with the addition of the robot at the center of the grid and a link between the
         software and the real word, cell_radius representing the radius of a cell in the real world (in millimeters)
+        If tiled then the grid is made of tiles allocated on demand and does not wrap around
+        If grid is provided then it is used instead of creating an empty grid (used by save())
         """
         # The grid of cells
         self.width = width  # Nb cells width
         self.height = height  # Nb cells height
-        self.min_i = -width // 2 + 1
-        self.max_i = width // 2 + 1
-        self.min_j = -height // 2 + 1
-        self.max_j = height // 2 + 1
+        self.is_tiled = tiled
+        if tiled:
+            self.min_i = self.min_j = -GRID_TILED_EXTENT
+            self.max_i = self.max_j = GRID_TILED_EXTENT
+        else:
+            self.min_i = -width // 2 + 1
+            self.max_i = width // 2 + 1
+            self.min_j = -height // 2 + 1
+            self.max_j = height // 2 + 1
         self.cell_radius = cell_radius
 
         # Allocentric memory is initialized with the robot at its center
@@ -46,18 +62,64 @@ class AllocentricMemory:
         self.affordances = []
 
         # The hexagonal grid
-        start_time = time.time()
-        self.grid = np.zeros((width, height, CLOCK_UPDATED + 1), dtype=int)
-        # Indexes after max_i and max_j are used for negative positions
-        i_range = np.concatenate((np.arange(0, self.max_i), np.arange(self.min_i, 0)))
-        j_range = np.concatenate((np.arange(0, self.max_j), np.arange(self.min_j, 0)))
-        mesh_i, mesh_j = np.meshgrid(i_range, j_range, indexing='ij')
-        self.grid[:, :, POINT_X: POINT_Y + 1] = cell_to_point(mesh_i, mesh_j, cell_radius)
-        self.grid[:, :, PHENOMENON_ID] = -1
-        self.grid[:, :, IS_POOL] = is_pool(mesh_i, mesh_j)
-        # print(f"Init Grid time: {time.time() - start_time:.4f} seconds")
+        if grid is not None:
+            self.grid = grid
+        elif tiled:
+            self.grid = TiledHexGrid(cell_radius)
+        else:
+            self.grid = HexGrid(width, height, cell_radius)
+        # The WRITE_STAMP of the cells. Consumers pull the cells changed since their last sync
+        self.write_count = 0
+        self.saved_write_count = 0  # The write count of the memory this memory snapshot was saved from
 
         self.user_cells = []  # List of immutable tuples to be easily copied
+        self.is_shared = False  # True if the grid may be shared with a memory snapshot
+
+        # The terrain mask is cached until the terrain path or the grid origin change
+        self.terrain_mask_key = None
+        self.terrain_mask_origin = (0, 0)  # The cell of the terrain bounding box at index [0, 0] of the masks
+        self.terrain_inside = None  # True for the cells whose center is inside the terrain
+        self.terrain_certain = None  # True for the cells that are entirely on one side of the terrain outline
+        # The pooled summaries of the grid are created when first queried. Not copied to memory snapshots
+        self.pool_pyramid = None
+        # The distance field of the FLOOR cells and terrain outline is rebuilt when they change
+        self.floor_distance_field = None
+
+    def own_grid(self):
+        """Copy the grid if it is shared with a memory snapshot (copy on write). Return the grid"""
+        if self.is_shared:
+            self.grid = self.grid.copy()
+            self.is_shared = False
+        return self.grid
+
+    def mark_changed(self, index):
+        """Record that the cells selected by index (cell_i, cell_j) have been written"""
+        self.own_grid()
+        self.write_count += 1
+        self.grid[index[0], index[1], WRITE_STAMP] = self.write_count
+
+    def changed_cells(self, since):
+        """Return the indexes (cell_i, cell_j) of the cells written after the write count since,
+        and the current write count to pass in the next call"""
+        changed_i, changed_j = self.grid.changed_cells(since)
+        return changed_i, changed_j, self.write_count
+
+    def pool_summary(self, point, level):
+        """Return the summary (max_clock, floor, echo, known) of the pool of this level that contains the point"""
+        if self.pool_pyramid is None:
+            self.pool_pyramid = PoolPyramid()
+        self.pool_pyramid.update(self)
+        i, j = point_to_cell(point, self.cell_radius, not self.is_tiled)
+        return self.pool_pyramid.summary(i, j, level)
+
+    def floor_field(self, terrain=None):
+        """Return the distance field of the FLOOR cells and of the outline of the terrain if not None.
+        Return None if the grid is tiled"""
+        if self.is_tiled:
+            return None
+        if self.floor_distance_field is None or not self.floor_distance_field.is_valid(self, terrain):
+            self.floor_distance_field = FloorDistanceField(self, terrain)
+        return self.floor_distance_field
 
     def __str__(self):
         output = ""
@@ -65,7 +127,7 @@ class AllocentricMemory:
             if j % 2 == 1:
                 output += "-----"
             for i in range(self.min_i, self.max_i + 1):
-                output += f"({self.grid[i][j][POINT_X]:4d}, {self.grid[i][j][POINT_Y]:4d})-----"
+                output += f"({self.grid[i, j, POINT_X]:4d}, {self.grid[i, j, POINT_Y]:4d})-----"
                 # output += "-----"
             output += "\n"
         return output
@@ -73,206 +135,361 @@ class AllocentricMemory:
     def update_grid(self, memory):
         """Allocate the phenomena to the cells of allocentric memory"""
         # start_time = time.time()
+        self.own_grid()
         # Clear the previous phenomena and place cells
         self.clear_grid_status(memory.clock)
 
+        # The drawings (points, status, clock, color_index, phenomenon_id) in the order they are applied
+        drawings = []
+
         # Place the phenomena again
         for p_id, p in memory.phenomenon_memory.phenomena.items():
             # Mark the cells outside the terrain (for BICA 2023 paper)
             if CHECK_OUTSIDE == 1:
                 if p_id == TER and p.confidence >= PHENOMENON_RECOGNIZABLE_CONFIDENCE and p.path is not None:
-                    for i in range(self.min_i, self.max_i):
-                        for j in range(self.min_j, self.max_j):
-                            if p.is_inside(self.grid[i][j][POINT_X:POINT_Y + 1]):
-                                self.grid[i][j][STATUS_FLOOR] = EXPERIENCE_FLOOR
-                                self.grid[i][j][PHENOMENON_ID] = TER
-                                self.grid[i][j][CLOCK_PLACE] = memory.clock
-                                self.grid[i][j][CLOCK_UPDATED] = memory.clock
+                    # Draw the previous phenomena first
+                    self.draw(drawings, memory.clock)
+                    drawings = []
+                    inside, _ = self.terrain_mask(p)
+                    cell_i, cell_j = np.nonzero(inside)
+                    cell_i, cell_j = cell_i + self.terrain_mask_origin[0], cell_j + self.terrain_mask_origin[1]
+                    self.grid[cell_i, cell_j, STATUS_FLOOR] = EXPERIENCE_FLOOR
+                    self.grid[cell_i, cell_j, PHENOMENON_ID] = TER
+                    self.grid[cell_i, cell_j, CLOCK_PLACE] = memory.clock
+                    self.grid[cell_i, cell_j, CLOCK_UPDATED] = memory.clock
+                    self.mark_changed((cell_i, cell_j))
 
             # If terrain is enclosed
             if p_id == TER and p.confidence >= PHENOMENON_ENCLOSED_CONFIDENCE:  # PHENOMENON_RECOGNIZE_CONFIDENCE:  # TERRAIN_ORIGIN_CONFIDENCE:
                 # Draw the terrain from its shape
-                for point in p.shape:
-                    cell_x, cell_y = point_to_cell(point + p.point)
-                    self.apply_status_to_cell(cell_x, cell_y, EXPERIENCE_FLOOR, p.last_origin_clock, 0)
-                    # Attribute this phenomenon to this cell
-                    if (self.min_i <= cell_x <= self.max_i) and (self.min_j <= cell_y <= self.max_j):
-                        self.grid[cell_x][cell_y][PHENOMENON_ID] = p_id
-                        self.grid[cell_x][cell_y][CLOCK_UPDATED] = memory.clock
+                drawings.append((p.shape + p.point, EXPERIENCE_FLOOR, p.last_origin_clock, 0, p_id))
                 # Draw the color floor affordances
-                for a in p.affordances.values():
-                    if a.color_index != 0:
-                        # Attribute the status of the affordance
-                        cell_x, cell_y = point_to_cell(a.point+p.point)
-                        self.apply_status_to_cell(cell_x, cell_y, a.type, a.clock, a.color_index)
-                        # Attribute this phenomenon to this cell
-                        if (self.min_i <= cell_x <= self.max_i) and (self.min_j <= cell_y <= self.max_j):
-                            self.grid[cell_x][cell_y][PHENOMENON_ID] = p_id
-                            self.grid[cell_x][cell_y][CLOCK_UPDATED] = memory.clock
+                drawings.append(affordance_drawing([a for a in p.affordances.values() if a.color_index != 0],
+                                                   p.point, p_id))
             else:
                 if p_id == ROBOT1:
-                    # Draw the other robot from its shape
-                    for point in p.shape:
-                        cell_x, cell_y = point_to_cell(point + p.point)
-                        self.apply_status_to_cell(cell_x, cell_y, EXPERIENCE_ALIGNED_ECHO, p.last_origin_clock, 0)
-                        self.apply_status_to_cell(cell_x, cell_y, EXPERIENCE_IMPACT, p.last_origin_clock, 0)
-                        # Attribute this phenomenon to this cell
-                        if (self.min_i <= cell_x <= self.max_i) and (self.min_j <= cell_y <= self.max_j):
-                            self.grid[cell_x][cell_y][PHENOMENON_ID] = p_id
-                            self.grid[cell_x][cell_y][CLOCK_UPDATED] = memory.clock
+                    # Draw the other robot from its shape: ALIGNED_ECHO then IMPACT on each cell
+                    drawings.append((np.repeat(p.shape + p.point, 2, axis=0),
+                                     np.tile([EXPERIENCE_ALIGNED_ECHO, EXPERIENCE_IMPACT], len(p.shape)),
+                                     p.last_origin_clock, 0, p_id))
 
                 # Mark the affordances of this phenomenon
-                for a in p.affordances.values():
-                    if (p_id != TER or p.confidence < PHENOMENON_RECOGNIZABLE_CONFIDENCE or a.color_index != 0
-                        or CHECK_OUTSIDE == 0) and a.type != EXPERIENCE_PLACE:
-                        # Attribute the status of the affordance
-                        cell_x, cell_y = point_to_cell(a.point+p.point)
-                        self.apply_status_to_cell(cell_x, cell_y, a.type, a.clock, a.color_index)
-                        # Attribute this phenomenon to this cell
-                        if (self.min_i <= cell_x <= self.max_i) and (self.min_j <= cell_y <= self.max_j):
-                            self.grid[cell_x][cell_y][PHENOMENON_ID] = p_id
-                            self.grid[cell_x][cell_y][CLOCK_UPDATED] = memory.clock
+                drawings.append(affordance_drawing([a for a in p.affordances.values() if
+                                                    (p_id != TER or p.confidence < PHENOMENON_RECOGNIZABLE_CONFIDENCE
+                                                     or a.color_index != 0 or CHECK_OUTSIDE == 0)
+                                                    and a.type != EXPERIENCE_PLACE], p.point, p_id))
 
         # Place the affordances that are not attached to phenomena
-        for a in self.affordances:
-            cell_x, cell_y = point_to_cell(a.point)
-            self.apply_status_to_cell(cell_x, cell_y, a.type, memory.clock, a.color_index)
+        drawings.append(affordance_drawing(self.affordances, np.zeros(3), None, memory.clock))
+
+        # Draw the phenomena and the affordances in the grid in a single batch
+        self.draw(drawings, memory.clock)
 
         # Place the place cells again
-        for place_cell_id, place_cell in memory.place_memory.place_cells.items():
-            cell_x, cell_y = point_to_cell(place_cell.point)
-            # print(f"Update grid Place cell {place_cell}")
-            if (self.min_i <= cell_x <= self.max_i) and (self.min_j <= cell_y <= self.max_j):
-                self.grid[cell_x][cell_y][PLACE_CELL_ID] = place_cell_id
-                self.grid[cell_x][cell_y][CLOCK_UPDATED] = memory.clock
+        if len(memory.place_memory.place_cells) > 0:
+            cell_i, cell_j = points_to_cells([c.point for c in memory.place_memory.place_cells.values()],
+                                             self.cell_radius, not self.is_tiled)
+            place_cell_ids = np.array(list(memory.place_memory.place_cells), dtype=int)
+            inside = self.is_inside_grid(cell_i, cell_j)
+            cell_i, cell_j, place_cell_ids = cell_i[inside], cell_j[inside], place_cell_ids[inside]
+            # If several place cells fall on the same cell then the last one wins
+            last = self.last_writes(cell_i, cell_j)
+            self.grid[cell_i[last], cell_j[last], PLACE_CELL_ID] = place_cell_ids[last]
+            self.grid[cell_i, cell_j, CLOCK_UPDATED] = memory.clock
+            self.mark_changed((cell_i, cell_j))
 
         # print("Update allocentric time:", time.time() - start_time, "seconds")
 
-    def move(self, direction_quaternion, trajectory, clock):
-        """Move the robot in allocentric memory. Mark the traversed cells Free. Returns the new position
-        If body_quaternion is identity then the translation is allocentric"""
-
-        # Mark the cells traversed by the robot
-        alo_covered_area = trajectory.covered_area + self.robot_point
-        inside_ij = np.where(is_inside_rectangle(self.grid[:, :, POINT_X], self.grid[:, :, POINT_Y], alo_covered_area))
-        self.grid[:, :, STATUS_FLOOR][inside_ij] = EXPERIENCE_PLACE
-        self.grid[:, :, CLOCK_PLACE][inside_ij] = clock
-        self.grid[:, :, CLOCK_UPDATED][inside_ij] = clock
+    def move(self, direction_quaternion, trajectory, clock, mark_cells=True):
+        """Move the robot in allocentric memory. Mark the traversed cells Free unless mark_cells is False.
+        Returns the new position. If body_quaternion is identity then the translation is allocentric"""
+        if mark_cells:
+            self.own_grid()
+            # Mark the cells traversed by the robot
+            alo_covered_area = trajectory.covered_area + self.robot_point
+            cell_i, cell_j = self.cells_in_rectangle(alo_covered_area)
+            self.grid[cell_i, cell_j, STATUS_FLOOR] = EXPERIENCE_PLACE
+            self.grid[cell_i, cell_j, CLOCK_PLACE] = clock
+            self.grid[cell_i, cell_j, CLOCK_UPDATED] = clock
+            self.mark_changed((cell_i, cell_j))
         # The new position of the robot
         self.robot_point += quaternion.apply_to_vector(direction_quaternion, trajectory.translation)
 
     def roll(self, point):
         """Roll allocentric memory to place the point at the center"""
+        # The tiled grid does not wrap around so it does not need to be rolled
+        if self.is_tiled:
+            return
         i, j = point_to_cell(point)
         xy = self.grid[i, j, POINT_X:POINT_Y + 1]
-        self.grid = np.roll(self.grid, (-i, -j), axis=(0, 1))
-        self.grid[:, :, POINT_X:POINT_Y + 1] -= xy
+        # Only the origin of the grid moves. The storage remains shared with the snapshots until written
+        self.grid = self.grid.roll((-i, -j))
+        self.grid.translate_points(-xy)
+        # All the cells have moved
+        self.mark_changed((slice(None), slice(None)))
         self.robot_point[0:2] -= xy
 
     def place_robot(self, body_memory, clock):
         """Apply the PLACE status to the cells at the position of the robot"""
         start_time = time.time()
+        self.own_grid()
         outline = body_memory.outline() + self.robot_point
-        inside_ij = np.where(is_inside_rectangle(self.grid[:, :, POINT_X], self.grid[:, :, POINT_Y], outline))
-        self.grid[:, :, STATUS_FLOOR][inside_ij] = EXPERIENCE_PLACE
-        self.grid[:, :, CLOCK_PLACE][inside_ij] = clock
-        self.grid[:, :, CLOCK_UPDATED][inside_ij] = clock
+        cell_i, cell_j = self.cells_in_rectangle(outline)
+        self.grid[cell_i, cell_j, STATUS_FLOOR] = EXPERIENCE_PLACE
+        self.grid[cell_i, cell_j, CLOCK_PLACE] = clock
+        self.grid[cell_i, cell_j, CLOCK_UPDATED] = clock
+        self.mark_changed((cell_i, cell_j))
         # print("Place robot time:", time.time() - start_time, "seconds")
 
     def clear_grid_status(self, clock):
         """Reset the status of cells where there is a phenomenon, except PLACE status"""
+        self.own_grid()
+        # The tiled grid only scans the allocated tiles
+        cell_i, cell_j = self.grid.cells()
         # Reset the phenomena
-        phenomena_ij = np.where(self.grid[:, :, PHENOMENON_ID] != -1)
-        self.grid[:, :, STATUS_ECHO][phenomena_ij] = CELL_UNKNOWN
-        self.grid[:, :, CLOCK_PHENOMENON][phenomena_ij] = 0
-        self.grid[:, :, PHENOMENON_ID][phenomena_ij] = -1
-        self.grid[:, :, CLOCK_UPDATED][phenomena_ij] = clock
-        self.grid[:, :, STATUS_FLOOR][phenomena_ij] = np.where(
-            self.grid[:, :, STATUS_FLOOR][phenomena_ij] != EXPERIENCE_PLACE, CELL_UNKNOWN,
-            self.grid[:, :, STATUS_FLOOR][phenomena_ij])
+        is_phenomenon = self.grid[cell_i, cell_j, PHENOMENON_ID] != -1
+        phenomena_ij = cell_i[is_phenomenon], cell_j[is_phenomenon]
+        self.grid[phenomena_ij + (STATUS_ECHO,)] = CELL_UNKNOWN
+        self.grid[phenomena_ij + (CLOCK_PHENOMENON,)] = 0
+        self.grid[phenomena_ij + (PHENOMENON_ID,)] = -1
+        self.grid[phenomena_ij + (CLOCK_UPDATED,)] = clock
+        self.mark_changed(phenomena_ij)
+        self.grid[phenomena_ij + (STATUS_FLOOR,)] = np.where(
+            self.grid[phenomena_ij + (STATUS_FLOOR,)] != EXPERIENCE_PLACE, CELL_UNKNOWN,
+            self.grid[phenomena_ij + (STATUS_FLOOR,)])
         # Reset the place cells
-        places_ij = np.where(self.grid[:, :, PLACE_CELL_ID] > 0)
-        self.grid[:, :, PLACE_CELL_ID][places_ij] = 0
+        is_place = self.grid[cell_i, cell_j, PLACE_CELL_ID] > 0
+        places_ij = cell_i[is_place], cell_j[is_place]
+        self.grid[places_ij + (PLACE_CELL_ID,)] = 0
+        self.mark_changed(places_ij)
 
     def apply_status_to_cell(self, i, j, status, clock, color_index):
         """Change the cell status. Keep the max clock"""
         if (self.min_i <= i <= self.max_i) and (self.min_j <= j <= self.max_j):
-            self.grid[i][j][CLOCK_UPDATED] = clock
+            self.own_grid()
+            self.grid[i, j, CLOCK_UPDATED] = clock
+            self.mark_changed((i, j))
             if status in [EXPERIENCE_FLOOR, EXPERIENCE_PLACE]:
-                self.grid[i][j][STATUS_FLOOR] = status
-                self.grid[i][j][CLOCK_PLACE] = max(clock, self.grid[i][j][CLOCK_PLACE])
-                self.grid[i][j][COLOR_INDEX] = color_index
+                self.grid[i, j, STATUS_FLOOR] = status
+                self.grid[i, j, CLOCK_PLACE] = max(clock, self.grid[i, j, CLOCK_PLACE])
+                self.grid[i, j, COLOR_INDEX] = color_index
             else:
-                self.grid[i][j][STATUS_ECHO] = status
-                self.grid[i][j][CLOCK_INTERACTION] = max(clock, self.grid[i][j][CLOCK_INTERACTION])
+                self.grid[i, j, STATUS_ECHO] = status
+                self.grid[i, j, CLOCK_INTERACTION] = max(clock, self.grid[i, j, CLOCK_INTERACTION])
         else:
             pass
             # print("Error: cell out of grid, i:", i, "j:", j, "Status:", status)
 
+    def apply_status_to_cells(self, cell_i, cell_j, statuses, clocks, color_indexes):
+        """Change the status of the cells in the order of the arrays, as apply_status_to_cell() would do.
+        Return the mask of the cells that are inside the grid"""
+        self.own_grid()
+        inside = self.is_inside_grid(cell_i, cell_j)
+        cell_i, cell_j, statuses = cell_i[inside], cell_j[inside], statuses[inside]
+        clocks, color_indexes = clocks[inside], color_indexes[inside]
+        # The last write on each cell sets the updated clock
+        last = self.last_writes(cell_i, cell_j)
+        self.grid[cell_i[last], cell_j[last], CLOCK_UPDATED] = clocks[last]
+        self.mark_changed((cell_i, cell_j))
+        # FLOOR and PLACE statuses: the last write sets the status and the color, the place clock is the max
+        is_floor = np.isin(statuses, [EXPERIENCE_FLOOR, EXPERIENCE_PLACE])
+        floor_i, floor_j, floor_clocks = cell_i[is_floor], cell_j[is_floor], clocks[is_floor]
+        last = self.last_writes(floor_i, floor_j)
+        self.grid[floor_i[last], floor_j[last], STATUS_FLOOR] = statuses[is_floor][last]
+        self.grid[floor_i[last], floor_j[last], COLOR_INDEX] = color_indexes[is_floor][last]
+        self.maximum_at(CLOCK_PLACE, floor_i, floor_j, floor_clocks)
+        # Other statuses: the last write sets the status, the interaction clock is the max
+        echo_i, echo_j, echo_clocks = cell_i[~is_floor], cell_j[~is_floor], clocks[~is_floor]
+        last = self.last_writes(echo_i, echo_j)
+        self.grid[echo_i[last], echo_j[last], STATUS_ECHO] = statuses[~is_floor][last]
+        self.maximum_at(CLOCK_INTERACTION, echo_i, echo_j, echo_clocks)
+        return inside
+
+    def draw(self, drawings, clock):
+        """Apply the drawings (points, status, clock, color_index, phenomenon_id) to the grid in a single batch"""
+        drawings = [d for d in drawings if len(d[0]) > 0]
+        if len(drawings) == 0:
+            return
+        points = np.concatenate([np.asarray(d[0])[:, 0:2] for d in drawings])
+        statuses, clocks, color_indexes = (np.concatenate([np.broadcast_to(d[k], len(d[0])) for d in drawings])
+                                           for k in range(1, 4))
+        # The affordances that are not attached to phenomena have phenomenon_id None
+        is_phenomenon = np.concatenate([np.full(len(d[0]), d[4] is not None) for d in drawings])
+        phenomenon_ids = np.concatenate([np.full(len(d[0]), -1 if d[4] is None else d[4]) for d in drawings])
+        cell_i, cell_j = points_to_cells(points, self.cell_radius, not self.is_tiled)
+        inside = self.apply_status_to_cells(cell_i, cell_j, statuses.astype(int), clocks.astype(int),
+                                            color_indexes.astype(int))
+        # Attribute the phenomena to their cells. The last phenomenon drawn on a cell wins
+        is_phenomenon &= inside
+        cell_i, cell_j, phenomenon_ids = cell_i[is_phenomenon], cell_j[is_phenomenon], phenomenon_ids[is_phenomenon]
+        last = self.last_writes(cell_i, cell_j)
+        self.grid[cell_i[last], cell_j[last], PHENOMENON_ID] = phenomenon_ids[last]
+        self.grid[cell_i, cell_j, CLOCK_UPDATED] = clock
+        self.mark_changed((cell_i, cell_j))
+
+    def is_inside_grid(self, cell_i, cell_j):
+        """Return the mask of the cells that are inside the grid"""
+        return (self.min_i <= cell_i) & (cell_i <= self.max_i) & (self.min_j <= cell_j) & (cell_j <= self.max_j)
+
+    def last_writes(self, cell_i, cell_j):
+        """Return the indexes of the last occurrence of each cell in the arrays of cells"""
+        keys = self.grid.cell_keys(cell_i, cell_j)
+        _, reversed_indexes = np.unique(keys[::-1], return_index=True)
+        return len(keys) - 1 - reversed_indexes
+
+    def maximum_at(self, channel, cell_i, cell_j, values):
+        """Set the channel of the cells to the max of its value and of the values given for that cell"""
+        # After sorting by value, the last occurrence of each cell has the max value
+        order = np.argsort(values, kind='stable')
+        cell_i, cell_j, values = cell_i[order], cell_j[order], values[order]
+        last = self.last_writes(cell_i, cell_j)
+        cell_i, cell_j = cell_i[last], cell_j[last]
+        self.grid[cell_i, cell_j, channel] = np.maximum(self.grid[cell_i, cell_j, channel], values[last])
+
+    def box_cells(self, points):
+        """Return the bounds (i0, i1, j0, j1) of the cells in the bounding box of the points, clipped to the grid"""
+        q, r = points_to_axial(points, self.cell_radius)
+        return (max(int(np.ceil(q.min())), self.min_i), min(int(np.floor(q.max())), self.max_i - 1),
+                max(int(np.ceil(r.min())), self.min_j), min(int(np.floor(r.max())), self.max_j - 1))
+
+    def cells_in_rectangle(self, rectangle):
+        """Return the indexes (cell_i, cell_j) of the cells whose center is inside the rectangle"""
+        cell_i, cell_j = self.grid.cells_in_box(*self.box_cells(rectangle))
+        inside = is_inside_rectangle(self.grid[cell_i, cell_j, POINT_X], self.grid[cell_i, cell_j, POINT_Y], rectangle)
+        return cell_i[inside], cell_j[inside]
+
+    def terrain_mask(self, terrain):
+        """Return the cached (inside, certain) masks of the cells in the bounding box of the terrain outline.
+        The cell at index [0, 0] of the masks is terrain_mask_origin"""
+        key = (terrain.path_version, self.grid[0, 0, POINT_X], self.grid[0, 0, POINT_Y])
+        if key != self.terrain_mask_key:
+            i0, i1, j0, j1 = 0, -1, 0, -1
+            if terrain.path is not None and np.all(np.isfinite(terrain.path.vertices)):
+                i0, i1, j0, j1 = self.box_cells(terrain.path.vertices)
+            shape = (max(i1 - i0 + 1, 0), max(j1 - j0 + 1, 0))
+            cell_i, cell_j = self.grid.cells_in_box(i0, i1, j0, j1)
+            points = np.stack((self.grid[cell_i, cell_j, POINT_X], self.grid[cell_i, cell_j, POINT_Y]), axis=-1)
+            self.terrain_inside = terrain.contains_points(points).reshape(shape)
+            # A cell is certain if the outline does not come close to its center
+            self.terrain_certain = (terrain.path_distances(points) > 2 * self.cell_radius).reshape(shape)
+            self.terrain_mask_origin = (i0, j0)
+            self.terrain_mask_key = key
+        return self.terrain_inside, self.terrain_certain
+
+    def is_inside_terrain(self, terrain, allo_point):
+        """Return terrain.is_inside(allo_point) using the cached terrain mask when the point's cell is certain"""
+        inside, certain = self.terrain_mask(terrain)
+        i, j = point_to_cell(allo_point, self.cell_radius, not self.is_tiled)
+        mask_i, mask_j = i - self.terrain_mask_origin[0], j - self.terrain_mask_origin[1]
+        # The point may be outside the mask, outside the grid (wrapped) or too close to the outline
+        if 0 <= mask_i < inside.shape[0] and 0 <= mask_j < inside.shape[1] and certain[mask_i, mask_j] and \
+                np.linalg.norm(self.grid[i, j, POINT_X:POINT_Y + 1] - allo_point[0:2]) < 1.5 * self.cell_radius:
+            return bool(inside[mask_i, mask_j])
+        return terrain.is_inside(allo_point)
+
     def clear_cell(self, i, j, clock):
         """Reset status_0, color, and phenomenon of that cell"""
         if (self.min_i <= i <= self.max_i) and (self.min_j <= j <= self.max_j):
-            self.grid[i][j][STATUS_FLOOR] = CELL_UNKNOWN
-            self.grid[i][j][CLOCK_PLACE] = clock
-            self.grid[i][j][COLOR_INDEX] = 0
-            self.grid[i][j][PHENOMENON_ID] = -1
-            self.grid[i][j][CLOCK_UPDATED] = clock
+            self.own_grid()
+            self.grid[i, j, STATUS_FLOOR] = CELL_UNKNOWN
+            self.grid[i, j, CLOCK_PLACE] = clock
+            self.grid[i, j, COLOR_INDEX] = 0
+            self.grid[i, j, PHENOMENON_ID] = -1
+            self.grid[i, j, CLOCK_UPDATED] = clock
+            self.mark_changed((i, j))
 
     def mark_echo_area(self, affordance):
         """Mark the area covered by the echolocalization sensor in allocentric memory"""
+        self.mark_echo_areas([affordance])
+
+    def mark_echo_areas(self, affordances):
+        """Mark the areas covered by the echolocalization sensor of a batch of echo affordances"""
         # start_time = time.time()
-        points = affordance.sensor_triangle()
-        triangle = [p[0:2] for p in points]
-        path = mpath.Path(triangle)
-        for i in range(self.min_i, self.max_i):
-            for j in range(self.min_j, self.max_j):
-                if path.contains_point(self.grid[i][j][POINT_X:POINT_Y + 1]):
-                    self.grid[i][j][STATUS_2] = CELL_NO_ECHO
-                    self.grid[i][j][CLOCK_NO_ECHO] = affordance.clock
-                    self.grid[i][j][CLOCK_UPDATED] = affordance.clock
+        if len(affordances) == 0:
+            return
+        self.own_grid()
+        triangles = np.array([a.sensor_triangle() for a in affordances], dtype=float)[:, :, 0:2]
+        clocks = np.array([a.clock for a in affordances], dtype=int)
+        # The bounding box of each triangle in axial coordinates, clipped to the grid
+        q, r = points_to_axial(triangles, self.cell_radius)
+        q0 = np.maximum(np.ceil(q.min(axis=1)).astype(int), self.min_i)
+        q1 = np.minimum(np.floor(q.max(axis=1)).astype(int), self.max_i - 1)
+        r0 = np.maximum(np.ceil(r.min(axis=1)).astype(int), self.min_j)
+        r1 = np.minimum(np.floor(r.max(axis=1)).astype(int), self.max_j - 1)
+        # The sub-grids of all the triangles padded to the largest bounding box
+        cell_i = q0[:, np.newaxis, np.newaxis] + np.arange(max(np.max(q1 - q0) + 1, 0))[:, np.newaxis]
+        cell_j = r0[:, np.newaxis, np.newaxis] + np.arange(max(np.max(r1 - r0) + 1, 0))
+        cell_i, cell_j = np.broadcast_arrays(cell_i, cell_j)
+        in_box = (cell_i <= q1[:, np.newaxis, np.newaxis]) & (cell_j <= r1[:, np.newaxis, np.newaxis])
+        inside = in_box & is_inside_triangles(self.grid[cell_i, cell_j, POINT_X], self.grid[cell_i, cell_j, POINT_Y],
+                                               triangles)
+        # The cells in the order of the affordances. If a cell is in several triangles then the last one wins
+        k, cell_i, cell_j = np.nonzero(inside)[0], cell_i[inside], cell_j[inside]
+        self.grid[cell_i, cell_j, STATUS_2] = CELL_NO_ECHO
+        last = self.last_writes(cell_i, cell_j)
+        self.grid[cell_i[last], cell_j[last], CLOCK_NO_ECHO] = clocks[k[last]]
+        self.grid[cell_i[last], cell_j[last], CLOCK_UPDATED] = clocks[k[last]]
+        self.mark_changed((cell_i, cell_j))
         # print("Place echo time:", time.time() - start_time, "seconds")
 
     def update_focus(self, allo_focus, clock):
         """Update the focus in allocentric memory"""
+        self.own_grid()
         # Clear the previous focus cell
         if self.focus_i is not None:
             # if (self.min_i <= self.focus_i <= self.max_i) and (self.min_j <= self.focus_j <= self.max_j):
-            self.grid[self.focus_i][self.focus_j][STATUS_3] = CELL_UNKNOWN
-            self.grid[self.focus_i][self.focus_j][CLOCK_UPDATED] = clock
+            self.grid[self.focus_i, self.focus_j, STATUS_3] = CELL_UNKNOWN
+            self.grid[self.focus_i, self.focus_j, CLOCK_UPDATED] = clock
+            self.mark_changed((self.focus_i, self.focus_j))
         # Add the new focus cell
         if allo_focus is not None:
-            self.focus_i, self.focus_j = point_to_cell(allo_focus, self.cell_radius)
+            self.focus_i, self.focus_j = point_to_cell(allo_focus, self.cell_radius, not self.is_tiled)
             if (self.min_i <= self.focus_i <= self.max_i) and (self.min_j <= self.focus_j <= self.max_j):
-                self.grid[self.focus_i][self.focus_j][STATUS_3] = EXPERIENCE_FOCUS
-                self.grid[self.focus_i][self.focus_j][CLOCK_FOCUS] = clock
-                self.grid[self.focus_i][self.focus_j][CLOCK_UPDATED] = clock
+                self.grid[self.focus_i, self.focus_j, STATUS_3] = EXPERIENCE_FOCUS
+                self.grid[self.focus_i, self.focus_j, CLOCK_FOCUS] = clock
+                self.grid[self.focus_i, self.focus_j, CLOCK_UPDATED] = clock
+                self.mark_changed((self.focus_i, self.focus_j))
 
     def update_prompt(self, allo_prompt, clock):
         """Update the prompt in allocentric memory"""
+        self.own_grid()
         # Clear the previous prompt cell
         if self.prompt_i is not None:
             # if (self.min_i <= self.prompt_i <= self.max_i) and (self.min_j <= self.prompt_j <= self.max_j):
-            self.grid[self.prompt_i][self.prompt_j][STATUS_4] = CELL_UNKNOWN
-            self.grid[self.prompt_i][self.prompt_j][CLOCK_UPDATED] = clock
+            self.grid[self.prompt_i, self.prompt_j, STATUS_4] = CELL_UNKNOWN
+            self.grid[self.prompt_i, self.prompt_j, CLOCK_UPDATED] = clock
+            self.mark_changed((self.prompt_i, self.prompt_j))
         # Add the new prompt cell
         if allo_prompt is not None:
-            self.prompt_i, self.prompt_j = point_to_cell(allo_prompt, self.cell_radius)
+            self.prompt_i, self.prompt_j = point_to_cell(allo_prompt, self.cell_radius, not self.is_tiled)
             if (self.min_i <= self.prompt_i <= self.max_i) and (self.min_j <= self.prompt_j <= self.max_j):
-                self.grid[self.prompt_i][self.prompt_j][STATUS_4] = EXPERIENCE_PROMPT
-                self.grid[self.prompt_i][self.prompt_j][CLOCK_PROMPT] = clock
-                self.grid[self.prompt_i][self.prompt_j][CLOCK_UPDATED] = clock
+                self.grid[self.prompt_i, self.prompt_j, STATUS_4] = EXPERIENCE_PROMPT
+                self.grid[self.prompt_i, self.prompt_j, CLOCK_PROMPT] = clock
+                self.grid[self.prompt_i, self.prompt_j, CLOCK_UPDATED] = clock
+                self.mark_changed((self.prompt_i, self.prompt_j))
                 # print("Prompt in cell", self.prompt_i, ", ", self.prompt_j)
 
     def save(self):
         """Return a clone of allocentric memory for memory snapshot"""
-        saved_allocentric_memory = AllocentricMemory(self.width, self.height, self.cell_radius)
+        # Copy on write: the grid is shared and copied when it is modified
+        saved_allocentric_memory = AllocentricMemory(self.width, self.height, self.cell_radius, self.is_tiled,
+                                                     self.grid)
         saved_allocentric_memory.robot_point[:] = self.robot_point
         saved_allocentric_memory.focus_i = self.focus_i
         saved_allocentric_memory.focus_j = self.focus_j
         saved_allocentric_memory.prompt_i = self.prompt_i
         saved_allocentric_memory.prompt_j = self.prompt_j
         saved_allocentric_memory.affordances = [a.save() for a in self.affordances]
-        saved_allocentric_memory.grid[:, :, :] = self.grid
+        saved_allocentric_memory.write_count = self.write_count
+        saved_allocentric_memory.saved_write_count = self.write_count
+        saved_allocentric_memory.is_shared = True
+        self.is_shared = True
         saved_allocentric_memory.user_cells = [e for e in self.user_cells]
+        # The masks are never modified in place
+        saved_allocentric_memory.terrain_mask_key = self.terrain_mask_key
+        saved_allocentric_memory.terrain_mask_origin = self.terrain_mask_origin
+        saved_allocentric_memory.terrain_inside = self.terrain_inside
+        saved_allocentric_memory.terrain_certain = self.terrain_certain
+        saved_allocentric_memory.floor_distance_field = self.floor_distance_field
 
         return saved_allocentric_memory
@@ -0,0 +1,105 @@
+########################################################################################
+# The distance field of the FLOOR cells and of the terrain outline over the hexagonal grid
+# Each cell holds the distance from its center to the nearest FLOOR cell center or terrain outline
+# The distance is negative for the cells outside the enclosed terrain
+# A field is never modified: a new field is built when the FLOOR cells or the terrain change
+# Used to find the first FLOOR cell or terrain outline on a segment in a few lookups (sphere tracing)
+########################################################################################
+
+import numpy as np
+from scipy.spatial import cKDTree
+from . import STATUS_FLOOR, POINT_X, POINT_Y
+from .Geometry import point_to_cell
+from ..EgocentricMemory.Experience import EXPERIENCE_FLOOR
+
+
+def field_key(allocentric_memory, terrain):
+    """Return the key that changes when the grid is rolled or the terrain outline changes"""
+    grid = allocentric_memory.grid
+    terrain_key = None if terrain is None else (terrain.path_version, tuple(np.asarray(terrain.point).tolist()))
+    return grid[0, 0, POINT_X], grid[0, 0, POINT_Y], terrain_key
+
+
+class FloorDistanceField:
+    """The distance from the center of each cell of the dense grid to the nearest FLOOR cell or terrain outline"""
+    def __init__(self, allocentric_memory, terrain=None):
+        """Compute the field of the FLOOR cells of allocentric memory and of the outline of the terrain if not None"""
+        grid = allocentric_memory.grid
+        self.cell_radius = allocentric_memory.cell_radius
+        self.key = field_key(allocentric_memory, terrain)
+        self.write_count = allocentric_memory.write_count
+        self.floor = grid[:, :, STATUS_FLOOR] == EXPERIENCE_FLOOR
+        self.points = np.stack((grid[:, :, POINT_X], grid[:, :, POINT_Y]), axis=-1).astype(float)
+        points = self.points.reshape(-1, 2)
+        distances = np.full(len(points), np.inf)
+        if self.floor.any():
+            distances, _ = cKDTree(points[self.floor.flatten()]).query(points)
+        if terrain is not None and terrain.path is not None:
+            # The terrain outline is in terrain-centric coordinates
+            terrain_points = points - np.asarray(terrain.point)[0:2]
+            distances = np.minimum(distances, terrain.path_distances(terrain_points))
+            distances = np.where(terrain.contains_points(terrain_points), distances, -distances)
+        self.distances = distances.reshape(self.floor.shape)
+
+    def is_valid(self, allocentric_memory, terrain=None):
+        """Return True if the FLOOR cells of allocentric memory and the terrain have not changed"""
+        if field_key(allocentric_memory, terrain) != self.key:
+            return False
+        # Only the cells written after the field was computed may have a different FLOOR status
+        changed_i, changed_j, _ = allocentric_memory.changed_cells(self.write_count)
+        return np.array_equal(allocentric_memory.grid[changed_i, changed_j, STATUS_FLOOR] == EXPERIENCE_FLOOR,
+                              self.floor[changed_i, changed_j])
+
+    def cell(self, point):
+        """Return the cell (i, j) of the point or None if the point is outside the grid"""
+        i, j = point_to_cell(point, self.cell_radius, True)
+        # The indexes wrap around the grid: the cell of a point outside the grid is far from the point
+        if np.linalg.norm(self.points[i, j] - point[0:2]) > 1.5 * self.cell_radius:
+            return None
+        return i, j
+
+    def distance(self, point):
+        """Return the distance of the cell of the point or None if the point is outside the grid"""
+        cell = self.cell(point)
+        return None if cell is None else self.distances[cell]
+
+    def free_distance(self, start, end):
+        """Return the distance from start along the segment to end where the segment may come near a FLOOR cell or
+        the terrain outline. Return inf if the whole segment is clear and None if it goes outside the grid"""
+        start, end = np.asarray(start, dtype=float)[0:2], np.asarray(end, dtype=float)[0:2]
+        length = np.linalg.norm(end - start)
+        direction = (end - start) / length if length > 0 else np.zeros(2)
+        t = 0.
+        while t <= length:
+            distance = self.distance(start + t * direction)
+            if distance is None:
+                return None
+            # The points of the cell are at most cell_radius from its center (plus the rounding of the center)
+            step = abs(distance) - self.cell_radius - 1
+            if step < self.cell_radius / 4:
+                return t
+            t += step
+        return np.inf
+
+    def first_floor_cell(self, start, end):
+        """Return the first FLOOR cell (i, j) on the segment from start to end or None.
+        If the segment goes outside the grid then only check the cell of end"""
+        start, end = np.asarray(start, dtype=float)[0:2], np.asarray(end, dtype=float)[0:2]
+        length = np.linalg.norm(end - start)
+        direction = (end - start) / length if length > 0 else np.zeros(2)
+        t = 0.
+        while True:
+            free = self.free_distance(start + t * direction, end)
+            if free is None:
+                cell = self.cell(end)
+                return cell if cell is not None and self.floor[cell] else None
+            if free == np.inf:
+                return None
+            # Check the cells near the FLOOR cells with steps smaller than the cells
+            t = min(t + free, length)
+            cell = self.cell(start + t * direction)
+            if self.floor[cell]:
+                return cell
+            if t >= length:
+                return None
+            t += self.cell_radius / 2
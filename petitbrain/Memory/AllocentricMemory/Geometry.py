@@ -8,22 +8,28 @@
 ########################################################################################
 
 import numpy as np
-from petitbrain.Memory import CELL_RADIUS, GRID_WIDTH, GRID_HEIGHT
+from petitbrain.Memory import CELL_RADIUS, GRID_WIDTH, GRID_HEIGHT, GRID_TILED
 
 
 def cell_to_point(q, r, radius=CELL_RADIUS):
-    """Convert cell axial coordinates to allocentric position"""
-    x = (3/2 * q) * radius
-    y = (np.sqrt(3)/2 * q + np.sqrt(3) * r) * radius
-    return np.transpose(np.array([x, y]), axes=(1, 2, 0))
+    """Convert cell axial coordinates (arrays of any shape) to allocentric positions (..., 2)"""
+    x = (3/2 * np.asarray(q)) * radius
+    y = (np.sqrt(3)/2 * np.asarray(q) + np.sqrt(3) * np.asarray(r)) * radius
+    return np.stack((x, y), axis=-1)
 
 
-def point_to_cell(point, radius=CELL_RADIUS):
-    """Convert allocentric position to cell axial coordinates."""
+def point_to_cell(point, radius=CELL_RADIUS, wrap=not GRID_TILED):
+    """Convert allocentric position to cell axial coordinates. Wrap around the grid unless the grid is tiled"""
     q = (2 * point[0]) / (3 * radius)
     r = (-point[0] + np.sqrt(3) * point[1]) / (3 * radius)
     q, r = axial_round(q, r)
-    # Rhombus wrap
+    if wrap:
+        return wrap_cells(q, r)
+    return q, r
+
+
+def wrap_cells(q, r):
+    """Rhombus wrap of the cell axial coordinates (int or arrays) into the GRID_WIDTH x GRID_HEIGHT grid"""
     q = (q + int((GRID_WIDTH - 0.5) // 2)) % GRID_WIDTH - int((GRID_WIDTH - 0.5) // 2)
     r = (r + int((GRID_HEIGHT - 0.5) // 2)) % GRID_HEIGHT - int((GRID_HEIGHT - 0.5) // 2)
     return q, r
@@ -48,12 +54,58 @@ def axial_round(q, r):
     return x, z
 
 
+def points_to_cells(points, radius=CELL_RADIUS, wrap=not GRID_TILED):
+    """Convert an array of allocentric positions (N, 2 or 3) to the arrays of cell axial coordinates (q, r)
+    like point_to_cell(). np.stack((q, r), axis=1) gives the (N, 2) array of cells"""
+    q, r = axial_round_array(*points_to_axial(np.asarray(points, dtype=float), radius))
+    if wrap:
+        return wrap_cells(q, r)
+    return q, r
+
+
+def axial_round_array(q, r):
+    """Round the arrays of axial coordinates like axial_round()"""
+    # np.rint rounds half to even like Python round()
+    x = np.rint(q)
+    z = np.rint(r)
+    y = np.rint(-x - z)
+
+    x_diff = np.abs(x - q)
+    y_diff = np.abs(y - (-x - z))
+    z_diff = np.abs(z - r)
+
+    is_x = (x_diff > y_diff) & (x_diff > z_diff)
+    is_y = ~is_x & (y_diff > z_diff)
+    is_z = ~is_x & ~is_y
+    x = np.where(is_x, -y - z, x)
+    z = np.where(is_z, -x - y, z)
+    return x.astype(int), z.astype(int)
+
+
 def is_pool(i, j):
     """Return 1 if this cell is a pool center with aperture 7"""
     # https://ieeexplore.ieee.org/document/8853238
     return np.where((i - 2 * j) % 7 == 0, 1, 0)
 
 
+# The pool centers form a coarser hexagonal grid with axes (2, 1) and (-1, 3)
+HEX_NEIGHBORS = np.array([[0, 0], [1, 0], [0, 1], [-1, 1], [-1, 0], [0, -1], [1, -1]])  # The cell and its neighbors
+POOL_CENTER_OFFSETS = np.array([[0, 0], [-1, 0], [0, 1], [-1, 1], [1, -1], [0, -1], [1, 0]])  # By (i - 2 * j) % 7
+
+
+def pool_of(i, j):
+    """Return the axial coordinates (u, v) in the coarser grid of the pools that contain the cells (i, j)"""
+    offsets = POOL_CENTER_OFFSETS[(np.asarray(i) - 2 * np.asarray(j)) % 7]
+    center_i, center_j = i + offsets[..., 0], j + offsets[..., 1]
+    return (3 * center_i + center_j) // 7, (2 * center_j - center_i) // 7
+
+
+def pool_cells(u, v):
+    """Return the axial coordinates (i, j) (..., 7) of the cells of the pools (u, v) of the coarser grid"""
+    center_i, center_j = 2 * np.asarray(u) - v, np.asarray(u) + 3 * np.asarray(v)
+    return center_i[..., np.newaxis] + HEX_NEIGHBORS[:, 0], center_j[..., np.newaxis] + HEX_NEIGHBORS[:, 1]
+
+
 def is_inside_rectangle(x, y, r):
     """Return True for the points that are inside the rectangle"""
     # https://stackoverflow.com/questions/2752725/finding-whether-a-point-lies-inside-a-rectangle-or-not
@@ -62,3 +114,22 @@ def is_inside_rectangle(x, y, r):
     d3 = (r[3, 0] - r[2, 0]) * (y - r[2, 1]) - (x - r[2, 0]) * (r[3, 1] - r[2, 1]) > 0
     d4 = (r[0, 0] - r[3, 0]) * (y - r[3, 1]) - (x - r[3, 0]) * (r[0, 1] - r[3, 1]) > 0
     return np.logical_and(np.logical_and(np.logical_and(d1, d2), d3), d4)
+
+
+def is_inside_triangles(x, y, t):
+    """Return True for the points that are inside the triangles t (T, 3, 2). x and y are (T, ...)"""
+    # Broadcast the vertices over the trailing dimensions of x and y
+    t = t.reshape(t.shape[0:2] + (2,) + (1,) * (np.ndim(x) - 1))
+    d1 = (t[:, 1, 0] - t[:, 0, 0]) * (y - t[:, 0, 1]) - (x - t[:, 0, 0]) * (t[:, 1, 1] - t[:, 0, 1])
+    d2 = (t[:, 2, 0] - t[:, 1, 0]) * (y - t[:, 1, 1]) - (x - t[:, 1, 0]) * (t[:, 2, 1] - t[:, 1, 1])
+    d3 = (t[:, 0, 0] - t[:, 2, 0]) * (y - t[:, 2, 1]) - (x - t[:, 2, 0]) * (t[:, 0, 1] - t[:, 2, 1])
+    # The triangles may be clockwise or counterclockwise
+    return ((d1 > 0) & (d2 > 0) & (d3 > 0)) | ((d1 < 0) & (d2 < 0) & (d3 < 0))
+
+
+def points_to_axial(points, radius=CELL_RADIUS):
+    """Return the fractional axial coordinates (q, r) of the points (..., 2 or 3) without rounding nor wrapping"""
+    points = np.asarray(points)
+    q = (2 * points[..., 0]) / (3 * radius)
+    r = (-points[..., 0] + np.sqrt(3) * points[..., 1]) / (3 * radius)
+    return q, r
@@ -0,0 +1,142 @@
+########################################################################################
+# The storage of the hexagonal grid of allocentric memory
+# One compact array per channel. The channels are indexed with the channel constants:
+# grid[i, j, STATUS_FLOOR], grid[:, :, CLOCK_PLACE], grid[i, j, POINT_X:POINT_Y + 1], grid[i, j]
+# The static channels POINT_X, POINT_Y, IS_POOL are read-only and shared between all the grids
+# The indexes wrap around the grid: negative indexes are used for negative positions
+# The grid is a ring buffer: rolling the grid only moves the origin of the indexes in the storage
+########################################################################################
+
+import numpy as np
+from . import STATUS_FLOOR, STATUS_ECHO, STATUS_2, STATUS_3, STATUS_4, CLOCK_NO_ECHO, COLOR_INDEX, CLOCK_FOCUS, \
+    CLOCK_INTERACTION, CLOCK_PROMPT, CLOCK_PHENOMENON, CLOCK_PLACE, PHENOMENON_ID, POINT_X, POINT_Y, IS_POOL, \
+    PLACE_CELL_ID, CLOCK_UPDATED
+from .Geometry import cell_to_point, is_pool
+
+NB_CHANNELS = CLOCK_UPDATED + 1
+WRITE_STAMP = NB_CHANNELS  # The write count of the last write in the cell. Not part of the cell vector
+CHANNEL_DTYPES = {STATUS_FLOOR: np.int8, STATUS_ECHO: np.int8, STATUS_2: np.int8, STATUS_3: np.int8,
+                  STATUS_4: np.int8, CLOCK_NO_ECHO: np.int32, COLOR_INDEX: np.int8, CLOCK_FOCUS: np.int32,
+                  CLOCK_INTERACTION: np.int32, CLOCK_PROMPT: np.int32, CLOCK_PHENOMENON: np.int32,
+                  CLOCK_PLACE: np.int32, PHENOMENON_ID: np.int32, POINT_X: np.int32, POINT_Y: np.int32,
+                  IS_POOL: np.int8, PLACE_CELL_ID: np.int32, CLOCK_UPDATED: np.int32, WRITE_STAMP: np.int32}
+CHANNEL_INITIAL_VALUES = {PHENOMENON_ID: -1}
+STATIC_CHANNELS = {}  # The static channels of each grid size. Computed once.
+
+
+def read_only(array):
+    """Return the array after making it read-only so it can be shared between grids"""
+    array.flags.writeable = False
+    return array
+
+
+def static_channels(width, height, cell_radius):
+    """Return the read-only POINT_X, POINT_Y, IS_POOL channels shared by the grids of that size"""
+    key = (width, height, cell_radius)
+    if key not in STATIC_CHANNELS:
+        # Indexes after max_i and max_j are used for negative positions
+        i_range = np.concatenate((np.arange(0, width // 2 + 1), np.arange(-width // 2 + 1, 0)))
+        j_range = np.concatenate((np.arange(0, height // 2 + 1), np.arange(-height // 2 + 1, 0)))
+        mesh_i, mesh_j = np.meshgrid(i_range, j_range, indexing='ij')
+        points = cell_to_point(mesh_i, mesh_j, cell_radius)
+        STATIC_CHANNELS[key] = {POINT_X: read_only(points[:, :, 0].astype(CHANNEL_DTYPES[POINT_X])),
+                                POINT_Y: read_only(points[:, :, 1].astype(CHANNEL_DTYPES[POINT_Y])),
+                                IS_POOL: read_only(is_pool(mesh_i, mesh_j).astype(CHANNEL_DTYPES[IS_POOL]))}
+    return STATIC_CHANNELS[key]
+
+
+class HexGrid:
+    """The channels of the hexagonal grid"""
+    def __init__(self, width, height, cell_radius, channels=None, origin=(0, 0), point_offset=(0, 0)):
+        """Create the channels of an empty grid or use the channels provided"""
+        self.shape = (width, height, NB_CHANNELS)
+        self.cell_radius = cell_radius
+        if channels is None:
+            static = static_channels(width, height, cell_radius)
+            channels = [static[c] if c in static else
+                        np.full((width, height), CHANNEL_INITIAL_VALUES.get(c, 0), dtype=CHANNEL_DTYPES[c])
+                        for c in range(WRITE_STAMP + 1)]
+        self.channels = channels
+        self.origin = origin  # The position in the storage of the cell at index (0, 0)
+        self.point_offset = point_offset  # Subtracted from the static POINT_X and POINT_Y channels
+
+    def storage_index(self, i, j):
+        """Return the indexes in the storage of the cells at indexes i, j (int, array or slice)"""
+        if self.origin == (0, 0):
+            return i, j
+        if isinstance(i, slice) and isinstance(j, slice):
+            return np.ix_((np.arange(self.shape[0])[i] + self.origin[0]) % self.shape[0],
+                          (np.arange(self.shape[1])[j] + self.origin[1]) % self.shape[1])
+        if isinstance(i, slice):
+            i = np.arange(self.shape[0])[i]
+        if isinstance(j, slice):
+            j = np.arange(self.shape[1])[j]
+        return (np.asarray(i) + self.origin[0]) % self.shape[0], (np.asarray(j) + self.origin[1]) % self.shape[1]
+
+    def read_channel(self, i, j, c):
+        """Return the values of the channel c of the cells at storage indexes i, j"""
+        if c in [POINT_X, POINT_Y] and self.point_offset != (0, 0):
+            return self.channels[c][i, j] - CHANNEL_DTYPES[c](self.point_offset[c - POINT_X])
+        return self.channels[c][i, j]
+
+    def __getitem__(self, key):
+        """Return the channel value(s) of the cells. grid[i, j] returns the vector of all the channels"""
+        i, j, c = key if len(key) == 3 else key + (slice(0, NB_CHANNELS),)
+        i, j = self.storage_index(i, j)
+        if isinstance(c, slice):
+            return np.stack([self.read_channel(i, j, k) for k in range(*c.indices(WRITE_STAMP + 1))], axis=-1)
+        return self.read_channel(i, j, c)
+
+    def __setitem__(self, key, value):
+        """Set the channel value(s) of the cells"""
+        i, j, c = key if len(key) == 3 else key + (slice(0, NB_CHANNELS),)
+        i, j = self.storage_index(i, j)
+        if isinstance(c, slice):
+            value = np.asarray(value)
+            for k, channel in enumerate(self.channels[c]):
+                channel[i, j] = value[..., k]
+        else:
+            self.channels[c][i, j] = value
+
+    def __array__(self, dtype=None):
+        """Return the grid as a (width, height, NB_CHANNELS) array"""
+        return self[:, :].astype(dtype or int)
+
+    @property
+    def nbytes(self):
+        """The number of bytes of the channels that are copied with the grid"""
+        return sum(channel.nbytes for channel in self.channels if channel.flags.writeable)
+
+    def cells(self):
+        """Return the indexes (cell_i, cell_j) of all the cells"""
+        cell_i, cell_j = np.indices(self.shape[0:2])
+        return cell_i.flatten(), cell_j.flatten()
+
+    def cells_in_box(self, i0, i1, j0, j1):
+        """Return the indexes (cell_i, cell_j) of the cells from i0 to i1 and from j0 to j1 included"""
+        cell_i, cell_j = np.meshgrid(np.arange(i0, i1 + 1), np.arange(j0, j1 + 1), indexing='ij')
+        return cell_i.flatten(), cell_j.flatten()
+
+    def cell_keys(self, cell_i, cell_j):
+        """Return a unique key for each cell. The indexes that wrap to the same cell have the same key"""
+        return np.ravel_multi_index((cell_i, cell_j), self.shape[0:2], mode='wrap')
+
+    def changed_cells(self, since):
+        """Return the indexes (cell_i, cell_j) of the cells whose WRITE_STAMP is greater than since"""
+        storage_i, storage_j = np.nonzero(self.channels[WRITE_STAMP] > since)
+        return (storage_i - self.origin[0]) % self.shape[0], (storage_j - self.origin[1]) % self.shape[1]
+
+    def copy(self):
+        """Return a copy of the grid that shares the read-only channels"""
+        return HexGrid(self.shape[0], self.shape[1], self.cell_radius,
+                       [channel.copy() if channel.flags.writeable else channel for channel in self.channels],
+                       self.origin, self.point_offset)
+
+    def roll(self, shift):
+        """Return a new grid with the cells rolled by shift (i, j) like np.roll. The storage is shared"""
+        origin = ((self.origin[0] - shift[0]) % self.shape[0], (self.origin[1] - shift[1]) % self.shape[1])
+        return HexGrid(self.shape[0], self.shape[1], self.cell_radius, self.channels, origin, self.point_offset)
+
+    def translate_points(self, xy):
+        """Translate the POINT_X and POINT_Y channels by xy"""
+        self.point_offset = (self.point_offset[0] - int(xy[0]), self.point_offset[1] - int(xy[1]))
@@ -0,0 +1,75 @@
+########################################################################################
+# The pyramid of coarser grids obtained by pooling the hexagonal grid with aperture 7
+# Level 1 pools 7 cells of the grid around each pool center, level 2 pools 7 level-1 pools, etc.
+# Each pool summarizes its cells: max clock, number of floor cells, echo cells, and known cells
+# The pyramid is updated from the cells written in allocentric memory since the last update
+########################################################################################
+
+import numpy as np
+from .. import POOL_LEVELS
+from . import STATUS_FLOOR, STATUS_ECHO, STATUS_4, CLOCK_UPDATED, CELL_UNKNOWN
+from .Geometry import pool_of, pool_cells, wrap_cells
+from ..EgocentricMemory.Experience import EXPERIENCE_FLOOR
+
+POOL_MAX_CLOCK = 0  # The max CLOCK_UPDATED of the cells
+POOL_FLOOR = 1  # The number of FLOOR cells
+POOL_ECHO = 2  # The number of cells with an echo status
+POOL_KNOWN = 3  # The number of cells with a known status
+NB_SUMMARIES = 4
+
+
+class PoolPyramid:
+    """The coarser grids of allocentric memory"""
+    def __init__(self, levels=POOL_LEVELS):
+        """Create an empty pyramid"""
+        # The summaries of the pools that have known cells: {(u, v): (max_clock, floor, echo, known)}
+        self.levels = [{} for _ in range(levels)]
+        self.synced_write_count = -1
+
+    def update(self, allocentric_memory):
+        """Update the pools that contain the cells written since the last update"""
+        changed_i, changed_j, self.synced_write_count = allocentric_memory.changed_cells(self.synced_write_count)
+        if len(changed_i) == 0:
+            return
+        if not allocentric_memory.is_tiled:
+            # Use the same signed indexes as point_to_cell()
+            changed_i, changed_j = wrap_cells(changed_i, changed_j)
+        u, v = np.unique(np.stack(pool_of(changed_i, changed_j), axis=1), axis=0).T
+        # Level 1 summarizes the cells of the grid
+        self.store(0, u, v, self.cell_summaries(allocentric_memory, *pool_cells(u, v)))
+        # The higher levels summarize the pools of the level below
+        for level in range(1, len(self.levels)):
+            u, v = np.unique(np.stack(pool_of(u, v), axis=1), axis=0).T
+            child_u, child_v = pool_cells(u, v)
+            summaries = np.array([self.levels[level - 1].get(key, (0,) * NB_SUMMARIES) for key in
+                                  zip(child_u.flatten().tolist(), child_v.flatten().tolist())], dtype=int)
+            self.store(level, u, v, summaries.reshape(child_u.shape + (NB_SUMMARIES,)))
+
+    def cell_summaries(self, allocentric_memory, cell_i, cell_j):
+        """Return the summaries (..., NB_SUMMARIES) of the cells. The cells outside the grid are unknown"""
+        summaries = np.zeros(cell_i.shape + (NB_SUMMARIES,), dtype=int)
+        inside = (allocentric_memory.min_i <= cell_i) & (cell_i < allocentric_memory.max_i) & \
+                 (allocentric_memory.min_j <= cell_j) & (cell_j < allocentric_memory.max_j)
+        statuses = allocentric_memory.grid[cell_i[inside], cell_j[inside], STATUS_FLOOR:STATUS_4 + 1]
+        summaries[inside, POOL_MAX_CLOCK] = allocentric_memory.grid[cell_i[inside], cell_j[inside], CLOCK_UPDATED]
+        summaries[inside, POOL_FLOOR] = statuses[:, STATUS_FLOOR] == EXPERIENCE_FLOOR
+        summaries[inside, POOL_ECHO] = statuses[:, STATUS_ECHO] != CELL_UNKNOWN
+        summaries[inside, POOL_KNOWN] = np.any(statuses != CELL_UNKNOWN, axis=1)
+        return summaries
+
+    def store(self, level, u, v, child_summaries):
+        """Store the summaries of the pools (u, v) computed from the summaries of their 7 children"""
+        summaries = np.concatenate((child_summaries[:, :, POOL_MAX_CLOCK:POOL_MAX_CLOCK + 1].max(axis=1),
+                                    child_summaries[:, :, POOL_FLOOR:].sum(axis=1)), axis=1)
+        for key, summary in zip(zip(u.tolist(), v.tolist()), summaries.tolist()):
+            # Only keep the pools that contain some information
+            if any(summary):
+                self.levels[level][key] = tuple(summary)
+            else:
+                self.levels[level].pop(key, None)
+
+    def summary(self, i, j, level):
+        """Return the summary of the pool of this level (from 1 to POOL_LEVELS) that contains the cell (i, j)"""
+        for _ in range(level):
+            i, j = pool_of(i, j)
+        return self.levels[level - 1].get((int(i), int(j)), (0,) * NB_SUMMARIES)
@@ -0,0 +1,137 @@
+########################################################################################
+# The sparse storage of the hexagonal grid of allocentric memory
+# Square tiles of GRID_TILE_SIZE x GRID_TILE_SIZE cells allocated on demand, keyed by tile coordinates
+# Same channel API as HexGrid but the indexes are the axial coordinates of the cells and do not wrap
+# The static channels POINT_X, POINT_Y, IS_POOL are computed from the axial coordinates
+########################################################################################
+
+import numpy as np
+from .. import GRID_TILE_SIZE
+from . import POINT_X, POINT_Y, IS_POOL
+from .Geometry import cell_to_point, is_pool
+from .HexGrid import NB_CHANNELS, WRITE_STAMP, CHANNEL_DTYPES, CHANNEL_INITIAL_VALUES
+
+STATIC = [POINT_X, POINT_Y, IS_POOL]
+MUTABLE = [c for c in range(WRITE_STAMP + 1) if c not in STATIC]
+KEY_OFFSET = 2 ** 30  # Used to combine the axial coordinates into a single key
+
+
+class TiledHexGrid:
+    """The channels of the sparse hexagonal grid"""
+    def __init__(self, cell_radius, tile_size=GRID_TILE_SIZE):
+        """Create an empty grid. No tile is allocated"""
+        self.shape = (None, None, NB_CHANNELS)
+        self.cell_radius = cell_radius
+        self.tile_size = tile_size
+        self.tiles = {}  # {(tile_i, tile_j): {channel: array}}
+        self.tile_stamps = {}  # The max WRITE_STAMP of each tile
+        self.shared_tiles = set()  # The tiles shared with a copy of the grid (copy on write)
+
+    def new_tile(self):
+        """Return the channels of an empty tile"""
+        return {c: np.full((self.tile_size, self.tile_size), CHANNEL_INITIAL_VALUES.get(c, 0), dtype=CHANNEL_DTYPES[c])
+                for c in MUTABLE}
+
+    def own_tile(self, tile_key):
+        """Return the tile to be modified. Allocate it or copy it if it is shared"""
+        if tile_key not in self.tiles:
+            self.tiles[tile_key] = self.new_tile()
+            self.tile_stamps[tile_key] = 0
+        elif tile_key in self.shared_tiles:
+            self.tiles[tile_key] = {c: channel.copy() for c, channel in self.tiles[tile_key].items()}
+            self.shared_tiles.discard(tile_key)
+        return self.tiles[tile_key]
+
+    def static_channel(self, i, j, c):
+        """Return the values of the static channel c computed from the axial coordinates"""
+        if c in [POINT_X, POINT_Y]:
+            return cell_to_point(i, j, self.cell_radius)[..., c - POINT_X].astype(CHANNEL_DTYPES[c])
+        return is_pool(i, j).astype(CHANNEL_DTYPES[IS_POOL])
+
+    def tile_groups(self, i, j):
+        """Yield the tile key and the mask of the cells of each tile among the cells (i, j)"""
+        tile_i, tile_j = i // self.tile_size, j // self.tile_size
+        tile_keys = np.unique(np.stack((tile_i.flatten(), tile_j.flatten()), axis=1), axis=0)
+        for tile_key in tile_keys:
+            yield tuple(tile_key.tolist()), (tile_i == tile_key[0]) & (tile_j == tile_key[1])
+
+    def __getitem__(self, key):
+        """Return the channel value(s) of the cells. grid[i, j] returns the vector of all the channels"""
+        i, j, c = key if len(key) == 3 else key + (slice(0, NB_CHANNELS),)
+        if isinstance(c, slice):
+            return np.stack([self[i, j, k] for k in range(*c.indices(WRITE_STAMP + 1))], axis=-1)
+        i, j = np.broadcast_arrays(np.asarray(i), np.asarray(j))
+        if c in STATIC:
+            return self.static_channel(i, j, c)[()]
+        # Fast access to a single cell
+        if i.ndim == 0:
+            tile = self.tiles.get((int(i) // self.tile_size, int(j) // self.tile_size))
+            if tile is None:
+                return CHANNEL_DTYPES[c](CHANNEL_INITIAL_VALUES.get(c, 0))
+            return tile[c][int(i) % self.tile_size, int(j) % self.tile_size]
+        values = np.full(i.shape, CHANNEL_INITIAL_VALUES.get(c, 0), dtype=CHANNEL_DTYPES[c])
+        for tile_key, mask in self.tile_groups(i, j):
+            if tile_key in self.tiles:
+                values[mask] = self.tiles[tile_key][c][i[mask] % self.tile_size, j[mask] % self.tile_size]
+        return values
+
+    def __setitem__(self, key, value):
+        """Set the channel value(s) of the cells. Allocate the tiles that do not exist"""
+        i, j, c = key if len(key) == 3 else key + (slice(0, NB_CHANNELS),)
+        if isinstance(c, slice):
+            value = np.asarray(value)
+            for k, channel in enumerate(range(*c.indices(WRITE_STAMP + 1))):
+                self[i, j, channel] = value[..., k]
+            return
+        i, j, value = np.broadcast_arrays(np.asarray(i), np.asarray(j), np.asarray(value))
+        for tile_key, mask in self.tile_groups(i, j):
+            tile = self.own_tile(tile_key)
+            # Assign in the order of the cells so that the last write wins
+            tile[c][i[mask] % self.tile_size, j[mask] % self.tile_size] = value[mask]
+            if c == WRITE_STAMP:
+                self.tile_stamps[tile_key] = max(self.tile_stamps[tile_key], int(value[mask].max()))
+
+    def __array__(self, dtype=None):
+        """Return the allocated cells as a (nb_cells, NB_CHANNELS) array"""
+        cell_i, cell_j = self.cells()
+        return self[cell_i, cell_j].astype(dtype or int)
+
+    @property
+    def nbytes(self):
+        """The number of bytes of the allocated tiles"""
+        return sum(channel.nbytes for tile in self.tiles.values() for channel in tile.values())
+
+    def cells(self, tile_keys=None):
+        """Return the axial coordinates (cell_i, cell_j) of the cells of the allocated tiles"""
+        tile_keys = list(self.tiles) if tile_keys is None else tile_keys
+        if len(tile_keys) == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        offset_i, offset_j = np.indices((self.tile_size, self.tile_size)).reshape(2, -1)
+        tile_keys = np.array(tile_keys, dtype=int)
+        cell_i = (tile_keys[:, 0:1] * self.tile_size + offset_i).flatten()
+        cell_j = (tile_keys[:, 1:2] * self.tile_size + offset_j).flatten()
+        return cell_i, cell_j
+
+    def cells_in_box(self, i0, i1, j0, j1):
+        """Return the axial coordinates (cell_i, cell_j) of the cells from i0 to i1 and from j0 to j1 included"""
+        cell_i, cell_j = np.meshgrid(np.arange(i0, i1 + 1), np.arange(j0, j1 + 1), indexing='ij')
+        return cell_i.flatten(), cell_j.flatten()
+
+    def cell_keys(self, cell_i, cell_j):
+        """Return a unique key for each cell"""
+        return (np.asarray(cell_i, dtype=np.int64) + KEY_OFFSET) * 2 * KEY_OFFSET + cell_j + KEY_OFFSET
+
+    def changed_cells(self, since):
+        """Return the axial coordinates (cell_i, cell_j) of the cells whose WRITE_STAMP is greater than since"""
+        cell_i, cell_j = self.cells([k for k, stamp in self.tile_stamps.items() if stamp > since])
+        changed = self[cell_i, cell_j, WRITE_STAMP] > since
+        return cell_i[changed], cell_j[changed]
+
+    def copy(self):
+        """Return a copy of the grid that shares the tiles until they are modified"""
+        saved_grid = TiledHexGrid(self.cell_radius, self.tile_size)
+        saved_grid.tiles = self.tiles.copy()
+        saved_grid.tile_stamps = self.tile_stamps.copy()
+        saved_grid.shared_tiles = set(self.tiles)
+        self.shared_tiles = set(self.tiles)
+        return saved_grid
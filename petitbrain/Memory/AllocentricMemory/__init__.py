@@ -16,3 +16,6 @@ POINT_Y = 14
 IS_POOL = 15
 PLACE_CELL_ID = 16
 CLOCK_UPDATED = 17
+
+CELL_UNKNOWN = 0
+CELL_NO_ECHO = -4
@@ -0,0 +1,36 @@
+import timeit
+import numpy as np
+from .AllocentricMemory import AllocentricMemory
+from .. import GRID_WIDTH, GRID_HEIGHT, CELL_RADIUS
+from ..EgocentricMemory.Experience import EXPERIENCE_FLOOR
+
+# Benchmark the memory snapshot of allocentric memory
+# py -m petitbrain.Memory.AllocentricMemory
+
+NB_RUNS = 2000
+
+allocentric_memory = AllocentricMemory(GRID_WIDTH, GRID_HEIGHT, CELL_RADIUS)
+rng = np.random.default_rng(0)
+allocentric_memory.apply_status_to_cells(rng.integers(-24, 25, 500), rng.integers(-24, 25, 500),
+                                         np.full(500, EXPERIENCE_FLOOR), rng.integers(1, 100, 500),
+                                         rng.integers(0, 7, 500))
+
+
+def constructor_save():
+    """Clone by constructing an empty memory and replacing its grid, as save() did before"""
+    saved_allocentric_memory = AllocentricMemory(GRID_WIDTH, GRID_HEIGHT, CELL_RADIUS)
+    saved_allocentric_memory.grid = allocentric_memory.grid
+    return saved_allocentric_memory
+
+
+def save_and_write():
+    """Clone and write a cell in the clone, which copies the grid"""
+    saved_allocentric_memory = allocentric_memory.save()
+    saved_allocentric_memory.apply_status_to_cell(0, 0, EXPERIENCE_FLOOR, 100, 0)
+    return saved_allocentric_memory
+
+
+for name, function in [("Constructor and shared grid", constructor_save), ("save()", allocentric_memory.save),
+                       ("save() then write", save_and_write)]:
+    duration = timeit.timeit(function, number=NB_RUNS) / NB_RUNS
+    print(f"{name:28}{duration * 1e6:8.1f} us")
@@ -1,16 +1,21 @@
 import math
 import numpy as np
 from pyrr import Matrix44, Quaternion, Vector3
-from ...Memory.EgocentricMemory.Experience import Experience, EXPERIENCE_LOCAL_ECHO, EXPERIENCE_CENTRAL_ECHO, \
-    EXPERIENCE_PLACE, EXPERIENCE_FLOOR, EXPERIENCE_ALIGNED_ECHO, EXPERIENCE_IMPACT, EXPERIENCE_ROBOT, \
-    EXPERIENCE_TOUCH, EXPERIENCE_COMPASS, EXPERIENCE_NORTH
+from ...Memory.EgocentricMemory.Experience import Experience, ExperienceStore, EXPERIENCE_LOCAL_ECHO, \
+    EXPERIENCE_CENTRAL_ECHO, EXPERIENCE_PLACE, EXPERIENCE_FLOOR, EXPERIENCE_ALIGNED_ECHO, EXPERIENCE_IMPACT, \
+    EXPERIENCE_ROBOT, EXPERIENCE_TOUCH, EXPERIENCE_COMPASS, EXPERIENCE_NORTH
 from ...Robot.RobotDefine import ROBOT_COLOR_SENSOR_X, ROBOT_FLOOR_SENSOR_X, ROBOT_CHASSIS_Y, ROBOT_OUTSIDE_Y, \
     ROBOT_SETTINGS
 from ...Proposer.Action import ACTION_FORWARD, ACTION_BACKWARD, ACTION_SWIPE, ACTION_RIGHTWARD, ACTION_CIRCUMVENT, \
     ACTION_TURN
+from ...Memory import EXPERIENCE_ANCHORED, EXPERIENCE_BUDGET, RUNNING_WINDOW_AZIMUTH
 from ...Utils import quaternion_translation_to_matrix, head_angle_distance_to_matrix, translation_quaternion_to_matrix
 
 EXPERIENCE_PERSISTENCE = 10
+# The min number of cycles the experiences of these types are kept regardless of their durability
+EXPERIENCE_RETENTION = {EXPERIENCE_COMPASS: RUNNING_WINDOW_AZIMUTH, EXPERIENCE_NORTH: RUNNING_WINDOW_AZIMUTH}
+# The max number of experiences of these types (one per cycle)
+EXPERIENCE_TYPE_CAPS = {EXPERIENCE_COMPASS: RUNNING_WINDOW_AZIMUTH + 1, EXPERIENCE_NORTH: RUNNING_WINDOW_AZIMUTH + 1}
 
 
 class EgocentricMemory:
@@ -20,23 +25,30 @@ class EgocentricMemory:
         self.robot_id = robot_id
         self.prompt_point = None  # The point where the agent is prompted do go
         self.focus_point = None  # The point where the agent is focusing
-        self.experiences = {}
+        self.experiences = ExperienceStore(anchored=EXPERIENCE_ANCHORED)  # The experiences by id, stored in arrays
         self.experience_id = 0  # A unique ID for each experience in memory
+        self.is_shared = False  # True if the experience store may be shared with a memory snapshot
+        self.eviction_counts = {"durability": 0, "type_cap": 0, "budget": 0}  # The number of evicted experiences
+        self.evicted_type_counts = {}  # The number of evicted experiences of each type
+
+    def own_experiences(self):
+        """Copy the experience store if it is shared with a memory snapshot (copy on write)"""
+        if self.is_shared:
+            self.experiences = self.experiences.copy()
+            self.is_shared = False
+
+    def displace_experiences(self, displacement_matrix, experience_types=None, excluded_types=()):
+        """Displace the experiences of the given types (all types if None) except the excluded types"""
+        self.own_experiences()
+        self.experiences.displace(displacement_matrix, self.experiences.type_mask(experience_types, excluded_types))
 
     def update_and_add_experiences(self, enaction):
         """ Process the enacted interaction to update the egocentric memory
         - Move the previous experiences
         - Add new experiences
         """
-        # Move the existing experiences
-        for experience in self.experiences.values():
-            # if experience.type == EXPERIENCE_COMPASS:
-            #     # Get the rotation part of the displacement matrix
-            #     # m33 = matrix33.create_from_matrix44(enaction.trajectory.displacement_matrix)
-            #     # experience.displace(matrix44.create_from_matrix33(m33))
-            #     experience.displace(matrix_to_rotation_matrix(enaction.trajectory.displacement_matrix))
-            if experience.type != EXPERIENCE_NORTH:  # Do not move the azimuth experiences for calibration
-                experience.displace(enaction.trajectory.displacement_matrix)
+        # Move the existing experiences. Do not move the azimuth experiences for calibration
+        self.displace_experiences(enaction.trajectory.displacement_matrix, excluded_types=[EXPERIENCE_NORTH])
 
         # Add the PLACE experience with the sensed color
         pose_matrix = Matrix44.from_translation([ROBOT_COLOR_SENSOR_X, 0, 0], dtype=float)
@@ -184,16 +196,55 @@ class EgocentricMemory:
         self.experiences[azimuth_exp.id] = azimuth_exp
         self.experience_id += 1
 
-        # Remove the experiences from egocentric memory when they are two old
-        # self.experiences = [e for e in self.experiences if e.clock >= enacted_interaction["clock"] - e.durability]
+        # Remove the experiences from egocentric memory when they are too old
+        self.evict_experiences(enaction.clock)
+
+    def evict_experiences(self, clock, budget=EXPERIENCE_BUDGET):
+        """Remove the experiences older than their durability, over the cap of their type, or over the budget"""
+        store = self.experiences
+        types = store.types[0:store.count]
+        clocks = store.clocks[0:store.count]
+        retention = store.durabilities[0:store.count].copy()
+        for experience_type, cycles in EXPERIENCE_RETENTION.items():
+            retention[types == experience_type] = np.maximum(retention[types == experience_type], cycles)
+        keep = clocks + retention >= clock
+        self.count_evictions("durability", types[~keep])
+        # Keep the newest experiences of the capped types. The rows are in the order of addition
+        for experience_type, cap in EXPERIENCE_TYPE_CAPS.items():
+            rows = np.flatnonzero(keep & (types == experience_type))[:-cap]
+            keep[rows] = False
+            self.count_evictions("type_cap", types[rows])
+        # Remove the oldest experiences over the budget but never the experiences of this clock
+        nb_over_budget = np.count_nonzero(keep) - budget
+        if nb_over_budget > 0:
+            rows = np.flatnonzero(keep & (clocks < clock))
+            rows = rows[np.argsort(clocks[rows], kind='stable')][0:nb_over_budget]
+            keep[rows] = False
+            self.count_evictions("budget", types[rows])
+        if not keep.all():
+            # The new store leaves the store shared with snapshots unchanged
+            self.experiences = store.subset(np.flatnonzero(keep))
+            self.is_shared = False
+
+    def count_evictions(self, reason, evicted_types):
+        """Add the evicted experiences to the counters"""
+        self.eviction_counts[reason] += len(evicted_types)
+        for experience_type, count in zip(*np.unique(evicted_types, return_counts=True)):
+            self.evicted_type_counts[int(experience_type)] = self.evicted_type_counts.get(int(experience_type), 0) + \
+                int(count)
 
     def save(self):
-        """Return a deep clone of egocentric memory for simulation"""
+        """Return a clone of egocentric memory for simulation. The experiences are shared until written"""
         saved_egocentric_memory = EgocentricMemory(self.robot_id)
         if self.focus_point is not None:
             saved_egocentric_memory.focus_point = self.focus_point.copy()
         if self.prompt_point is not None:
             saved_egocentric_memory.prompt_point = self.prompt_point.copy()
-        saved_egocentric_memory.experiences = {key: e.save() for key, e in self.experiences.items()}
+        # Copy on write: the experience store is copied when it is written
+        saved_egocentric_memory.experiences = self.experiences
+        saved_egocentric_memory.is_shared = True
+        self.is_shared = True
         saved_egocentric_memory.experience_id = self.experience_id
+        saved_egocentric_memory.eviction_counts = self.eviction_counts.copy()
+        saved_egocentric_memory.evicted_type_counts = self.evicted_type_counts.copy()
         return saved_egocentric_memory
@@ -1,3 +1,5 @@
+import bisect
+import numpy as np
 from pyrr import matrix44, Quaternion, Vector3, Matrix44
 from ...Robot.RobotDefine import ROBOT_HEAD_X, ROBOT_COLOR_SENSOR_X
 from .. import EXPERIENCE_DURABILITY
@@ -21,7 +23,8 @@ FLOOR_COLORS = {0: 'LightSlateGrey', 1: 'red', 2: 'darkOrange', 3: 'gold', 4: 'l
 
 class Experience:
     """Experiences are instances of interactions
-    along with the spatial and temporal information of where and when they were enacted"""
+    along with the spatial and temporal information of where and when they were enacted.
+    An experience is a view of a row of an ExperienceStore"""
 
     def __init__(self, experience_id, pose_matrix, experience_type, clock, body_quaternion,
                  durability=EXPERIENCE_DURABILITY, color_index=0):
@@ -32,21 +35,46 @@ class Experience:
         durability : durability of the experience, when it reach zero the experience should be removed from the memory.
         :param body_quaternion:
         """
-        self.id = experience_id
-        self.pose_matrix = pose_matrix
-        self.type = experience_type
-        self.clock = clock
-        self.body_quaternion = body_quaternion.copy()  # Used to place the experience in Place Cell
-        self.durability = durability
-        self.color_index = color_index
+        # The experience is stored in its own store until it is added to egocentric memory
+        self.store = ExperienceStore(1)
+        self.row = self.store.append(experience_id, pose_matrix, experience_type, clock, body_quaternion, durability,
+                                     color_index)
+
+    @property
+    def id(self):
+        return int(self.store.ids[self.row])
+
+    @property
+    def pose_matrix(self):
+        return Matrix44(self.store.egocentric_pose_matrix(self.row))
+
+    @property
+    def type(self):
+        return int(self.store.types[self.row])
+
+    @property
+    def clock(self):
+        return int(self.store.clocks[self.row])
+
+    @property
+    def body_quaternion(self):
+        """Used to place the experience in Place Cell"""
+        return Quaternion(self.store.body_quaternions[self.row])
+
+    @property
+    def durability(self):
+        return int(self.store.durabilities[self.row])
+
+    @property
+    def color_index(self):
+        return int(self.store.color_indexes[self.row])
 
     def __str__(self):
         return f"(id:{self.id}, clock:{self.clock}, type:{self.type}, color_index:{self.color_index})"
 
     def displace(self, displacement_matrix):
         """Displace the experience by the displacement_matrix"""
-        # By miraculously multiplying the position_matrix by the displacement_matrix
-        self.pose_matrix = matrix44.multiply(self.pose_matrix, displacement_matrix)
+        self.store.displace(displacement_matrix, np.arange(self.store.count) == self.row)
 
     def point(self):
         """Return the point of this experience in egocentric coordinates."""
@@ -83,5 +111,199 @@ class Experience:
     def save(self):
         """Create a copy of the experience for memory snapshot"""
         # Clone the position matrix so it can be updated separately
-        return Experience(self.id, self.pose_matrix.copy(), self.type, self.clock, self.body_quaternion,
+        return Experience(self.id, self.pose_matrix, self.type, self.clock, self.body_quaternion,
                           self.durability, self.color_index)
+
+
+def experience_view(store, row):
+    """Return the experience stored in this row of the store without copying it"""
+    experience = Experience.__new__(Experience)
+    experience.store = store
+    experience.row = row
+    return experience
+
+
+class ExperienceStore:
+    """The experiences stored in arrays, one row per experience, indexed by experience id like a dict.
+    If anchored, the pose matrices are relative to a fixed frame and the displacements only move the frame"""
+
+    def __init__(self, capacity=64, anchored=False):
+        """Create an empty store"""
+        self.count = 0  # The number of rows in use
+        self.ids = np.zeros(capacity, dtype=int)
+        self.pose_matrices = np.zeros((capacity, 4, 4), dtype=float)
+        self.types = np.zeros(capacity, dtype=int)
+        self.clocks = np.zeros(capacity, dtype=int)
+        self.body_quaternions = np.zeros((capacity, 4), dtype=float)
+        self.durabilities = np.zeros(capacity, dtype=int)
+        self.color_indexes = np.zeros(capacity, dtype=int)
+        self.rows = {}  # The row of each experience id
+        self.type_rows = {}  # The rows of each experience type in increasing order
+        self.is_clock_sorted = True  # True if the rows are in increasing clock order
+        # The displacement from the fixed frame to the egocentric frame. None if not anchored
+        self.frame = np.identity(4) if anchored else None
+        self.inverse_frame = self.frame
+        self.projected_pose_matrices = np.zeros((0, 4, 4))  # The cached egocentric pose matrices if anchored
+        self.projected_count = 0  # The number of rows of the cache that are up to date
+
+    def columns(self):
+        """Return the names of the array attributes"""
+        return ['ids', 'pose_matrices', 'types', 'clocks', 'body_quaternions', 'durabilities', 'color_indexes']
+
+    def append(self, experience_id, pose_matrix, experience_type, clock, body_quaternion, durability, color_index):
+        """Add a row at the end of the arrays and return its index. Replace the row of the same experience id"""
+        if experience_id in self.rows:
+            row = self.rows[experience_id]
+            if self.types[row] != experience_type:
+                self.type_rows[int(self.types[row])].remove(row)
+                bisect.insort(self.type_rows.setdefault(experience_type, []), row)
+            if (row > 0 and self.clocks[row - 1] > clock) or (row < self.count - 1 and self.clocks[row + 1] < clock):
+                self.is_clock_sorted = False
+        else:
+            if self.count == len(self.ids):
+                # Double the capacity
+                for name in self.columns():
+                    array = getattr(self, name)
+                    setattr(self, name, np.concatenate((array, np.zeros((max(len(array), 1),) + array.shape[1:],
+                                                                        dtype=array.dtype))))
+            row = self.count
+            self.count += 1
+            self.rows[experience_id] = row
+            self.type_rows.setdefault(experience_type, []).append(row)
+            if row > 0 and self.clocks[row - 1] > clock:
+                self.is_clock_sorted = False
+        self.ids[row] = experience_id
+        if self.frame is None:
+            self.pose_matrices[row] = pose_matrix
+        else:
+            # Anchor the pose in the fixed frame
+            if self.inverse_frame is None:
+                self.inverse_frame = np.linalg.inv(self.frame)
+            self.pose_matrices[row] = np.matmul(pose_matrix, self.inverse_frame)
+            self.projected_count = min(self.projected_count, row)
+        self.types[row] = experience_type
+        self.clocks[row] = clock
+        self.body_quaternions[row] = body_quaternion
+        self.durabilities[row] = durability
+        self.color_indexes[row] = color_index
+        return row
+
+    def copy(self):
+        """Return a copy of the store with copied arrays"""
+        saved_store = ExperienceStore(0)
+        for name in self.columns():
+            setattr(saved_store, name, getattr(self, name)[0:self.count].copy())
+        saved_store.count = self.count
+        saved_store.rows = self.rows.copy()
+        saved_store.type_rows = {experience_type: rows.copy() for experience_type, rows in self.type_rows.items()}
+        saved_store.is_clock_sorted = self.is_clock_sorted
+        saved_store.frame = self.frame
+        saved_store.inverse_frame = self.inverse_frame
+        # The cached projections remain valid
+        saved_store.projected_pose_matrices = self.projected_pose_matrices[0:self.projected_count].copy()
+        saved_store.projected_count = self.projected_count
+        return saved_store
+
+    def subset(self, rows):
+        """Return a new store with the experiences of these rows, in this order"""
+        saved_store = ExperienceStore(0)
+        for name in self.columns():
+            setattr(saved_store, name, getattr(self, name)[rows])
+        saved_store.count = len(rows)
+        saved_store.rows = {experience_id: row for row, experience_id in enumerate(saved_store.ids.tolist())}
+        saved_store.type_rows = {int(t): np.flatnonzero(saved_store.types == t).tolist()
+                                 for t in np.unique(saved_store.types)}
+        saved_store.is_clock_sorted = bool(np.all(saved_store.clocks[1:] >= saved_store.clocks[:-1]))
+        saved_store.frame = self.frame
+        saved_store.inverse_frame = self.inverse_frame
+        if self.projected_count == self.count:
+            saved_store.projected_pose_matrices = self.projected_pose_matrices[rows]
+            saved_store.projected_count = len(rows)
+        return saved_store
+
+    def type_mask(self, experience_types=None, excluded_types=()):
+        """Return the mask of the rows of the given types (all types if None) except the excluded types"""
+        types = self.types[0:self.count]
+        mask = np.isin(types, list(excluded_types), invert=True)
+        if experience_types is not None:
+            mask &= np.isin(types, list(experience_types))
+        return mask
+
+    def since(self, clock, experience_types=None, excluded_types=()):
+        """Return the experiences from this clock of the given types (all types if None) except the excluded types"""
+        # The rows are in clock order unless experiences were added out of order
+        start = int(np.searchsorted(self.clocks[0:self.count], clock)) if self.is_clock_sorted else 0
+        rows = []
+        for experience_type, type_rows in self.type_rows.items():
+            if (experience_types is None or experience_type in experience_types) and \
+                    experience_type not in excluded_types:
+                rows.extend(type_rows[bisect.bisect_left(type_rows, start):])
+        if not self.is_clock_sorted:
+            rows = [row for row in rows if self.clocks[row] >= clock]
+        return [experience_view(self, row) for row in sorted(rows)]
+
+    def displace(self, displacement_matrix, mask):
+        """Displace the experiences of the rows in the mask by the displacement matrix"""
+        if self.frame is None:
+            rows = np.flatnonzero(mask)
+            self.pose_matrices[rows] = np.matmul(self.pose_matrices[rows], displacement_matrix)
+            return
+        frame = np.matmul(self.frame, displacement_matrix)
+        if np.count_nonzero(mask) * 2 < self.count:
+            # Few rows are displaced: change their anchored poses and keep the frame
+            rows = np.flatnonzero(mask)
+            self.pose_matrices[rows] = self.pose_matrices[rows] @ frame @ np.linalg.inv(self.frame)
+            self.projected_count = min(self.projected_count, rows[0]) if len(rows) > 0 else self.projected_count
+            return
+        # Move the frame and change the anchored poses of the rows that must not be displaced
+        rows = np.flatnonzero(~np.asarray(mask))
+        if len(rows) > 0:
+            self.pose_matrices[rows] = self.pose_matrices[rows] @ self.frame @ np.linalg.inv(frame)
+        self.frame = frame
+        self.inverse_frame = None
+        self.projected_count = 0
+
+    def egocentric_pose_matrices(self):
+        """Return the (count, 4, 4) egocentric pose matrices. If anchored, project the rows not in the cache"""
+        if self.frame is None:
+            return self.pose_matrices[0:self.count]
+        if len(self.projected_pose_matrices) < len(self.pose_matrices):
+            self.projected_pose_matrices = np.concatenate((self.projected_pose_matrices[0:self.projected_count],
+                                                           np.zeros((len(self.pose_matrices) - self.projected_count,
+                                                                     4, 4))))
+        self.projected_pose_matrices[self.projected_count:self.count] = \
+            np.matmul(self.pose_matrices[self.projected_count:self.count], self.frame)
+        self.projected_count = self.count
+        return self.projected_pose_matrices[0:self.count]
+
+    def egocentric_pose_matrix(self, row):
+        """Return the egocentric pose matrix of the row"""
+        if self.frame is None or row < self.projected_count:
+            return (self.pose_matrices if self.frame is None else self.projected_pose_matrices)[row]
+        return self.egocentric_pose_matrices()[row]
+
+    def __getitem__(self, experience_id):
+        return experience_view(self, self.rows[experience_id])
+
+    def __setitem__(self, experience_id, experience):
+        self.append(experience_id, experience.store.egocentric_pose_matrix(experience.row), experience.type,
+                    experience.clock, experience.store.body_quaternions[experience.row], experience.durability,
+                    experience.color_index)
+
+    def __contains__(self, experience_id):
+        return experience_id in self.rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def keys(self):
+        return self.rows.keys()
+
+    def values(self):
+        return [experience_view(self, row) for row in self.rows.values()]
+
+    def items(self):
+        return [(experience_id, experience_view(self, row)) for experience_id, row in self.rows.items()]
@@ -10,6 +10,7 @@ from ..Integrator.Integrator import integrate
 from ..Enaction.Predict import push_objects
 from .PlaceMemory.PlaceMemory import PlaceMemory
 from ..constants import LOG_AZIMUTH
+from ..Utils import rotate_points
 from ..Proposer.Action import ACTION_FORWARD
 
 NEAR_HOME = 300    # (mm) Max distance to consider near home
@@ -20,15 +21,21 @@ class Memory:
         body memory, egocentric memory, and allocentric memory
     """
 
-    def __init__(self, arena_id, robot_id):
+    def __init__(self, arena_id, robot_id, memories=None):
+        """Create empty memories or use the memories provided (body, egocentric, allocentric, phenomenon, place).
+        Providing the memories avoids creating the ones that save() replaces"""
         self.arena_id = arena_id
         self.robot_id = robot_id
         self.clock = 0
-        self.body_memory = BodyMemory(robot_id)
-        self.egocentric_memory = EgocentricMemory(robot_id)
-        self.allocentric_memory = AllocentricMemory(GRID_WIDTH, GRID_HEIGHT, cell_radius=CELL_RADIUS)
-        self.phenomenon_memory = PhenomenonMemory(arena_id)
-        self.place_memory = PlaceMemory()
+        if memories is not None:
+            self.body_memory, self.egocentric_memory, self.allocentric_memory, self.phenomenon_memory, \
+                self.place_memory = memories
+        else:
+            self.body_memory = BodyMemory(robot_id)
+            self.egocentric_memory = EgocentricMemory(robot_id)
+            self.allocentric_memory = AllocentricMemory(GRID_WIDTH, GRID_HEIGHT, cell_radius=CELL_RADIUS)
+            self.phenomenon_memory = PhenomenonMemory(arena_id)
+            self.place_memory = PlaceMemory()
         self.last_normalized_forward = Vector3([0., 0., 0.])
         self.last_forward_floor = 0
 
@@ -52,8 +59,11 @@ class Memory:
 
         # Translate the robot before applying the yaw
         # print("Robot relative translation", enaction.translation)
+        start_point = self.allocentric_memory.robot_point.copy()
         self.allocentric_memory.move(self.body_memory.body_quaternion, enaction.trajectory, enaction.clock)
         self.body_memory.update(enaction)
+        # The pending place cell registrations will compensate this motion
+        self.place_memory.record_motion(self.allocentric_memory.robot_point - start_point)
 
         # Compute the other robot's position relative to the current state of memory
         if enaction.message is not None:
@@ -123,6 +133,12 @@ class Memory:
             return self.allocentric_to_egocentric(point + self.phenomenon_memory.terrain().point)
         return self.allocentric_to_egocentric(point)
 
+    def terrain_centric_to_egocentric_points(self, points):
+        """Return the points (N, 3) in egocentric coordinates from the points in terrain-centric coordinates"""
+        if self.phenomenon_memory.terrain_confidence() >= PHENOMENON_ENCLOSED_CONFIDENCE:
+            points = points + self.phenomenon_memory.terrain().point
+        return rotate_points(self.body_memory.body_quaternion.inverse, points - self.allocentric_memory.robot_point)
+
     def egocentric_to_terrain_centric(self, point):
         """Return the point in terrain egocentric coordinates from the point in egocentric coordinates"""
         if point is None:
@@ -147,28 +163,31 @@ class Memory:
         else:
             return self.allocentric_memory.robot_point
 
-    def adjust_robot_position(self, current_cell):
+    def adjust_robot_position(self, current_cell, previous_cell=None):
         """Adjust the robot's position by the correction from place cell memory"""
         """Executed when the robot comes back to a previously fully scanned cell"""
+        # The previous cell when the registration was submitted
+        if previous_cell is None:
+            previous_cell = self.place_memory.place_cells[self.place_memory.previous_cell_id]
 
         adjustment_scale = 1.
         # If the previous cell has mord confidence than the current then adjust the cell position
-        if self.place_memory.place_cells[self.place_memory.previous_cell_id].position_confidence >= current_cell.position_confidence:
+        if previous_cell.position_confidence >= current_cell.position_confidence:
             adjustment_scale = current_cell.position_confidence / 100.
             # Increase the current cell confidence no more than the previous cell confidence
-            current_cell.position_confidence = min(current_cell.position_confidence + 20, self.place_memory.place_cells[self.place_memory.previous_cell_id].position_confidence)
+            current_cell.position_confidence = min(current_cell.position_confidence + 20, previous_cell.position_confidence)
 
         # Move the robot by the proposed correction proportionally to the place cell confidence
         robot_correction = self.place_memory.position_pe * adjustment_scale
-        print(f"Adjusting the robot's position to place cell {self.place_memory.current_cell_id} "
+        print(f"Adjusting the robot's position to place cell {current_cell.key} "
               f"by {tuple(robot_correction[:2].astype(int))}")
         self.allocentric_memory.robot_point += robot_correction
 
         # Move the place cell by the complementary of the position correction in the other direction
         # cell_correction = self.place_memory.proposed_correction * (current_cell.position_confidence - 100) / 100
         cell_correction = self.place_memory.position_pe * (adjustment_scale - 1)
-        current_cell.point += cell_correction
-        print(f"Place {self.place_memory.current_cell_id} adjusted by: "
+        self.place_memory.move_place_cell(current_cell.key, cell_correction)
+        print(f"Place {current_cell.key} adjusted by: "
               f"{tuple(cell_correction[0:2].astype(int))}")
         # Propagate the confidence of the previous place cell
         # current_cell.position_confidence = max(current_cell.position_confidence, self.place_memory.place_cells[
@@ -176,20 +195,23 @@ class Memory:
 
         self.allocentric_memory.update_grid(self)
 
-    def adjust_cell_position(self, current_cell):
+    def adjust_cell_position(self, current_cell, previous_cell=None):
         """Adjust the robot's and the cell's position by the correction from place cell memory"""
         """Only executed after the cell was created and fully scanned"""
+        # The previous cell when the registration was submitted
+        if previous_cell is None:
+            previous_cell = self.place_memory.place_cells[self.place_memory.previous_cell_id]
 
         adjustment_scale = 1. - current_cell.position_confidence / 100.
         # Increase the current cell confidence no more than the previous cell confidence
-        current_cell.position_confidence = min(current_cell.position_confidence + 20, self.place_memory.place_cells[self.place_memory.previous_cell_id].position_confidence)
+        current_cell.position_confidence = min(current_cell.position_confidence + 20, previous_cell.position_confidence)
 
         # Move the robot and the place by the proposed correction proportionally to the place cell confidence
         position_correction = self.place_memory.position_pe * adjustment_scale
-        print(f"Adjusting the robot's and place cell {self.place_memory.current_cell_id}'s position "
+        print(f"Adjusting the robot's and place cell {current_cell.key}'s position "
               f"by {tuple(position_correction[:2].astype(int))}")
         self.allocentric_memory.robot_point += position_correction
-        current_cell.point += position_correction
+        self.place_memory.move_place_cell(current_cell.key, position_correction)
 
         self.allocentric_memory.update_grid(self)
 
@@ -199,21 +221,15 @@ class Memory:
         trace_dict[LOG_AZIMUTH] = self.body_memory.body_azimuth()
         return trace_dict
 
-    def save(self):
-        """Return a clone of memory for memory snapshot"""
+    def save(self, is_prediction=False):
+        """Return a clone of memory for memory snapshot.
+        The prediction snapshots register the place cells synchronously and do not inherit the pending registrations"""
         # start_time = time.time()
-        saved_memory = Memory(self.phenomenon_memory.arena_id, self.robot_id)
+        # Clone body, egocentric, allocentric, phenomenon, and place memory
+        saved_memory = Memory(self.phenomenon_memory.arena_id, self.robot_id,
+                              (self.body_memory.save(), self.egocentric_memory.save(), self.allocentric_memory.save(),
+                               self.phenomenon_memory.save(), self.place_memory.save(is_prediction)))
         saved_memory.clock = self.clock
-        # Clone body memory
-        saved_memory.body_memory = self.body_memory.save()
-        # Clone egocentric memory
-        saved_memory.egocentric_memory = self.egocentric_memory.save()
-        # Clone allocentric memory
-        saved_memory.allocentric_memory = self.allocentric_memory.save()
-        # Clone phenomenon memory
-        saved_memory.phenomenon_memory = self.phenomenon_memory.save()
-        # Clone place memory
-        saved_memory.place_memory = self.place_memory.save()
 
         saved_memory.last_normalized_forward[:] = self.last_normalized_forward
         saved_memory.last_forward_floor = self.last_forward_floor
@@ -223,7 +239,7 @@ class Memory:
     def is_outside_terrain(self, ego_point):
         """Return True if ego_point is not None and there is a terrain and ego_point is outside"""
         allo_point = self.egocentric_to_allocentric(ego_point)
-        return self.phenomenon_memory.is_outside_terrain(allo_point)
+        return self.phenomenon_memory.is_outside_terrain(allo_point, self.allocentric_memory)
 
     def is_near_terrain_origin(self):
         """Return True if the robot is near the origin of the terrain"""
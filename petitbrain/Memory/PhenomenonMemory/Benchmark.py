@@ -0,0 +1,54 @@
+import contextlib
+import io
+import timeit
+import numpy as np
+from pyrr import Quaternion
+from .Affordance import Affordance
+from .PhenomenonIndex import PhenomenonIndex
+from .PhenomenonMemory import PhenomenonMemory
+from .PhenomenonObject import PhenomenonObject
+from ..EgocentricMemory.Experience import EXPERIENCE_ALIGNED_ECHO
+
+# Benchmark the association of the affordances to the phenomena with and without the spatial index
+# py -m petitbrain.Memory.PhenomenonMemory.Benchmark
+
+NB_RUNS = 20
+NB_AFFORDANCES = 10
+OBJECT_SPACING = 1000  # (mm) The average distance between the objects
+
+
+def phenomenon_memory_with_objects(nb_objects, rng):
+    """Return a phenomenon memory with nb_objects objects at random positions"""
+    phenomenon_memory = PhenomenonMemory("0")
+    area = int(np.sqrt(nb_objects) * OBJECT_SPACING / 2)
+    for k in range(nb_objects):
+        affordance = Affordance(rng.integers(-area, area, 3) * [1, 1, 0], EXPERIENCE_ALIGNED_ECHO, 0, 0,
+                                Quaternion.from_z_rotation(rng.uniform(-3, 3)), np.array([0, 0, 0]))
+        phenomenon_memory.phenomena[k + 1] = PhenomenonObject(affordance)
+    return phenomenon_memory
+
+
+def all_candidates(index, point):
+    """Return all the phenomena like the nested loop did before the index"""
+    return sorted(index.ranks, key=index.ranks.get)
+
+
+indexed_candidates = PhenomenonIndex.candidates
+rng = np.random.default_rng(0)
+for nb_objects in [10, 100, 1000]:
+    phenomenon_memory = phenomenon_memory_with_objects(nb_objects, rng)
+    affordances = [Affordance(phenomenon_memory.phenomena[k].point + rng.integers(-400, 400, 3) * [1, 1, 0],
+                              EXPERIENCE_ALIGNED_ECHO, 1, 0, Quaternion.from_z_rotation(rng.uniform(-3, 3)),
+                              np.array([0, 0, 0])) for k in rng.integers(1, nb_objects + 1, NB_AFFORDANCES)]
+
+    def update_snapshot():
+        """Attach copies of the affordances to a snapshot of the phenomenon memory"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            phenomenon_memory.save().update_phenomena([a.save() for a in affordances])
+
+    durations = []
+    for candidates in [all_candidates, indexed_candidates]:
+        PhenomenonIndex.candidates = candidates
+        durations.append(timeit.timeit(update_snapshot, number=NB_RUNS) / NB_RUNS)
+    PhenomenonIndex.candidates = indexed_candidates
+    print(f"{nb_objects:5} phenomena: all {durations[0] * 1e3:8.2f} ms, indexed {durations[1] * 1e3:8.2f} ms")
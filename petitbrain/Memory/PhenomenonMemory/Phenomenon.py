@@ -1,3 +1,4 @@
+import itertools
 import math
 import matplotlib.path as mpath
 import numpy as np
@@ -8,6 +9,7 @@ from . import PHENOMENON_INITIAL_CONFIDENCE, PHENOMENON_ENCLOSED_CONFIDENCE, PHE
     PHENOMENON_RECOGNIZED_CONFIDENCE
 
 PHENOMENON_DELTA = 300  # (mm) Distance between affordances to be considered the same phenomenon
+PATH_VERSIONS = itertools.count(1)  # Each new path of any phenomenon receives a new version
 
 
 class Phenomenon:
@@ -36,6 +38,7 @@ class Phenomenon:
         # The hull is used to display the phenomenon's contour
         self.hull_points = None
         self.path = None  # Used to test is_inside in terrain-centric coordinates
+        self.path_version = 0  # Changes whenever the path changes. Used to invalidate the cached terrain mask
         self.interpolation_types = None
 
         # Last time the origin affordance was enacted. Used to compute the return to origin.
@@ -51,6 +54,11 @@ class Phenomenon:
         else:
             return None
 
+    def extent(self):
+        """Return the min and max allocentric (x, y) of the affordances. None if not limited to an area"""
+        points = np.array([a.point[0:2] for a in self.affordances.values()]) + self.point[0:2]
+        return points.min(axis=0), points.max(axis=0)
+
     def category_clue(self):
         """If RECOGNIZABLE confidence then return the phenomenon type else return None"""
         if self.confidence >= PHENOMENON_RECOGNIZABLE_CONFIDENCE:
@@ -145,6 +153,7 @@ class Phenomenon:
         # Need a closed two-dimensional array [[x0, y0],...,[x100, y100], [x0, y0]]
         # TODO the shape should be already enclosed when we call set_path
         self.path = mpath.Path(np.concatenate((self.shape[:, 0:2], self.shape[0:1, 0:2])))
+        self.path_version = next(PATH_VERSIONS)
 
     def is_inside(self, terrain_centric_point):
         """True if the point in terrain-centric coordinates is inside the phenomenon"""
@@ -153,6 +162,27 @@ class Phenomenon:
         else:
             return self.path.contains_point(terrain_centric_point[0:2])
 
+    def contains_points(self, points):
+        """Return the boolean array of the points (N, 2 or 3) that are inside the phenomenon like is_inside()"""
+        points = np.asarray(points)
+        if self.path is None:
+            return np.zeros(len(points), dtype=bool)
+        return self.path.contains_points(points[:, 0:2])
+
+    def path_distances(self, points):
+        """Return the distances from the points (N, 2 or 3) to the closest segment of the path"""
+        points = np.asarray(points)
+        if self.path is None:
+            return np.full(len(points), np.inf)
+        starts = self.path.vertices[:-1]
+        segments = self.path.vertices[1:] - starts
+        # The projection of each point on each segment, clipped to the segment
+        start_to_points = points[:, np.newaxis, 0:2] - starts
+        lengths = np.maximum(np.einsum('mk,mk->m', segments, segments), 1e-9)
+        t = np.clip(np.einsum('nmk,mk->nm', start_to_points, segments) / lengths, 0, 1)
+        distances = np.linalg.norm(start_to_points - t[:, :, np.newaxis] * segments, axis=2)
+        return distances.min(axis=1)
+
     def vector_toward_origin(self, affordance):
         """Return the vector computed from the affordance point minus the phenomenon point."""
         # By default the origin is at the center of the phenomenon
@@ -203,6 +233,11 @@ class Phenomenon:
         saved_phenomenon.origin_direction_quaternion = self.origin_direction_quaternion.copy()
         saved_phenomenon.relative_origin_point = self.relative_origin_point.copy()
         saved_phenomenon.shape = self.shape.copy()
-        saved_phenomenon.set_path()  # recompute the path from the shape. Perhaps we can just copy the path
+        if self.path is None:
+            saved_phenomenon.set_path()  # recompute the path from the shape
+        else:
+            # The path is never modified in place. Keeping its version keeps the cached masks and fields valid
+            saved_phenomenon.path = self.path
+            saved_phenomenon.path_version = self.path_version
         saved_phenomenon.origin_prediction_error = {k: v for k, v in self.origin_prediction_error.items()}
         return
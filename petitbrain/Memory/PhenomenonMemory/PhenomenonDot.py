@@ -28,6 +28,10 @@ class PhenomenonDot:
     def __str__(self):
         return f"(Phenomenon type:{self.phenomenon_type})"
 
+    def extent(self):
+        """Return the min and max allocentric (x, y) of the dot"""
+        return self.point[0:2], self.point[0:2]
+
     def update(self, affordance):
         """Add a new affordance to this phenomenon and move the phenomenon to the position of this affordance"""
         if affordance.type == self.phenomenon_type and np.linalg.norm(self.point - affordance.point) < PHENOMENON_DELTA:
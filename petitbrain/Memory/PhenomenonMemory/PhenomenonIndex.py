@@ -0,0 +1,52 @@
+########################################################################################
+# The spatial index of the phenomena used to attach the affordances to the phenomena
+# A uniform hash grid of square cells of PHENOMENON_DELTA mm
+# Each phenomenon is registered in the cells that its extent covers, enlarged by PHENOMENON_DELTA
+# The phenomena that have no extent (terrain, robot) can accept an affordance anywhere
+########################################################################################
+
+import math
+from .Phenomenon import PHENOMENON_DELTA
+
+
+class PhenomenonIndex:
+    """The hash grid of the phenomena near each point"""
+    def __init__(self, cell_size=PHENOMENON_DELTA):
+        """Create an empty index"""
+        self.cell_size = cell_size
+        self.cells = {}  # {(x, y): set of phenomenon ids}
+        self.phenomenon_cells = {}  # {phenomenon_id: list of cells}
+        self.global_ids = set()  # The phenomena that can accept an affordance anywhere
+        self.ranks = {}  # The order of insertion of the phenomena, used to keep the first-match order
+
+    def cell(self, x, y):
+        """Return the key of the cell that contains the point (x, y)"""
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def insert(self, phenomenon_id, phenomenon):
+        """Register the phenomenon or update its cells. Keep its rank if it is already registered"""
+        self.remove(phenomenon_id)
+        self.ranks.setdefault(phenomenon_id, len(self.ranks))
+        extent = phenomenon.extent()
+        if extent is None:
+            self.global_ids.add(phenomenon_id)
+            return
+        # The affordances within PHENOMENON_DELTA of the extent may be attached to the phenomenon
+        margin = PHENOMENON_DELTA + 1
+        x0, y0 = self.cell(extent[0][0] - margin, extent[0][1] - margin)
+        x1, y1 = self.cell(extent[1][0] + margin, extent[1][1] + margin)
+        cells = [(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+        for cell in cells:
+            self.cells.setdefault(cell, set()).add(phenomenon_id)
+        self.phenomenon_cells[phenomenon_id] = cells
+
+    def remove(self, phenomenon_id):
+        """Remove the phenomenon from the cells"""
+        self.global_ids.discard(phenomenon_id)
+        for cell in self.phenomenon_cells.pop(phenomenon_id, []):
+            self.cells[cell].discard(phenomenon_id)
+
+    def candidates(self, point):
+        """Return the ids of the phenomena that may accept an affordance at this point, in the order of insertion"""
+        ids = self.cells.get(self.cell(point[0], point[1]), set()) | self.global_ids
+        return sorted(ids, key=self.ranks.get)
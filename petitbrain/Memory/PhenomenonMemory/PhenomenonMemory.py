@@ -6,6 +6,7 @@ from .PhenomenonObject import PhenomenonObject
 from .PhenomenonTerrain import PhenomenonTerrain
 from .PhenomenonRobot import PhenomenonRobot
 from .PhenomenonDot import PhenomenonDot
+from .PhenomenonIndex import PhenomenonIndex
 from .. import EMOTION_VIGILANCE
 from ..EgocentricMemory.Experience import EXPERIENCE_ROBOT, EXPERIENCE_FLOOR, EXPERIENCE_ALIGNED_ECHO
 from ...Robot.RobotDefine import TERRAIN_RADIUS, ROBOT_FLOOR_SENSOR_X, ROBOT_OUTSIDE_Y
@@ -17,21 +18,44 @@ DOT = 2
 
 
 class PhenomenonMemory:
-    def __init__(self, arena_id):
+    def __init__(self, arena_id, categories=None):
+        """Create the phenomenon memory of the arena.
+        If categories is provided then they are used instead of creating new ones (used by save())"""
         self.arena_id = arena_id
         self.phenomena = {}  # Phenomenon 0 is the terrain
         self.phenomenon_id = 0  # Used for object phenomena
+        self.is_shared = False  # True if the phenomena dict may be shared with a memory snapshot
+        self.shared_ids = set()  # The phenomena that may be shared with a memory snapshot
 
         # Initialize the phenomenon categories
-        category_terrain = PhenomenonCategory(EXPERIENCE_FLOOR, TERRAIN_RADIUS[self.arena_id]["short_radius"],
-                                              TERRAIN_RADIUS[self.arena_id]["radius"],
-                                              TERRAIN_RADIUS[self.arena_id]["azimuth"])
-        category_robot = PhenomenonCategory(EXPERIENCE_ROBOT, ROBOT_FLOOR_SENSOR_X, ROBOT_OUTSIDE_Y, 0)
-        category_box = PhenomenonCategory(EXPERIENCE_ALIGNED_ECHO, ARRANGE_OBJECT_RADIUS, ARRANGE_OBJECT_RADIUS, 0)
-        self.phenomenon_categories = {TER: category_terrain, ROBOT1: category_robot, BOX: category_box}
+        if categories is not None:
+            self.phenomenon_categories = categories
+        else:
+            category_terrain = PhenomenonCategory(EXPERIENCE_FLOOR, TERRAIN_RADIUS[self.arena_id]["short_radius"],
+                                                  TERRAIN_RADIUS[self.arena_id]["radius"],
+                                                  TERRAIN_RADIUS[self.arena_id]["azimuth"])
+            category_robot = PhenomenonCategory(EXPERIENCE_ROBOT, ROBOT_FLOOR_SENSOR_X, ROBOT_OUTSIDE_Y, 0)
+            category_box = PhenomenonCategory(EXPERIENCE_ALIGNED_ECHO, ARRANGE_OBJECT_RADIUS, ARRANGE_OBJECT_RADIUS, 0)
+            self.phenomenon_categories = {TER: category_terrain, ROBOT1: category_robot, BOX: category_box}
 
         self.focus_phenomenon_id = None  # The ID of the phenomenon that has focus
 
+    def own_phenomena(self):
+        """Copy the phenomena dict if it is shared with a memory snapshot (copy on write)"""
+        if self.is_shared:
+            self.phenomena = self.phenomena.copy()
+            # The phenomena themselves remain shared until they are modified
+            self.shared_ids = set(self.phenomena)
+            self.is_shared = False
+
+    def own_phenomenon(self, phenomenon_id):
+        """Return the phenomenon to be modified. Clone it first if it is shared with a memory snapshot"""
+        self.own_phenomena()
+        if phenomenon_id in self.shared_ids:
+            self.phenomena[phenomenon_id] = self.phenomena[phenomenon_id].save()
+            self.shared_ids.discard(phenomenon_id)
+        return self.phenomena[phenomenon_id]
+
     def terrain(self):
         """Return the terrain phenomenon or None"""
         if TER in self.phenomena:
@@ -71,8 +95,9 @@ class PhenomenonMemory:
         else:
             return np.array([0, 0, 0])
 
-    def is_outside_terrain(self, allo_point):
-        """Return True if allo_point is not None and there is a confident terrain and allo_point is outside"""
+    def is_outside_terrain(self, allo_point, allocentric_memory=None):
+        """Return True if allo_point is not None and there is a confident terrain and allo_point is outside.
+        If allocentric_memory is provided then use its cached terrain mask"""
         # If no point then False
         if allo_point is None:
             is_outside_terrain = False
@@ -80,6 +105,8 @@ class PhenomenonMemory:
         elif self.terrain_confidence() < PHENOMENON_ENCLOSED_CONFIDENCE:
             is_outside_terrain = False
         # If the point is outside the confident terrain then True
+        elif allocentric_memory is not None:
+            is_outside_terrain = not allocentric_memory.is_inside_terrain(self.phenomena[TER], allo_point)
         else:
             is_outside_terrain = not self.phenomena[TER].is_inside(allo_point)
         return is_outside_terrain
@@ -101,6 +128,7 @@ class PhenomenonMemory:
 
     def create_phenomenon(self, affordance):
         """Create a new phenomenon depending of the type of the affordance"""
+        self.own_phenomena()
         # Must always create a phenomenon
         # Create a flower phenomenon if black spot and color
         if affordance.type == EXPERIENCE_FLOOR and affordance.color_index > 0:
@@ -127,22 +155,27 @@ class PhenomenonMemory:
     def create_phenomena(self, affordances):
         """Create new phenomena from the list of affordances. Return the list of new phenomena IDs"""
         new_phenomena_id = {}
+        # The index of the new phenomena
+        index = PhenomenonIndex()
         for affordance in affordances:
             if len(new_phenomena_id) == 0:
                 # new_phenomena_id.append(self.create_phenomenon(affordance))
                 phenomenon_id = self.create_phenomenon(affordance)
                 new_phenomena_id[phenomenon_id] = self.phenomena[phenomenon_id]#.phenomenon_type
+                index.insert(phenomenon_id, self.phenomena[phenomenon_id])
             else:
                 clustered = False
-                # Look if the new affordance can be attached to an existing new phenomenon
-                for new_phenomenon_id in new_phenomena_id:
+                # Look if the new affordance can be attached to a new phenomenon near it
+                for new_phenomenon_id in index.candidates(affordance.point):
                     print("Update new phenomenon", new_phenomenon_id)
                     if self.phenomena[new_phenomenon_id].update(affordance) is not None:
+                        index.insert(new_phenomenon_id, self.phenomena[new_phenomenon_id])
                         clustered = True
                         break
                 if not clustered:
                     phenomenon_id = self.create_phenomenon(affordance)
                     new_phenomena_id[phenomenon_id] = self.phenomena[phenomenon_id]#.phenomenon_type
+                    index.insert(phenomenon_id, self.phenomena[phenomenon_id])
                     # new_phenomena_id.append(self.create_phenomenon(affordance))
         return new_phenomena_id
 
@@ -153,13 +186,20 @@ class PhenomenonMemory:
         sum_translation = np.array([0, 0, 0], dtype=int)
         number_of_add = 0
         remaining_affordances = affordances.copy()
+        # Only try the phenomena near each affordance, in the order of the phenomena dict
+        index = PhenomenonIndex()
+        for phenomenon_id, phenomenon in self.phenomena.items():
+            index.insert(phenomenon_id, phenomenon)
 
         for affordance in affordances:
-            for phenomenon in self.phenomena.values():
+            for phenomenon_id in index.candidates(affordance.point):
+                # The phenomenon is modified if the affordance is attached to it
+                phenomenon = self.own_phenomenon(phenomenon_id)
                 delta = phenomenon.update(affordance)
                 if delta is not None:
                     # Check if this phenomenon can be recognized
                     self.recognize_category(phenomenon)
+                    index.insert(phenomenon_id, phenomenon)
                     # phenomenon.try_to_enclose()
                     remaining_affordances.remove(affordance)
                     # Null correction do not count (to be improved)
@@ -193,11 +233,12 @@ class PhenomenonMemory:
 
     def save(self):
         """Return a clone of phenomenon memory for memory snapshot"""
-        saved_phenomenon_memory = PhenomenonMemory(self.arena_id)
         # No need to clone the categories because they never change
-        # saved_phenomenon_memory.phenomenon_categories = {k: c.save() for k, c in self.phenomenon_categories.items()}
-        saved_phenomenon_memory.phenomenon_categories = {k: c for k, c in self.phenomenon_categories.items()}
-        saved_phenomenon_memory.phenomena = {k: p.save() for k, p in self.phenomena.items()}
+        saved_phenomenon_memory = PhenomenonMemory(self.arena_id, {k: c for k, c in self.phenomenon_categories.items()})
+        # Copy on write: the phenomena are cloned when they are modified
+        saved_phenomenon_memory.phenomena = self.phenomena
+        saved_phenomenon_memory.is_shared = True
+        self.is_shared = True
         saved_phenomenon_memory.phenomenon_id = self.phenomenon_id
         saved_phenomenon_memory.focus_phenomenon_id = self.focus_phenomenon_id
         return saved_phenomenon_memory
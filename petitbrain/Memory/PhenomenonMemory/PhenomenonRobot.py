@@ -15,6 +15,10 @@ class PhenomenonRobot(Phenomenon):
     # self.affordances = {0: affordance}
     # self.affordance_id = 0
 
+    def extent(self):
+        """The robot phenomenon accepts the robot affordances anywhere"""
+        return None
+
     def update(self, affordance):
         """If EXPERIENCE_ROBOT then update the phenomenon"""
         if affordance.type == EXPERIENCE_ROBOT:
@@ -27,6 +27,10 @@ class PhenomenonTerrain(Phenomenon):
             self.confidence = TERRAIN_ORIGIN_CONFIDENCE
             # create_phenomenon() will call recognize()
 
+    def extent(self):
+        """The terrain accepts the floor affordances anywhere"""
+        return None
+
     def update(self, affordance: Affordance):
         """Test if the affordance is within the acceptable delta from the position of the phenomenon,
         if yes, add the affordance to the phenomenon, and return the robot's position correction."""
@@ -1,13 +1,13 @@
 # A place cell is defined by a point and contains the cues to recognize it
 import math
 import numpy as np
-import time
-import threading
 from pyrr import Quaternion
 from . import ANGULAR_RESOLUTION, CONE_HALF_ANGLE, MIN_PLACE_CELL_DISTANCE
 from ..EgocentricMemory.EgocentricMemory import EXPERIENCE_ALIGNED_ECHO, EXPERIENCE_CENTRAL_ECHO, EXPERIENCE_LOCAL_ECHO
 from ...Utils import polar_to_cartesian, quaternion_to_direction_rad, translation_quaternion_to_matrix
-from .PlaceGeometry import transform_estimation_cue_to_cue, point_to_polar_array, resample_by_diff, plot_compare
+from .PlaceGeometry import transform_estimation_cue_to_cue, point_to_angular_range, raise_polar_curve, resample_by_diff, \
+    plot_compare
+from .PlotWorker import PlotWorker
 from .Cue import Cue
 
 
@@ -19,6 +19,7 @@ class PlaceCell:
         self.cues = cues  # List of cues
         self.polar_echo_curve = np.linspace([0, 0], [0, 2 * math.pi], 360 // ANGULAR_RESOLUTION, dtype=float)
         self.cartesian_echo_curve = np.zeros((360 // ANGULAR_RESOLUTION, 3), dtype=float)
+        self.nb_echo_cues = 0  # The number of echo cues already in the echo curve
         self.last_visited_clock = cues[0].clock
         self.last_position_clock = cues[0].clock
         self.position_confidence = confidence
@@ -44,24 +45,20 @@ class PlaceCell:
         translation = np.array(reg_p2p.transformation[0:3, 3])
         rotation_deg = math.degrees(quaternion_to_direction_rad(Quaternion.from_matrix(reg_p2p.transformation[:3, :3])))
         # print(f"Estimation echo rotation: {rotation_deg:.0f}°")
-        # Save the plot in an asynchronous thread
-        thread = threading.Thread(target=plot_compare, args=(
-            points, place_echo_points, reg_p2p, "Scan", self.key, clock))
-        thread.start()
+        # Save the plot in the plot worker
+        PlotWorker.submit(points, place_echo_points, reg_p2p, "Scan", self.key, clock)
         # plot_compare(points, place_echo_points, reg_p2p, "Scan", self.key)
         return translation
 
     def compute_echo_curve(self):
-        """Compute the curve of echoes in polar coordinates"""
-        start_time = time.time()
+        """Update the curve of echoes in polar coordinates with the echo cues added since the last update"""
         echo_cues = [cue for cue in self.cues if cue.type in [EXPERIENCE_ALIGNED_ECHO, EXPERIENCE_LOCAL_ECHO]]
-        if len(echo_cues) > 0:
-            a = np.empty((360 // ANGULAR_RESOLUTION, len(echo_cues)), dtype=float)
-            for i, c in enumerate(echo_cues):
-                a[:, i] = point_to_polar_array(c.point())
-            self.polar_echo_curve[:, 0] = a.max(axis=1)
-            # print(f"Cue curve time: {time.time() - start_time:.3f}")
-
+        # The curve is the max of the angular spans of the echo cues so only the new cues can raise it
+        is_changed = False
+        for c in echo_cues[self.nb_echo_cues:]:
+            is_changed |= raise_polar_curve(self.polar_echo_curve[:, 0], *point_to_angular_range(c.point()))
+        self.nb_echo_cues = len(echo_cues)
+        if is_changed:
             # Recompute the central echoes
             self.cues = [c for c in self.cues if c.type != EXPERIENCE_CENTRAL_ECHO]
             diff_points = resample_by_diff(self.polar_echo_curve, math.radians(2 * CONE_HALF_ANGLE))
@@ -98,6 +95,7 @@ class PlaceCell:
         saved_place_cell = PlaceCell(self.key, self.point, [cue.save() for cue in self.cues], 100)
         saved_place_cell.polar_echo_curve[:] = self.polar_echo_curve
         saved_place_cell.cartesian_echo_curve[:] = self.cartesian_echo_curve
+        saved_place_cell.nb_echo_cues = self.nb_echo_cues
         saved_place_cell.last_visited_clock = self.last_visited_clock
         saved_place_cell.last_position_clock = self.last_position_clock
         saved_place_cell.position_confidence = self.position_confidence
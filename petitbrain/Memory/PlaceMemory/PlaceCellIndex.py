@@ -0,0 +1,86 @@
+########################################################################################
+# The spatial index of the place cell centers
+# A uniform hash grid of square cells of MIN_PLACE_CELL_DISTANCE mm
+# Moving a place cell only moves its id to the cell that contains its new center
+# The queries sort the place cells by distance then by id so that equal distances are not lost
+########################################################################################
+
+import itertools
+import math
+from . import MIN_PLACE_CELL_DISTANCE
+
+
+class PlaceCellIndex:
+    """The hash grid of the place cell centers"""
+    def __init__(self, cell_size=MIN_PLACE_CELL_DISTANCE):
+        """Create an empty index"""
+        self.cell_size = cell_size
+        self.cells = {}  # {(x, y): set of place cell ids}
+        self.points = {}  # {place_cell_id: (x, y)} The indexed centers
+
+    def cell(self, x, y):
+        """Return the key of the cell that contains the point (x, y)"""
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def insert(self, place_cell_id, point):
+        """Register the place cell at this point or move it if it is already registered"""
+        self.remove(place_cell_id)
+        self.points[place_cell_id] = (float(point[0]), float(point[1]))
+        self.cells.setdefault(self.cell(point[0], point[1]), set()).add(place_cell_id)
+
+    def remove(self, place_cell_id):
+        """Remove the place cell from the index"""
+        if place_cell_id in self.points:
+            cell = self.cell(*self.points.pop(place_cell_id))
+            self.cells[cell].discard(place_cell_id)
+            if len(self.cells[cell]) == 0:
+                del self.cells[cell]
+
+    def sync(self, place_cells):
+        """Register the place cells added to the dict {id: place_cell} and remove the ones no longer in it"""
+        for place_cell_id in sorted(place_cells.keys() - self.points.keys()):
+            self.insert(place_cell_id, place_cells[place_cell_id].point)
+        for place_cell_id in self.points.keys() - place_cells.keys():
+            self.remove(place_cell_id)
+
+    def distance(self, place_cell_id, point):
+        """Return the distance from the point to the center of the place cell"""
+        x, y = self.points[place_cell_id]
+        return math.hypot(x - point[0], y - point[1])
+
+    def ring(self, cell, radius):
+        """Return the cells at Chebyshev distance radius from the cell"""
+        if radius == 0:
+            return [cell]
+        x, y = cell
+        return [(x + dx, y + dy) for dx, dy in itertools.product(range(-radius, radius + 1), repeat=2)
+                if max(abs(dx), abs(dy)) == radius]
+
+    def within(self, point, radius):
+        """Return the list of (distance, id) of the place cells closer than radius sorted by distance then id"""
+        x0, y0 = self.cell(point[0] - radius, point[1] - radius)
+        x1, y1 = self.cell(point[0] + radius, point[1] + radius)
+        ids = [i for x in range(x0, x1 + 1) for y in range(y0, y1 + 1) for i in self.cells.get((x, y), ())]
+        return sorted(d_i for d_i in ((self.distance(i, point), i) for i in ids) if d_i[0] < radius)
+
+    def nearest(self, point, accept=None):
+        """Return the (distance, id) of the nearest place cell accepted by the function accept(id) or None.
+        Search the rings of cells around the point until no closer place cell can be found"""
+        center = self.cell(point[0], point[1])
+        best = None
+        nb_seen = 0
+        for radius in itertools.count():
+            for i in (i for cell in self.ring(center, radius) for i in self.cells.get(cell, ())):
+                nb_seen += 1
+                if accept is None or accept(i):
+                    best = min(best or (math.inf, i), (self.distance(i, point), i))
+            # The place cells in the next rings are at least radius cells away
+            if (best is not None and best[0] <= radius * self.cell_size) or nb_seen == len(self.points):
+                return best
+
+    def copy(self):
+        """Return a copy of the index for memory snapshot"""
+        saved_index = PlaceCellIndex(self.cell_size)
+        saved_index.cells = {cell: ids.copy() for cell, ids in self.cells.items()}
+        saved_index.points = self.points.copy()
+        return saved_index
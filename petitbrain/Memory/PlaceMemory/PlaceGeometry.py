@@ -3,13 +3,12 @@
 import math
 import numpy as np
 import pandas as pd
-import open3d as o3d
 import csv
-import matplotlib.pyplot as plt
-import threading
 from pyrr import Quaternion
 from . import MIN_PLACE_CELL_DISTANCE, ICP_DISTANCE_THRESHOLD, ANGULAR_RESOLUTION, MASK_ARRAY, ICP_MIN_POINTS, \
-    ICP_MAX_ROTATION
+    ICP_MAX_ROTATION, ICP_OPEN3D, CONE_HALF_ANGLE
+from .PlanarICP import registration_icp_2d
+from .PlotWorker import PlotWorker, plot_compare
 from ...Robot import NO_ECHO_DISTANCE
 from ...Utils import cartesian_to_polar
 from ...Memory.EgocentricMemory.Experience import EXPERIENCE_CENTRAL_ECHO
@@ -17,16 +16,23 @@ from ...Utils import quaternion_to_direction_rad
 
 
 def transform_estimation_cue_to_cue(points1, points2, threshold=ICP_DISTANCE_THRESHOLD, translation_init=None):
-    """Return the transformation from points1 to points2 using o3d ICP algorithm"""
-    # Create the o3d point clouds
-    pcd1 = o3d.geometry.PointCloud()
-    pcd2 = o3d.geometry.PointCloud()
+    """Return the transformation from points1 to points2 using the planar ICP or the o3d ICP algorithm"""
     # Converting to integers seems to avoid rotation
-    pcd1.points = o3d.utility.Vector3dVector(np.array(points1, dtype=int))
-    pcd2.points = o3d.utility.Vector3dVector(np.array(points2, dtype=int))
+    points1 = np.array(points1, dtype=int)
+    points2 = np.array(points2, dtype=int)
     trans_init = np.eye(4, dtype=int)  # Initial transformation matrix (4x4 identity matrix)
     if translation_init is not None:
         trans_init[0:3, 3] = translation_init
+    if not ICP_OPEN3D:
+        return registration_icp_2d(points1, points2, threshold, trans_init)
+
+    # Imported on demand because importing open3d takes seconds
+    import open3d as o3d
+    # Create the o3d point clouds
+    pcd1 = o3d.geometry.PointCloud()
+    pcd2 = o3d.geometry.PointCloud()
+    pcd1.points = o3d.utility.Vector3dVector(points1)
+    pcd2.points = o3d.utility.Vector3dVector(points2)
 
     # Apply ICP
     estimation_method = o3d.pipelines.registration.TransformationEstimationPointToPoint()
@@ -36,23 +42,31 @@ def transform_estimation_cue_to_cue(points1, points2, threshold=ICP_DISTANCE_THR
     return reg_p2p
 
 
-def nearby_place_cell(robot_point, place_cells):
-    """Return the id of the place cell within place cell distance if any, otherwise 0"""
-    pc_distance_id = {np.linalg.norm(pc.point - robot_point): key for key, pc in place_cells.items()}
-    if len(pc_distance_id) > 0:
-        min_distance = min(pc_distance_id.keys())
+def nearby_place_cell(robot_point, place_cells, index=None):
+    """Return the id of the place cell within place cell distance if any, otherwise 0.
+    Use the PlaceCellIndex if provided. Equal distances are won by the smallest id"""
+    if index is not None:
+        nearby = index.within(robot_point, MIN_PLACE_CELL_DISTANCE)
+        return nearby[0][1] if len(nearby) > 0 else 0
+    distance_ids = [(np.linalg.norm(pc.point - robot_point), key) for key, pc in place_cells.items()]
+    if len(distance_ids) > 0:
+        min_distance, min_id = min(distance_ids)
         if min_distance < MIN_PLACE_CELL_DISTANCE:
-            return pc_distance_id[min_distance]
+            return min_id
     return 0
 
 
-def nearest_place_cell(place_id, place_cells):
-    """Return the id of the place cell closest to this place cell"""
-    distances = {np.linalg.norm(pc.point - place_cells[place_id].point): k for k, pc in place_cells.items()
-                 if k != place_id and pc.is_fully_observed()}
-    if len(distances) > 0:
-        min_distance = min(distances.keys())
-        return distances[min_distance]
+def nearest_place_cell(place_id, place_cells, index=None):
+    """Return the id of the fully observed place cell closest to this place cell, otherwise 0.
+    Use the PlaceCellIndex if provided. Equal distances are won by the smallest id"""
+    if index is not None:
+        nearest = index.nearest(place_cells[place_id].point,
+                                lambda k: k != place_id and place_cells[k].is_fully_observed())
+        return 0 if nearest is None else nearest[1]
+    distance_ids = [(np.linalg.norm(pc.point - place_cells[place_id].point), k) for k, pc in place_cells.items()
+                    if k != place_id and pc.is_fully_observed()]
+    if len(distance_ids) > 0:
+        return min(distance_ids)[1]
     return 0
 
 
@@ -62,6 +76,27 @@ def point_to_polar_array(point):
     return np.roll(MASK_ARRAY * r, round(math.degrees(theta)) // ANGULAR_RESOLUTION)
 
 
+def point_to_angular_range(point):
+    """Return the radius and the range of indexes (start, stop) of the angular span of the cue at this point.
+    The same indexes as the non-zero values of point_to_polar_array but start may be negative"""
+    r, theta = cartesian_to_polar(point)
+    index = round(math.degrees(theta)) // ANGULAR_RESOLUTION
+    # The MASK_ARRAY indexes before and after the direction of the cue
+    return r, index + -CONE_HALF_ANGLE // ANGULAR_RESOLUTION, index + CONE_HALF_ANGLE // ANGULAR_RESOLUTION
+
+
+def raise_polar_curve(curve, r, start, stop):
+    """Raise the values of the curve to r in the range of indexes [start, stop) that wraps around.
+    Return True if the curve changed"""
+    start, stop = start % len(curve), start % len(curve) + stop - start
+    is_changed = False
+    for segment in (slice(start, min(stop, len(curve))), slice(0, max(stop - len(curve), 0))):
+        if np.any(curve[segment] < r):
+            np.maximum(curve[segment], r, out=curve[segment])
+            is_changed = True
+    return is_changed
+
+
 def resample_by_diff(polar_points, theta_span, r_tolerance=30):
     """Return the array of points where difference is greater that tolerance"""
     # Convert point array to a sorted pandas DataFrame
@@ -222,62 +257,11 @@ def compare_place_cells(place_source, place_target, clock):
           f"fitness: {reg_p2p.fitness:.2f}, "
           f"rmse: {reg_p2p.inlier_rmse:.0f}")  # Root mean square error (residual distance)
 
-    # Save the plot in an asynchronous thread
-    thread = threading.Thread(target=plot_compare, args=(
-        points1, points2, reg_p2p, place_source.key, place_target.key, clock))
-    thread.start()
+    # Save the plot in the plot worker
+    PlotWorker.submit(points1, points2, reg_p2p, place_source.key, place_target.key, clock)
 
     # If less than three points match or rotation then cancel the translation
     if len(reg_p2p.correspondence_set) < ICP_MIN_POINTS or abs(rotation_deg) > ICP_MAX_ROTATION:
         translation = None
         print(f"Adjustment cancelled. Nb points: {len(reg_p2p.correspondence_set)}, rotation: {rotation_deg:.0f}°")
     return translation
-
-
-def plot_compare(source_points, target_points, reg_p2p, k1, k2, clock):
-    """Save a plot of the correspondence"""
-    plt.figure()
-
-    # Plot invisible points to scale the axes
-    plt.axis('equal')
-    plt.plot(1000, 1000, marker=' ')
-    plt.plot(-1000, -1000, marker=' ')
-
-    # Plot the robot at coordinates (0, 0)
-    plt.scatter(0, 0, s=1000, color='darkSlateBlue')
-
-    # Plot the robot translated by the transformation
-    plt.scatter(reg_p2p.transformation[0, 3], reg_p2p.transformation[1, 3], s=1000, color='lightSteelBlue')
-
-    # Plot the source points
-    plt.scatter(source_points[:, 0], source_points[:, 1], c='sienna', label=f"Place {k1}")
-
-    # Plot the segments from source points to target points
-    for idx in np.asarray(reg_p2p.correspondence_set):
-        i, j = idx
-        plt.plot([source_points[i, 0], target_points[j, 0]],[source_points[i, 1], target_points[j, 1]], c='k')
-
-    # Plot the transformed source points
-    pcd1 = o3d.geometry.PointCloud()
-    pcd1.points = o3d.utility.Vector3dVector(np.array(source_points, dtype=int))
-    pcd1.transform(reg_p2p.transformation)
-    source_points_transformed = np.asarray(pcd1.points)
-    plt.scatter(source_points_transformed[:, 0], source_points_transformed[:, 1], c='sienna', marker="^",
-                label=f"{k1} moved to {k2}")
-
-    # Plot the target points in light sienna in the forefront
-    plt.scatter(target_points[:, 0], target_points[:, 1], c='#ffb366', label=f"Place {k2}")
-
-    # Plot the axis and legends
-    plt.legend()
-    plt.xlabel('West - East')
-    plt.ylabel('South - North')
-    distance = np.linalg.norm(reg_p2p.transformation[:3, 3])
-    plt.title(f"{k1} to {k2}. Dist: {distance:.0f}. Fitness: {reg_p2p.fitness:.2f}. RMSE: {reg_p2p.inlier_rmse:.0f}")
-
-    # Save the plot
-    try:
-        plt.savefig(f"log/01_{clock}_compare_{k1}_{k2}.pdf")
-    except PermissionError:
-        print("Permission denied")
-    plt.close()
@@ -1,21 +1,25 @@
 import numpy as np
 import networkx as nx
+from concurrent.futures import ThreadPoolExecutor
 from pyrr import Matrix44, vector3, Vector3
-import copy
 from ...Memory.PlaceMemory.PlaceCell import PlaceCell
 from ...Memory.PlaceMemory.Cue import Cue
 from ...Memory.EgocentricMemory.Experience import EXPERIENCE_COMPASS, EXPERIENCE_NORTH, EXPERIENCE_CENTRAL_ECHO, \
     EXPERIENCE_LOCAL_ECHO, EXPERIENCE_ALIGNED_ECHO
-from .PlaceGeometry import nearby_place_cell, transform_estimation_cue_to_cue, compare_place_cells
+from .PlaceGeometry import nearby_place_cell, transform_estimation_cue_to_cue
+from .PlaceCellIndex import PlaceCellIndex
+from .PlaceRegistration import Registration, REGISTRATION_SCAN, REGISTRATION_CELL
+from . import PLACE_REGISTRATION_ASYNC
 from ...SoundPlayer import SoundPlayer, SOUND_SURPRISE, SOUND_PLACE_CELL
 from ...constants import LOG_CELL, LOG_POSITION_PE, LOG_FORWARD_PE
 
 
 class PlaceMemory:
     """The memory of place cells"""
-    def __init__(self):
-        """Initialize the list of place cells"""
+    def __init__(self, is_asynchronous=PLACE_REGISTRATION_ASYNC):
+        """Initialize the list of place cells. The prediction snapshots register synchronously"""
         self.place_cells = {}
+        self.place_cell_index = PlaceCellIndex()  # The spatial index of the place cell centers
         self.place_cell_id = 0  # Incremental cell id (first cell is 1)
         self.place_cell_graph = nx.Graph()
         self.place_cell_distances = dict(dict())
@@ -26,6 +30,44 @@ class PlaceMemory:
         self.graph_start_id = 1  # The first place cell of the current graph to display
         self.estimated_distance = None
         self.forward_pe = 0
+        self.is_shared = False  # True if the place cells and the graph may be shared with a memory snapshot
+        self.shared_ids = set()  # The place cells that may be shared with a memory snapshot
+        self.is_asynchronous = is_asynchronous
+        self.registration_executor = None  # The worker thread created on the first asynchronous registration
+        self.registrations = []  # The submitted registrations in submission order
+
+    def own_place_cells(self):
+        """Copy the place cell dict, the graph, and the distances if shared with a memory snapshot (copy on write)"""
+        if self.is_shared:
+            self.place_cells = self.place_cells.copy()
+            self.place_cell_graph = self.place_cell_graph.copy()
+            # The inner distance dicts are replaced but never modified
+            self.place_cell_distances = self.place_cell_distances.copy()
+            self.place_cell_index = self.place_cell_index.copy()
+            # The place cells themselves remain shared until they are modified
+            self.shared_ids = set(self.place_cells)
+            self.is_shared = False
+
+    def own_place_cell(self, place_cell_id):
+        """Return the place cell to be modified. Clone it first if it is shared with a memory snapshot"""
+        self.own_place_cells()
+        if place_cell_id in self.shared_ids:
+            self.place_cells[place_cell_id] = self.place_cells[place_cell_id].save()
+            self.shared_ids.discard(place_cell_id)
+        return self.place_cells[place_cell_id]
+
+    def indexed_place_cells(self):
+        """Return the spatial index of the place cells. Register the place cells added directly to the dict"""
+        if self.place_cells.keys() != self.place_cell_index.points.keys():
+            self.own_place_cells()
+            self.place_cell_index.sync(self.place_cells)
+        return self.place_cell_index
+
+    def move_place_cell(self, place_cell_id, translation):
+        """Translate the place cell and move it in the spatial index"""
+        place_cell = self.own_place_cell(place_cell_id)
+        place_cell.point += translation
+        self.place_cell_index.insert(place_cell_id, place_cell.point)
 
     def add_or_update_place_cell(self, memory):
         """Create e new place cell or update the existing one. Set the proposed correction"""
@@ -35,19 +77,25 @@ class PlaceMemory:
         self.estimated_distance = None
         self.forward_pe = 0
 
+        # Apply the corrections of the registrations that have completed since the previous cycle
+        self.apply_registrations(memory)
+
         # The new experiences for place cell
-        experiences = [e for e in memory.egocentric_memory.experiences.values() if (e.clock >= memory.clock) and
-                       e.type not in [EXPERIENCE_COMPASS, EXPERIENCE_NORTH, EXPERIENCE_CENTRAL_ECHO]]
+        experiences = memory.egocentric_memory.experiences.since(
+            memory.clock, excluded_types=[EXPERIENCE_COMPASS, EXPERIENCE_NORTH, EXPERIENCE_CENTRAL_ECHO])
 
         # If no place cell then create Place Cell 1 with confidence 100
         if self.current_cell_id == 0:
             self.create_place_cell(memory.allocentric_memory.robot_point, experiences)
 
         # Find the closest cell if any
-        existing_id = nearby_place_cell(memory.allocentric_memory.robot_point, self.place_cells)
+        existing_id = nearby_place_cell(memory.allocentric_memory.robot_point, self.place_cells,
+                                        self.indexed_place_cells())
 
         # If the robot is near a known cell (the same or another)
         if existing_id > 0:
+            # This place cell is going to be modified
+            self.own_place_cell(existing_id)
             # If the cell is fully observed
             if self.place_cells[existing_id].is_fully_observed():
                 # Add the new cues except the local echos
@@ -58,20 +106,9 @@ class PlaceMemory:
                 # If a scan has been performed then find the position correction based on local echoes
                 if len(local_echoes) > 0:
                     points = np.array([e.polar_point() for e in local_echoes])
-                    estimated_robot_point = self.place_cells[existing_id].translation_estimation_echo(
-                        points, memory.allocentric_memory.robot_point, memory.clock)
-                    estimated_allo_robot_point = estimated_robot_point + self.place_cells[existing_id].point
-                    # The robot position correction
-                    proposed_correction = estimated_allo_robot_point - memory.allocentric_memory.robot_point
-                    print(f"Position relative to place cell {self.current_cell_id}: "
-                          f"{tuple(estimated_robot_point[:2].astype(int))}, "
-                          f"propose correction: {tuple(proposed_correction[:2].astype(int))}")
-                    if np.linalg.norm(proposed_correction) < 200:
-                        # Adjust the position and confidence
-                        self.position_pe[:] = proposed_correction
-                        memory.adjust_robot_position(self.place_cells[existing_id])
-                        # self.calculate_forward_pe()
-                        SoundPlayer.play(SOUND_SURPRISE)
+                    self.register(Registration(REGISTRATION_SCAN, self.place_cells[existing_id],
+                                               self.place_cells.get(self.previous_cell_id), memory.clock, points,
+                                               memory.allocentric_memory.robot_point), memory)
             # If the cell is not fully observed
             else:
                 # Add the cues including the local echoes
@@ -82,30 +119,16 @@ class PlaceMemory:
                 if self.place_cells[existing_id].is_fully_observed() and self.previous_cell_id > 0 and \
                         self.place_cells[self.previous_cell_id].is_fully_observed():
                     # Estimate the translation from the previous place cell based on echoes. Plot the comparison
-                    estimated_translation = compare_place_cells(
-                        self.place_cells[existing_id], self.place_cells[self.previous_cell_id], memory.clock)
-                    # If at least three points match and no rotation
-                    if estimated_translation is not None:
-                        self.estimated_distance = np.linalg.norm(estimated_translation)
-                        place_distance = self.place_cells[existing_id].point - self.place_cells[self.previous_cell_id].point
-                        self.position_pe[:] = -estimated_translation - place_distance
-                        # self.position_pe[:] = self.place_cells[self.previous_cell_id].point \
-                        #                       - estimated_translation - self.place_cells[existing_id].point
-                                              #  + self.place_cells[self.previous_cell_id].last_robot_point_in_cell\
-                        print(f"Position pe : {tuple(self.position_pe[:2].astype(int))} = "
-                              f"echo estimation {tuple(-estimated_translation[:2].astype(int))} - "
-                              f"speed estimation {tuple(place_distance[:2].astype(int))} - ")
-                        # self.calculate_forward_pe()
-                        # Adjust the position and increase confidence to 50
-                        memory.adjust_cell_position(self.place_cells[existing_id])
+                    self.register(Registration(REGISTRATION_CELL, self.place_cells[existing_id],
+                                               self.place_cells.get(self.previous_cell_id), memory.clock), memory)
 
             # If the robot just moved to an existing place cell
             if existing_id != self.current_cell_id:
                 # If this cell was fully observed
                 if self.place_cells[existing_id].is_fully_observed():
                     # Try to adjust position based on aligned echo
-                    align_experiences = [e for e in memory.egocentric_memory.experiences.values()
-                                         if (e.clock >= memory.clock) and e.type == EXPERIENCE_ALIGNED_ECHO]
+                    align_experiences = memory.egocentric_memory.experiences.since(memory.clock,
+                                                                                   [EXPERIENCE_ALIGNED_ECHO])
                     if len(align_experiences) == 1:  # One aligned echo experience
                         allo_point = align_experiences[0].polar_point() + memory.allocentric_memory.robot_point
                         proposed_correction = self.place_cells[existing_id].translation_estimate_aligned_echo(
@@ -151,6 +174,65 @@ class PlaceMemory:
 
         self.place_cells[self.current_cell_id].last_visited_clock = memory.clock
 
+    def register(self, registration, memory):
+        """Submit the registration to the worker thread if asynchronous, otherwise apply its correction now"""
+        if not self.is_asynchronous:
+            self.apply_registration(registration, registration.estimate(), memory)
+            return
+        if self.registration_executor is None:
+            self.registration_executor = ThreadPoolExecutor(1)
+        registration.detach()
+        registration.future = self.registration_executor.submit(registration.estimate)
+        self.registrations.append(registration)
+
+    def record_motion(self, translation):
+        """Add the allocentric translation of the robot to the motion of the pending registrations"""
+        for registration in self.registrations:
+            # Not in place: the registration may have been saved in a memory snapshot
+            registration.motion = registration.motion + translation
+
+    def apply_registrations(self, memory):
+        """Apply the corrections of the completed registrations in submission order. Do not wait for the others"""
+        while len(self.registrations) > 0 and self.registrations[0].future.done():
+            registration = self.registrations.pop(0)
+            # The place cell may not exist in a snapshot restored from before the registration
+            if registration.place_cell_id not in self.place_cells:
+                continue
+            self.apply_registration(registration, registration.future.result(), memory)
+
+    def apply_registration(self, registration, estimate, memory):
+        """Adjust the position of the robot or of the place cell from the estimate of the registration"""
+        place_cell = self.own_place_cell(registration.place_cell_id)
+        previous_cell = self.place_cells.get(registration.previous_cell_id)
+        if registration.type == REGISTRATION_SCAN:
+            # The estimated robot point moved as the robot has moved since the scan
+            estimated_allo_robot_point = estimate + place_cell.point + registration.motion
+            # The robot position correction
+            proposed_correction = estimated_allo_robot_point - memory.allocentric_memory.robot_point
+            print(f"Position relative to place cell {registration.place_cell_id}: "
+                  f"{tuple(estimate[:2].astype(int))}, "
+                  f"propose correction: {tuple(proposed_correction[:2].astype(int))}")
+            if np.linalg.norm(proposed_correction) < 200:
+                # Adjust the position and confidence
+                self.position_pe[:] = proposed_correction
+                memory.adjust_robot_position(place_cell, previous_cell)
+                # self.calculate_forward_pe()
+                SoundPlayer.play(SOUND_SURPRISE)
+        # If at least three points match and no rotation
+        elif estimate is not None:
+            self.estimated_distance = np.linalg.norm(estimate)
+            place_distance = place_cell.point - previous_cell.point
+            self.position_pe[:] = -estimate - place_distance
+            # self.position_pe[:] = self.place_cells[self.previous_cell_id].point \
+            #                       - estimated_translation - self.place_cells[existing_id].point
+                                  #  + self.place_cells[self.previous_cell_id].last_robot_point_in_cell\
+            print(f"Position pe : {tuple(self.position_pe[:2].astype(int))} = "
+                  f"echo estimation {tuple(-estimate[:2].astype(int))} - "
+                  f"speed estimation {tuple(place_distance[:2].astype(int))} - ")
+            # self.calculate_forward_pe()
+            # Adjust the position and increase confidence to 50
+            memory.adjust_cell_position(place_cell, previous_cell)
+
     def create_place_cell(self, point, experiences):
         """Create a new place cell and add it to the list and to the graph"""
         # Create the cues from the experiences
@@ -166,8 +248,10 @@ class PlaceMemory:
         else:
             confidence = 100
         # Create the place cell from the cues
+        self.own_place_cells()
         self.place_cell_id += 1
         self.place_cells[self.place_cell_id] = PlaceCell(self.place_cell_id, point, cues, confidence)
+        self.place_cell_index.insert(self.place_cell_id, point)
         self.place_cells[self.place_cell_id].compute_echo_curve()
         # Add the edge and the distance from the previous place cell to the new one
         if self.place_cell_id > 1:  # Don't create Node 0
@@ -234,17 +318,34 @@ class PlaceMemory:
     #           f"Position pe {tuple(self.position_pe[:2].astype(int))}. "
     #           f"Forward pe {round(self.forward_pe)}")
 
-    def save(self):
-        """Return a clone of place memory for memory snapshot"""
-        saved_place_memory = PlaceMemory()
-        saved_place_memory.place_cells = {k: p.save() for k, p in self.place_cells.items()}
+    def save(self, is_prediction=False):
+        """Return a clone of place memory for memory snapshot.
+        A live snapshot that replaces the memory keeps the worker thread and the pending registrations"""
+        if is_prediction:
+            saved_place_memory = PlaceMemory(False)
+        else:
+            saved_place_memory = PlaceMemory(self.is_asynchronous)
+            saved_place_memory.registration_executor = self.registration_executor
+            saved_place_memory.registrations = [r.save() for r in self.registrations]
+        # Copy on write: the place cells, the graph, and the distances are cloned when they are modified
+        saved_place_memory.place_cells = self.place_cells
+        saved_place_memory.place_cell_index = self.place_cell_index
         saved_place_memory.place_cell_id = self.place_cell_id
-        saved_place_memory.place_cell_graph = self.place_cell_graph.copy()
+        saved_place_memory.place_cell_graph = self.place_cell_graph
         saved_place_memory.previous_cell_id = self.previous_cell_id
         saved_place_memory.current_cell_id = self.current_cell_id
-        saved_place_memory.place_cell_distances = copy.deepcopy(self.place_cell_distances)
+        saved_place_memory.place_cell_distances = self.place_cell_distances
+        saved_place_memory.is_shared = True
+        self.is_shared = True
         saved_place_memory.observe_better = self.observe_better
         saved_place_memory.position_pe[:] = self.position_pe
         saved_place_memory.estimated_distance = self.estimated_distance
         saved_place_memory.forward_pe = self.forward_pe
         return saved_place_memory
+
+    def __getstate__(self):
+        """Do not pickle the worker thread and the pending registrations"""
+        state = self.__dict__.copy()
+        state['registration_executor'] = None
+        state['registrations'] = []
+        return state
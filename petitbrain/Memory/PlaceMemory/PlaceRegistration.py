@@ -0,0 +1,48 @@
+########################################################################################
+# The registration of the robot or of a place cell by ICP on the echoes
+# When asynchronous, the ICP runs in a worker thread on clones of the place cells
+# and the interaction cycle continues. The correction is applied on a later cycle.
+# The motion of the robot since the submission is recorded to compensate the correction
+########################################################################################
+
+import copy
+import numpy as np
+from .PlaceGeometry import compare_place_cells
+
+REGISTRATION_SCAN = 0  # The local echoes of a scan registered to the fully observed place cell
+REGISTRATION_CELL = 1  # The place cell that has just been fully observed registered to the previous place cell
+
+
+class Registration:
+    """A registration job and the motion of the robot since it was submitted"""
+    def __init__(self, registration_type, place_cell, previous_cell, clock, points=None, robot_point=None):
+        """Record the place cells, the local echo points, and the position of the robot at submission"""
+        self.type = registration_type
+        self.place_cell = place_cell
+        self.previous_cell = previous_cell
+        self.place_cell_id = place_cell.key
+        self.previous_cell_id = 0 if previous_cell is None else previous_cell.key
+        self.clock = clock
+        self.points = points
+        self.robot_point = None if robot_point is None else robot_point.copy()
+        self.motion = np.array([0., 0., 0.])  # The allocentric translation of the robot since the submission
+        self.future = None
+
+    def detach(self):
+        """Clone the place cells so that the registration can run while memory is updated"""
+        self.place_cell = self.place_cell.save()
+        if self.previous_cell is not None:
+            self.previous_cell = self.previous_cell.save()
+
+    def save(self):
+        """Return a clone that shares the running job and has its own motion for the memory snapshot"""
+        saved_registration = copy.copy(self)
+        saved_registration.motion = self.motion.copy()
+        return saved_registration
+
+    def estimate(self):
+        """Run the ICP. Return the estimated robot point relative to the place cell for a scan registration.
+        Return the estimated translation from the previous cell or None for a cell registration"""
+        if self.type == REGISTRATION_SCAN:
+            return self.place_cell.translation_estimation_echo(self.points, self.robot_point, self.clock)
+        return compare_place_cells(self.place_cell, self.previous_cell, self.clock)
@@ -0,0 +1,82 @@
+########################################################################################
+# The planar point-to-point ICP on scipy cKDTree
+# Replaces open3d registration_icp for the few dozen horizontal echo points of the place cells
+# Same iterations and convergence criteria as open3d: each source point is matched with its nearest
+# target point within the threshold, then the rigid SE(2) transformation is computed in closed form
+# The result has the fields of the open3d RegistrationResult that are used downstream
+########################################################################################
+
+import math
+import numpy as np
+from scipy.spatial import cKDTree
+
+ICP_MAX_ITERATION = 30  # The defaults of open3d ICPConvergenceCriteria
+ICP_RELATIVE_FITNESS = 1e-6
+ICP_RELATIVE_RMSE = 1e-6
+
+
+class RegistrationResult:
+    """The result of the ICP registration like open3d RegistrationResult"""
+    def __init__(self, transformation, fitness=0., inlier_rmse=0., correspondence_set=None):
+        """The transformation is a 4x4 matrix. The correspondence set is the array of (source, target) indexes"""
+        self.transformation = transformation
+        self.fitness = fitness  # The ratio of source points that have a correspondence
+        self.inlier_rmse = inlier_rmse  # The root mean square distance of the correspondences
+        self.correspondence_set = np.zeros((0, 2), dtype=int) if correspondence_set is None else correspondence_set
+
+
+def planar_points(points):
+    """Return the (n, 2) float array of the x, y coordinates of the points"""
+    if len(points) == 0:
+        return np.zeros((0, 2))
+    return np.asarray(points, dtype=float).reshape(len(points), -1)[:, 0:2]
+
+
+def correspondences(moved, tree, threshold):
+    """Return the distances, the source indexes, and the target indexes of the source points that have a
+    nearest target point within threshold, and the (fitness, rmse) of these correspondences"""
+    distances, indexes = tree.query(moved, distance_upper_bound=threshold)
+    is_matched = distances < math.inf
+    distances = distances[is_matched]
+    if len(distances) == 0:
+        return distances, np.zeros(0, dtype=int), np.zeros(0, dtype=int), (0., 0.)
+    scores = (len(distances) / len(moved), math.sqrt(distances @ distances / len(distances)))
+    return distances, np.flatnonzero(is_matched), indexes[is_matched], scores
+
+
+def registration_icp_2d(points1, points2, threshold, trans_init=None, max_iteration=ICP_MAX_ITERATION):
+    """Return the RegistrationResult of the transformation that moves points1 onto points2.
+    The planar points are viewed as complex numbers so that the rotation is a multiplication"""
+    transformation = np.eye(4) if trans_init is None else np.array(trans_init, dtype=float)
+    source = planar_points(points1)
+    target = planar_points(points2)
+    if len(source) == 0 or len(target) == 0:
+        return RegistrationResult(transformation)
+    tree = cKDTree(target)
+    target_z = np.ascontiguousarray(target).view(complex).ravel()
+    moved = np.ascontiguousarray(source @ transformation[0:2, 0:2].T + transformation[0:2, 3])
+    moved_z = moved.view(complex).ravel()  # Moving moved_z moves moved
+    rotation, translation = 1 + 0j, 0j  # The transformation applied after the initial transformation
+    distances, source_indexes, target_indexes, scores = correspondences(moved, tree, threshold)
+    for _ in range(max_iteration):
+        if len(distances) == 0:
+            break
+        # The rotation that minimizes the squared distances between the centered correspondences
+        s = moved_z[source_indexes]
+        t = target_z[target_indexes]
+        s_center, t_center = s.mean(), t.mean()
+        r = np.vdot(s - s_center, t - t_center)
+        r = r / abs(r) if r != 0 else 1 + 0j
+        moved_z *= r
+        moved_z += t_center - r * s_center
+        rotation, translation = r * rotation, r * translation + t_center - r * s_center
+        previous_scores = scores
+        distances, source_indexes, target_indexes, scores = correspondences(moved, tree, threshold)
+        if abs(previous_scores[0] - scores[0]) < ICP_RELATIVE_FITNESS and \
+                abs(previous_scores[1] - scores[1]) < ICP_RELATIVE_RMSE:
+            break
+
+    update = np.eye(4)
+    update[0:2, 0:2] = [[rotation.real, -rotation.imag], [rotation.imag, rotation.real]]
+    update[0:2, 3] = translation.real, translation.imag
+    return RegistrationResult(update @ transformation, *scores, np.column_stack((source_indexes, target_indexes)))
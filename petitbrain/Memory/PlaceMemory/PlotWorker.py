@@ -0,0 +1,128 @@
+########################################################################################
+# The background process that saves the plots of the place cell comparisons
+# The control loop only puts the plot jobs in a bounded queue and never waits for the plots
+# When the queue is full, the oldest job is dropped so the most recent comparisons are plotted
+# Started once from the main thread during setup. Can be disabled at runtime with PlotWorker.is_enabled = False
+# The spawn start method does not fork the pyglet and worker threads of the main process
+# The spawned process imports only this module, numpy, and matplotlib
+########################################################################################
+
+import multiprocessing
+import queue
+from types import SimpleNamespace
+import numpy as np
+from matplotlib.figure import Figure
+from . import PLOT_ENABLED, PLOT_QUEUE_SIZE
+
+
+def apply_transformation(points, transformation):
+    """Return the (n, 3) array of the horizontal points moved by the 4x4 transformation"""
+    points3 = np.zeros((len(points), 3))
+    points3[:, 0:2] = np.asarray(points, dtype=float).reshape(len(points), -1)[:, 0:2]
+    return points3 @ transformation[0:3, 0:3].T + transformation[0:3, 3]
+
+
+def plot_compare(source_points, target_points, reg_p2p, k1, k2, clock):
+    """Save a plot of the correspondence"""
+    # The Figure API does not use the global state of pyplot
+    figure = Figure()
+    ax = figure.subplots()
+
+    # Plot invisible points to scale the axes
+    ax.axis('equal')
+    ax.plot(1000, 1000, marker=' ')
+    ax.plot(-1000, -1000, marker=' ')
+
+    # Plot the robot at coordinates (0, 0)
+    ax.scatter(0, 0, s=1000, color='darkSlateBlue')
+
+    # Plot the robot translated by the transformation
+    ax.scatter(reg_p2p.transformation[0, 3], reg_p2p.transformation[1, 3], s=1000, color='lightSteelBlue')
+
+    # Plot the source points
+    ax.scatter(source_points[:, 0], source_points[:, 1], c='sienna', label=f"Place {k1}")
+
+    # Plot the segments from source points to target points
+    for idx in np.asarray(reg_p2p.correspondence_set):
+        i, j = idx
+        ax.plot([source_points[i, 0], target_points[j, 0]],[source_points[i, 1], target_points[j, 1]], c='k')
+
+    # Plot the transformed source points
+    source_points_transformed = apply_transformation(np.array(source_points, dtype=int), reg_p2p.transformation)
+    ax.scatter(source_points_transformed[:, 0], source_points_transformed[:, 1], c='sienna', marker="^",
+               label=f"{k1} moved to {k2}")
+
+    # Plot the target points in light sienna in the forefront
+    ax.scatter(target_points[:, 0], target_points[:, 1], c='#ffb366', label=f"Place {k2}")
+
+    # Plot the axis and legends
+    ax.legend()
+    ax.set_xlabel('West - East')
+    ax.set_ylabel('South - North')
+    distance = np.linalg.norm(reg_p2p.transformation[:3, 3])
+    ax.set_title(f"{k1} to {k2}. Dist: {distance:.0f}. Fitness: {reg_p2p.fitness:.2f}. RMSE: {reg_p2p.inlier_rmse:.0f}")
+
+    # Save the plot
+    try:
+        figure.savefig(f"log/01_{clock}_compare_{k1}_{k2}.pdf")
+    except PermissionError:
+        print("Permission denied")
+
+
+def plot_worker(plot_queue):
+    """Save the plots of the jobs until receiving None"""
+    for job in iter(plot_queue.get, None):
+        try:
+            plot_compare(*job)
+        except Exception as e:
+            print("Error plotting the comparison", e)
+
+
+class PlotWorker:
+    """The process that saves the comparison plots"""
+    is_enabled = PLOT_ENABLED
+    nb_dropped = 0  # The number of plots dropped because the worker fell behind
+    _queue = None
+    _process = None
+
+    @classmethod
+    def start(cls):
+        """Start the plotting process if enabled and not already started"""
+        if not cls.is_enabled or cls._process is not None:
+            return
+        context = multiprocessing.get_context("spawn")
+        cls._queue = context.Queue(PLOT_QUEUE_SIZE)
+        # Do not wait for the queued plots when the program exits
+        cls._queue.cancel_join_thread()
+        cls._process = context.Process(target=plot_worker, args=(cls._queue,), daemon=True)
+        cls._process.start()
+
+    @classmethod
+    def submit(cls, source_points, target_points, reg_p2p, k1, k2, clock):
+        """Queue the plot of the comparison if the process is started. Drop the oldest queued plot if full"""
+        if not cls.is_enabled or cls._process is None:
+            return
+        # The registration result of open3d cannot be pickled
+        result = SimpleNamespace(transformation=np.array(reg_p2p.transformation), fitness=reg_p2p.fitness,
+                                 inlier_rmse=reg_p2p.inlier_rmse,
+                                 correspondence_set=np.asarray(reg_p2p.correspondence_set))
+        job = (np.array(source_points), np.array(target_points), result, k1, k2, clock)
+        while True:
+            try:
+                cls._queue.put_nowait(job)
+                return
+            except queue.Full:
+                try:
+                    cls._queue.get_nowait()
+                    cls.nb_dropped += 1
+                except queue.Empty:
+                    pass
+
+    @classmethod
+    def stop(cls, timeout=None):
+        """Let the plotting process save the queued plots and stop"""
+        if cls._process is not None:
+            cls._queue.put(None)
+            cls._process.join(timeout)
+            cls._process = None
+            cls._queue = None
@@ -4,6 +4,10 @@ MIN_PLACE_CELL_DISTANCE = 200  # 100
 ICP_DISTANCE_THRESHOLD = 100  # 300
 ICP_MIN_POINTS = 3  # Minimum number of matching points to compute the position correction
 ICP_MAX_ROTATION = 10  # Degree max rotation to compute the position correction
+ICP_OPEN3D = False  # Use open3d registration_icp instead of the planar ICP on scipy cKDTree
+PLACE_REGISTRATION_ASYNC = True  # Run the ICP in a worker thread and apply the position correction on a later cycle
+PLOT_ENABLED = True  # Save the plots of the place cell comparisons in the log directory
+PLOT_QUEUE_SIZE = 4  # Max number of plots waiting for the plot worker. The oldest is dropped when full
 ANGULAR_RESOLUTION = 1  # Degree
 CONE_HALF_ANGLE = 20  # 25
 
@@ -1,6 +1,10 @@
 GRID_WIDTH = 50  # 15   # 100 Number of cells wide
 GRID_HEIGHT = 50  # 70  # 45  # 200 Number of cells high
 CELL_RADIUS = 50  # (mm) Radius of the outer circle
+GRID_TILED = False  # Use a sparse grid of tiles allocated on demand instead of the wrapped GRID_WIDTH x GRID_HEIGHT grid
+GRID_TILE_SIZE = 16  # Number of cells wide and high of the tiles of the sparse grid
+GRID_TILED_EXTENT = 2000  # Max number of cells from the origin in each direction of the sparse grid (100 m)
+POOL_LEVELS = 3  # Number of levels of aperture-7 pooling above the grid (level 3 pools are about 1 m wide)
 
 EMOTION_CONTENT = 1  # White. Serotonin: relaxation, contentment, well-being.
 EMOTION_PLEASURE = 2  # Green. Dopamine: reward, motivation.
@@ -9,4 +13,7 @@ EMOTION_VIGILANCE = 4  # Red. Noradrenaline: fight-or-flight response, arousal,
 EMOTION_UPSET = 5  # Orange (Can't arrange an object from where the robot is)
 
 EXPERIENCE_DURABILITY = 10
+EXPERIENCE_BUDGET = 2000  # Max number of experiences kept in egocentric memory
+RUNNING_WINDOW_AZIMUTH = 100  # Number of cycles of azimuth experiences used to calibrate the compass
+EXPERIENCE_ANCHORED = False  # Store the experiences in a fixed frame and project them in egocentric frame when read
 PLACE_GRID_DURABILITY = 30
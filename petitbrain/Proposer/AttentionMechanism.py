@@ -4,7 +4,7 @@
 
 import numpy as np
 from ..Memory.AllocentricMemory import CLOCK_PLACE
-from ..Memory.AllocentricMemory.Geometry import point_to_cell
+from ..Memory.AllocentricMemory.Geometry import points_to_cells
 from ..Proposer.Interaction import OUTCOME_LOST_FOCUS, OUTCOME_FLOOR
 from ..Memory.BodyMemory import NORADRENALINE
 from ..Memory.EgocentricMemory.Experience import EXPERIENCE_FLOOR, EXPERIENCE_ALIGNED_ECHO
@@ -57,11 +57,10 @@ class AttentionMechanism:
                 # Reuse the last seen focus
                 self.workspace.memory.egocentric_memory.focus_point = self.workspace.memory.allocentric_to_egocentric(self.last_seen_focus)
             left_of_focus = self.workspace.memory.egocentric_memory.focus_point + np.array([0, 80, 0])
-            i, j = point_to_cell(self.workspace.memory.egocentric_to_allocentric(left_of_focus))
-            last_visited_left = self.workspace.memory.allocentric_memory.grid[i, j, CLOCK_PLACE]
             right_of_focus = self.workspace.memory.egocentric_memory.focus_point + np.array([0, -80, 0])
-            i, j = point_to_cell(self.workspace.memory.egocentric_to_allocentric(right_of_focus))
-            last_visited_right = self.workspace.memory.allocentric_memory.grid[i, j, CLOCK_PLACE]
+            i, j = points_to_cells([self.workspace.memory.egocentric_to_allocentric(left_of_focus),
+                                    self.workspace.memory.egocentric_to_allocentric(right_of_focus)])
+            last_visited_left, last_visited_right = self.workspace.memory.allocentric_memory.grid[i, j, CLOCK_PLACE]
             print(f"Searching left {last_visited_left}, right {last_visited_right}")
             if last_visited_left < last_visited_right:
                 # focus = self.workspace.memory.egocentric_memory.focus_point + np.array([0, 80, 0])
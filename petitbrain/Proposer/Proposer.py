@@ -31,7 +31,7 @@ class Proposer:
         """Return a proposed interaction"""
         if self.workspace.enaction is None:
             i0 = self.workspace.primitive_interactions[(ACTION_FORWARD, OUTCOME_PROMPT)]
-            e = Enaction(i0, self.workspace.memory.save())
+            e = Enaction(i0, self.workspace.memory.save(is_prediction=True))
             return CompositeEnaction([e], 'Default', np.array([0.5, 0, 0]))
         return self.select_enaction(self.workspace.enaction)
 
@@ -40,7 +40,7 @@ class Proposer:
 
         # Call the sequence learning mechanism to select the next action
         action = self.select_action(enaction)
-        e_memory = self.workspace.memory.save()
+        e_memory = self.workspace.memory.save(is_prediction=True)
         # e_memory.emotion_code = EMOTION_PLEASURE
         span = 40
 
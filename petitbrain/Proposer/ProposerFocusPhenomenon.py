@@ -22,7 +22,7 @@ class ProposerFocusPhenomenon(Proposer):
             print("No focus phenomenon id")
             return None
 
-        e_memory = self.workspace.memory.save()
+        e_memory = self.workspace.memory.save(is_prediction=True)
         # If focus at a dot phenomenon
         p = self.workspace.memory.phenomenon_memory.phenomena[p_id]
         if p.phenomenon_type in [EXPERIENCE_FLOOR, EXPERIENCE_ALIGNED_ECHO]:
@@ -19,7 +19,7 @@ class ProposerPlaceCell(Proposer):
     def propose_enaction(self):
         """Propose enaction to generate the place cell graph"""
 
-        e_memory = self.workspace.memory.save()
+        e_memory = self.workspace.memory.save(is_prediction=True)
         emotion_mask = np.array([1, 0, 0])
 
         # If outcome floor then turn around (for Bordeaux)
@@ -35,7 +35,7 @@ class ProposerPlayFlower(Proposer):
         if p_id is None:
             return None
 
-        e_memory = self.workspace.memory.save()
+        e_memory = self.workspace.memory.save(is_prediction=True)
         # If focus at a dot phenomenon
         p = self.workspace.memory.phenomenon_memory.phenomena[p_id]
         if p.phenomenon_type == EXPERIENCE_FLOOR:
@@ -40,7 +40,7 @@ class ProposerPlayForward(Proposer):
 
     def select_enaction(self, enaction):
         """Add the next enaction to the stack based on sequence learning and spatial modifiers"""
-        e_memory = self.workspace.memory.save()
+        e_memory = self.workspace.memory.save(is_prediction=True)
         # e_memory.emotion_code = EMOTION_CONTENT
 
         # Withdraw step
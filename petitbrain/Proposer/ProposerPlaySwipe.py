@@ -38,7 +38,7 @@ class ProposerPlaySwipe(Proposer):
 
     def select_enaction(self, enaction):
         """Add the next enaction to the stack based on sequence learning and spatial modifiers"""
-        e_memory = self.workspace.memory.save()
+        e_memory = self.workspace.memory.save(is_prediction=True)
         # e_memory.emotion_code = EMOTION_CONTENT
 
         # Withdraw step
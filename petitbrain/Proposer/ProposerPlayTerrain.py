@@ -39,7 +39,7 @@ class ProposerPlayTerrain(Proposer):
         if self.workspace.memory.phenomenon_memory.terrain_confidence() < PHENOMENON_ENCLOSED_CONFIDENCE:
             return None
 
-        e_memory = self.workspace.memory.save()
+        e_memory = self.workspace.memory.save(is_prediction=True)
         # e_memory.emotion_code = EMOTION_CONTENT
 
         # If the robot is at the center of the terrain
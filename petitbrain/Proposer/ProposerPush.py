@@ -35,7 +35,7 @@ class ProposerPush(Proposer):
         """Add the next enaction to the stack based on sequence learning and spatial modifiers"""
         enaction = self.workspace.enaction
 
-        e_memory = self.workspace.memory.save()
+        e_memory = self.workspace.memory.save(is_prediction=True)
         # e_memory.emotion_code = EMOTION_VIGILANCE
 
         # If there is an object to push
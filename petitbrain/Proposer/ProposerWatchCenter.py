@@ -32,7 +32,7 @@ class ProposerWatchCenter(Proposer):
         ego_arrange_point = self.workspace.memory.terrain_centric_to_egocentric(
             self.workspace.memory.phenomenon_memory.arrange_point())
 
-        e_memory = self.workspace.memory.save()
+        e_memory = self.workspace.memory.save(is_prediction=True)
         # e_memory.emotion_code = EMOTION_SAD
 
         # If far from watch point then go to watch point
@@ -25,7 +25,8 @@ class Enaction:
 
         # Generate the predicted memory and the predicted outcome
         self.predicted_memory.clock += 1
-        self.predicted_outcome, self.predicted_outcome_code = generate_prediction(self.command, self.predicted_memory)
+        self.predicted_outcome, self.predicted_outcome_code, _ = generate_prediction(self.command,
+                                                                                     self.predicted_memory)
 
         # The key used for hash
         self.key = (self.action.action_code, self.predicted_outcome_code)
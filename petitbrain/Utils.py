@@ -17,6 +17,14 @@ def translation_quaternion_to_matrix(translation, quaternion):
     return Matrix44.from_inverse_of_quaternion(quaternion) * Matrix44.from_translation(translation)
 
 
+def rotate_points(quaternion, points):
+    """Rotate the points (N, 3) by the quaternion like quaternion.apply_to_vector() applied to each point"""
+    # q v q* expanded for the vector part u of the quaternion and its scalar part w
+    u, w = np.asarray(quaternion[0:3], dtype=float), float(quaternion[3])
+    points = np.asarray(points, dtype=float)
+    return (w * w - u @ u) * points + 2 * np.outer(points @ u, u) + 2 * w * np.cross(u, points)
+
+
 def azimuth_to_quaternion(azimuth):
     """Return the quaternion representing this azimuth from north in degrees"""
     return Quaternion.from_z_rotation(math.radians(90 - azimuth))  # Wouldn't work with type int
@@ -4,6 +4,7 @@ import structlog
 from .Proposer.Action import create_actions, ACTION_FORWARD, ACTIONS, ACTION_TURN, ACTION_BACKWARD
 from .Memory.Memory import Memory
 from .Memory.PhenomenonMemory import TERRAIN_ORIGIN_CONFIDENCE
+from .Memory.PhenomenonMemory.PhenomenonMemory import TER
 from .Robot.Enaction import Enaction
 from .Robot.Command import DIRECTION_BACK
 from .Robot.Message import Message
@@ -88,20 +89,22 @@ class Workspace:
             if self.composite_enaction is None:
             # if self.enacter.interaction_step == ENACTION_STEP_IDLE:
                 i0 = self.primitive_interactions[(user_key.upper(), OUTCOME_PROMPT)]
-                self.composite_enaction = CompositeEnaction(None, 'Manual', np.array([1, 1, 1]), [i0], self.memory.save())
+                self.composite_enaction = CompositeEnaction(None, 'Manual', np.array([1, 1, 1]), [i0],
+                                                            self.memory.save(is_prediction=True))
         elif user_key.upper() == "/":
             # If key ALIGN then turn and move forward to the prompt
             if self.composite_enaction is None:
             # if self.enacter.interaction_step == ENACTION_STEP_IDLE:
                 self.composite_enaction = CompositeEnaction(None, 'Manual', np.array([1, 1, 1]),
-                                                            self.sequence_interactions["TF-P"], self.memory.save())
+                                                            self.sequence_interactions["TF-P"],
+                                                            self.memory.save(is_prediction=True))
         elif user_key.upper() == ":" and self.memory.egocentric_memory.focus_point is not None:
             # If key ALIGN BACK then turn back and move backward to the prompt
             if self.composite_enaction is None:
             # if self.enacter.interaction_step == ENACTION_STEP_IDLE:
                 # The first enaction: turn the back to the prompt
                 i0 = self.primitive_interactions[(ACTION_TURN, OUTCOME_PROMPT)]
-                e0 = Enaction(i0, self.memory.save(), direction=DIRECTION_BACK)
+                e0 = Enaction(i0, self.memory.save(is_prediction=True), direction=DIRECTION_BACK)
                 # Second enaction: move forward to the prompt
                 i1 = self.primitive_interactions[(ACTION_BACKWARD, OUTCOME_PROMPT)]
                 e1 = Enaction(i1, e0.predicted_memory.save())
@@ -135,7 +138,7 @@ class Workspace:
             self.memory = self.enacter.memory_snapshot
             self.memory.body_memory.neurotransmitters[:] = neurotransmitter_point
             if self.memory.phenomenon_memory.terrain() is not None:
-                self.memory.phenomenon_memory.terrain().confidence = confidence
+                self.memory.phenomenon_memory.own_phenomenon(TER).confidence = confidence
             self.enacter.interaction_step = ENACTION_STEP_RENDERING
             # TODO: prevent a crash when the enaction has been cleared and then an outcome is received after
         elif user_key.upper() == KEY_PREDICTION_ERROR:
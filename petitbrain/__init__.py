@@ -1,7 +1,18 @@
-from .Flock import Flock
-from .Workspace import Workspace
-from .Proposer.Decider import Decider
-from .Display.EgocentricDisplay.CtrlEgocentricView import CtrlEgocentricView
-from .Display.AllocentricDisplay.CtrlAllocentricView import CtrlAllocentricView
-from .Display.BodyDisplay.CtrlBodyView import CtrlBodyView
-from .Display.PhenomenonDisplay.CtrlPhenomenonView import CtrlPhenomenonView
+import importlib
+
+# The GUI classes are imported on first access so that the worker processes spawned from the package
+# (plots, rollouts) do not import pyglet and open a window
+_LAZY_IMPORTS = {"Flock": ".Flock",
+                 "Workspace": ".Workspace",
+                 "Decider": ".Proposer.Decider",
+                 "CtrlEgocentricView": ".Display.EgocentricDisplay.CtrlEgocentricView",
+                 "CtrlAllocentricView": ".Display.AllocentricDisplay.CtrlAllocentricView",
+                 "CtrlBodyView": ".Display.BodyDisplay.CtrlBodyView",
+                 "CtrlPhenomenonView": ".Display.PhenomenonDisplay.CtrlPhenomenonView"}
+
+
+def __getattr__(name):
+    """Import the GUI class from its module when it is first accessed"""
+    if name in _LAZY_IMPORTS:
+        return getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,8 +1,35 @@
+import pickle
+import threading
+import matplotlib.path as mpath
 import numpy as np
 import pytest
+from types import SimpleNamespace
+from pyrr import Matrix44, Quaternion
+from petitbrain.Memory.Memory import Memory
+from petitbrain.Display.AllocentricDisplay.CtrlAllocentricView import CtrlAllocentricView
 from petitbrain.Memory.AllocentricMemory.AllocentricMemory import AllocentricMemory
-from petitbrain.Memory.AllocentricMemory.Geometry import cell_to_point
-from petitbrain.Memory import CELL_RADIUS
+from petitbrain.Memory.AllocentricMemory.Geometry import cell_to_point, point_to_cell, points_to_cells
+from petitbrain.Memory.AllocentricMemory.PoolPyramid import PoolPyramid, POOL_FLOOR, POOL_KNOWN, POOL_MAX_CLOCK
+from petitbrain.Memory import CELL_RADIUS, GRID_WIDTH, GRID_HEIGHT
+from petitbrain.Memory.AllocentricMemory import STATUS_FLOOR, STATUS_2, STATUS_4, CLOCK_NO_ECHO, POINT_X, POINT_Y, \
+    CLOCK_UPDATED
+from petitbrain.Memory.PhenomenonMemory.Phenomenon import Phenomenon
+from petitbrain.Memory.PhenomenonMemory.PhenomenonMemory import TER, PhenomenonMemory
+from petitbrain.Memory.PhenomenonMemory.PhenomenonIndex import PhenomenonIndex
+from petitbrain.Memory.PhenomenonMemory.PhenomenonObject import PhenomenonObject
+from petitbrain.Memory.PhenomenonMemory.PhenomenonDot import PhenomenonDot
+from petitbrain.Memory.PhenomenonMemory.Affordance import Affordance
+from petitbrain.Memory.PlaceMemory.PlaceRegistration import Registration, REGISTRATION_SCAN
+from petitbrain.Enaction.Predict import x_intersection, y_intersection, x_intersections, y_intersections
+from petitbrain.Enaction.WhatIf import predict_candidates
+from petitbrain.Enaction.Rollout import RolloutEngine, imagine
+from petitbrain.Robot.Enaction import Enaction
+from petitbrain.Robot.Command import DIRECTION_FRONT, DIRECTION_BACK
+from petitbrain.Memory.EgocentricMemory.Experience import EXPERIENCE_FLOOR, EXPERIENCE_PLACE, EXPERIENCE_ALIGNED_ECHO, \
+    EXPERIENCE_NORTH, Experience, ExperienceStore
+from petitbrain.Memory.EgocentricMemory.EgocentricMemory import EgocentricMemory
+from petitbrain.Memory import RUNNING_WINDOW_AZIMUTH
+from petitbrain.Robot.RobotDefine import ROBOT_FLOOR_SENSOR_X
 
 # Testing Allocentric Memory
 # py -m autocat.Memory.AllocentricMemory
@@ -27,6 +54,21 @@ def test_cell_to_point():
     np.testing.assert_allclose(result, expected)
 
 
+def test_points_to_cells():
+    """Test that the batch conversions give the same cells and points as the conversions of single points"""
+    rng = np.random.default_rng(0)
+    centers = cell_to_point(*(np.indices((9, 9)) - 4)).reshape(-1, 2)
+    # Include the points at equal distance of two cell centers
+    points = np.concatenate((rng.uniform(-3000, 3000, (500, 2)), (centers + cell_to_point(1, 0)) / 2,
+                             (centers + cell_to_point(0, 1)) / 2, cell_to_point([3, -7], [2, 1])))
+    cell_i, cell_j = points_to_cells(points)
+    assert [point_to_cell(p) for p in points] == list(zip(cell_i.tolist(), cell_j.tolist()))
+    cell_i, cell_j = points_to_cells(points, wrap=False)
+    assert [point_to_cell(p, wrap=False) for p in points] == list(zip(cell_i.tolist(), cell_j.tolist()))
+    assert list(zip(cell_i[-2:].tolist(), cell_j[-2:].tolist())) == [(3, 2), (-7, 1)]
+    np.testing.assert_allclose(cell_to_point(cell_i, cell_j)[-2:], points[-2:])
+
+
 def test_calculate_forward_pe(workspace_fixture):
     result = workspace_fixture.memory.body_memory.get_body_direction_normalized()
     np.testing.assert_allclose(np.array(result), np.array([0.8660254, 0.5, 0.]))
@@ -45,3 +87,486 @@ def forward_fixture(workspace_fixture):
     workspace_fixture.memory.place_memory.place_cells[2].point = np.array([400, 0, 0])
     workspace_fixture.memory.place_memory.position_pe = np.array([30, 0, 0])
     return workspace_fixture
+
+
+def test_memory_snapshot_copy_on_write(workspace_fixture):
+    """Test that modifying a memory snapshot does not modify the original memory"""
+    memory = workspace_fixture.memory
+    snapshot = memory.save()
+    points = {k: e.point() for k, e in memory.egocentric_memory.experiences.items()}
+    snapshot.allocentric_memory.apply_status_to_cell(0, 3, EXPERIENCE_FLOOR, memory.clock, 0)
+    snapshot.egocentric_memory.displace_experiences(Matrix44.from_translation([100, 0, 0]))
+    snapshot.place_memory.own_place_cell(1).position_confidence = 0
+    assert snapshot.allocentric_memory.grid[0, 3, STATUS_FLOOR] == EXPERIENCE_FLOOR
+    assert memory.allocentric_memory.grid[0, 3, STATUS_FLOOR] != EXPERIENCE_FLOOR
+    assert memory.place_memory.place_cells[1].position_confidence == 100
+    for k, e in memory.egocentric_memory.experiences.items():
+        np.testing.assert_allclose(e.point(), points[k])
+        assert not np.allclose(snapshot.egocentric_memory.experiences[k].point(), points[k])
+
+
+def test_memory_snapshot_pending_registration(workspace_fixture, monkeypatch):
+    """Test that the live memory snapshot keeps the pending registration and that the prediction snapshot does not"""
+    is_estimated = threading.Event()
+    monkeypatch.setattr(Registration, "estimate", lambda self: is_estimated.wait() and np.array([100., 50., 0.]))
+    adjusted_cells = []
+    monkeypatch.setattr(Memory, "adjust_robot_position", lambda self, cell, previous_cell: adjusted_cells.append(
+        (self, self.place_memory.position_pe.copy())))
+    memory = workspace_fixture.memory
+    place_memory = memory.place_memory
+    assert place_memory.is_asynchronous
+    memory.allocentric_memory.robot_point[:] = [120, 40, 0]
+    place_memory.register(Registration(REGISTRATION_SCAN, place_memory.place_cells[1], None, memory.clock,
+                                       np.zeros((3, 3)), memory.allocentric_memory.robot_point), memory)
+    # The prediction snapshot registers synchronously
+    prediction = memory.save(is_prediction=True)
+    assert not prediction.place_memory.is_asynchronous and prediction.place_memory.registrations == []
+    # The Enacter takes the live snapshot then swaps it in while the registration is running
+    memory_snapshot = memory.save()
+    workspace_fixture.memory = memory_snapshot
+    snapshot = workspace_fixture.memory
+    assert snapshot.place_memory.is_asynchronous
+    assert snapshot.place_memory.registration_executor is place_memory.registration_executor
+    assert len(snapshot.place_memory.registrations) == 1
+    # The pending registration is not pickled
+    unpickled = pickle.loads(pickle.dumps(snapshot))
+    assert unpickled.place_memory.registrations == [] and unpickled.place_memory.registration_executor is None
+    # The robot moves in the swapped memory
+    snapshot.allocentric_memory.robot_point += [300, 0, 0]
+    snapshot.place_memory.record_motion(np.array([300., 0., 0.]))
+    is_estimated.set()
+    snapshot.place_memory.registrations[0].future.result(timeout=5)
+    snapshot.place_memory.apply_registrations(snapshot)
+    assert snapshot.place_memory.registrations == []
+    assert adjusted_cells[0][0] is snapshot
+    np.testing.assert_allclose(adjusted_cells[0][1], [-20, 10, 0])
+    place_memory.registration_executor.shutdown()
+
+
+def test_memory_snapshot_registration_motion(workspace_fixture, monkeypatch):
+    """Test that the motion recorded in the imagined memory does not move the pending registration of the snapshot"""
+    is_estimated = threading.Event()
+    monkeypatch.setattr(Registration, "estimate", lambda self: is_estimated.wait() and np.array([100., 50., 0.]))
+    memory = workspace_fixture.memory
+    memory.place_memory.register(Registration(REGISTRATION_SCAN, memory.place_memory.place_cells[1], None,
+                                              memory.clock, np.zeros((3, 3)), memory.allocentric_memory.robot_point),
+                                 memory)
+    memory.place_memory.record_motion(np.array([100., 0., 0.]))
+    # The Enacter saves the memory before imagining
+    memory_before_imaginary = memory.save()
+    memory.place_memory.record_motion(np.array([300., 0., 0.]))
+    np.testing.assert_allclose(memory.place_memory.registrations[0].motion, [400, 0, 0])
+    np.testing.assert_allclose(memory_before_imaginary.place_memory.registrations[0].motion, [100, 0, 0])
+    assert memory_before_imaginary.place_memory.registrations[0].future is memory.place_memory.registrations[0].future
+    is_estimated.set()
+    memory.place_memory.registration_executor.shutdown()
+
+
+def test_experience_store():
+    """Test that the batched displacement of the stores gives the same poses as displacing the experiences one by one"""
+    rng = np.random.default_rng(0)
+    store = ExperienceStore(2)
+    experiences = []
+    for k in range(100):
+        experience_type = [EXPERIENCE_FLOOR, EXPERIENCE_PLACE, EXPERIENCE_ALIGNED_ECHO][k % 3]
+        experience = Experience(k, Matrix44.from_translation(rng.integers(-500, 500, 3)), experience_type, k,
+                                Quaternion.from_z_rotation(rng.uniform(-3, 3)), color_index=k % 7)
+        store[experience.id] = experience
+        experiences.append(experience)
+    anchored_store = ExperienceStore(anchored=True)
+    for experience_id, experience in store.items():
+        anchored_store[experience_id] = experience
+    assert len(store) == 100 and 42 in store and store[42].color_index == 42 % 7
+    for k in range(10):
+        displacement_matrix = Matrix44.from_z_rotation(0.3 * k) * Matrix44.from_translation([10, 20 * k, 0])
+        excluded_types = [EXPERIENCE_PLACE] if k % 2 else []
+        experience_types = [EXPERIENCE_FLOOR] if k == 3 else None
+        for experience_store in [store, anchored_store]:
+            experience_store.displace(displacement_matrix, experience_store.type_mask(experience_types, excluded_types))
+        for experience in experiences:
+            if experience.type not in excluded_types and experience.type in (experience_types or [experience.type]):
+                experience.displace(displacement_matrix)
+        if k == 5:
+            # The projections are cached until the next displacement
+            snapshot = anchored_store.copy()
+            np.testing.assert_allclose(snapshot[7].point(), experiences[7].point(), atol=1e-6)
+    for experience in experiences:
+        for experience_store in [store, anchored_store]:
+            np.testing.assert_allclose(experience_store[experience.id].point(), experience.point(), atol=1e-6)
+            np.testing.assert_allclose(experience_store[experience.id].polar_point(), experience.polar_point(),
+                                       atol=1e-6)
+    assert not np.allclose(snapshot[7].point(), experiences[7].point())
+
+
+def test_evict_experiences():
+    """Test that the experiences are evicted by durability, type cap, and budget"""
+    memory = EgocentricMemory(1)
+    for clock in range(300):
+        for experience_type, durability in [(EXPERIENCE_FLOOR, 10), (EXPERIENCE_NORTH, 0)]:
+            memory.experiences[memory.experience_id] = Experience(memory.experience_id, Matrix44.identity(),
+                                                                  experience_type, clock, Quaternion(), durability)
+            memory.experience_id += 1
+        snapshot = memory.save()
+        memory.evict_experiences(clock)
+    clocks = {t: sorted(e.clock for e in memory.experiences.values() if e.type == t)
+              for t in [EXPERIENCE_FLOOR, EXPERIENCE_NORTH]}
+    assert clocks[EXPERIENCE_FLOOR] == list(range(289, 300))
+    # The azimuth experiences are kept for the compass calibration
+    assert clocks[EXPERIENCE_NORTH] == list(range(299 - RUNNING_WINDOW_AZIMUTH, 300))
+    assert memory.eviction_counts["durability"] == 600 - len(memory.experiences)
+    assert len(snapshot.experiences) == len(memory.experiences) + 2
+    memory.evict_experiences(300, budget=50)
+    # The oldest experiences are evicted first
+    assert len(memory.experiences) == 50 and memory.eviction_counts["budget"] == 60
+    assert memory.evicted_type_counts[EXPERIENCE_NORTH] == 260 and memory.evicted_type_counts[EXPERIENCE_FLOOR] == 290
+
+
+def test_experiences_since():
+    """Test that the clock and type indexes give the same experiences as scanning the store"""
+    rng = np.random.default_rng(0)
+    store = ExperienceStore()
+    types = [EXPERIENCE_FLOOR, EXPERIENCE_PLACE, EXPERIENCE_ALIGNED_ECHO, EXPERIENCE_NORTH]
+    for k in range(300):
+        # The last experiences are added out of clock order
+        clock = k // 5 if k < 250 else int(rng.integers(0, 60))
+        store[k] = Experience(k, Matrix44.identity(), types[rng.integers(0, 4)], clock, Quaternion())
+        for experience_types, excluded_types in [(None, ()), ([EXPERIENCE_FLOOR, EXPERIENCE_NORTH], ()),
+                                                 (None, [EXPERIENCE_NORTH])]:
+            for clock in [0, k // 5, 50]:
+                expected = [e.id for e in store.values() if e.clock >= clock and e.type not in excluded_types and
+                            (experience_types is None or e.type in experience_types)]
+                assert [e.id for e in store.since(clock, experience_types, excluded_types)] == expected
+    assert not store.is_clock_sorted and store.subset(np.arange(100)).is_clock_sorted
+
+
+def phenomena_and_affordances(seed):
+    """Return a phenomenon memory with random objects and dots, and random affordances near them"""
+    rng = np.random.default_rng(seed)
+    phenomenon_memory = PhenomenonMemory("0")
+    for k in range(60):
+        point = rng.integers(-3000, 3000, 3) * [1, 1, 0]
+        if k % 3:
+            affordance = Affordance(point, EXPERIENCE_ALIGNED_ECHO, 0, 0, Quaternion.from_z_rotation(rng.uniform(-3, 3)),
+                                    np.array([0, 0, 0]))
+            phenomenon_memory.phenomena[k + 1] = PhenomenonObject(affordance)
+        else:
+            phenomenon_memory.phenomena[k + 1] = PhenomenonDot(Affordance(point, EXPERIENCE_FLOOR, 0, 1, Quaternion(),
+                                                                          np.array([0, 0, 0])))
+    affordances = [Affordance(phenomenon_memory.phenomena[k].point + rng.integers(-400, 400, 3) * [1, 1, 0],
+                              [EXPERIENCE_ALIGNED_ECHO, EXPERIENCE_FLOOR][k % 2], 1, 1,
+                              Quaternion.from_z_rotation(rng.uniform(-3, 3)), np.array([0, 0, 0]))
+                   for k in rng.integers(1, 61, 40)]
+    return phenomenon_memory, affordances
+
+
+def test_phenomenon_index(monkeypatch):
+    """Test that the spatial index attaches the affordances to the same phenomena as trying all the phenomena"""
+    phenomenon_memory, affordances = phenomena_and_affordances(0)
+    remaining, correction = phenomenon_memory.update_phenomena(affordances)
+    # Try all the phenomena in the order of the phenomena dict
+    monkeypatch.setattr(PhenomenonIndex, "candidates", lambda index, point: sorted(index.ranks, key=index.ranks.get))
+    all_phenomenon_memory, all_affordances = phenomena_and_affordances(0)
+    all_remaining, all_correction = all_phenomenon_memory.update_phenomena(all_affordances)
+    assert 0 < len(remaining) < len(affordances)
+    assert [affordances.index(a) for a in remaining] == [all_affordances.index(a) for a in all_remaining]
+    np.testing.assert_array_equal(correction, all_correction)
+    for k, phenomenon in phenomenon_memory.phenomena.items():
+        assert list(phenomenon.affordances) == list(all_phenomenon_memory.phenomena[k].affordances)
+
+
+def test_terrain_intersections(workspace_fixture):
+    """Test that the vectorized terrain transform and intersections match the computation point by point"""
+    memory = workspace_fixture.memory
+    terrain = Phenomenon(SimpleNamespace(point=np.array([150, -320, 0]), clock=0))
+    terrain.shape = memory.phenomenon_memory.phenomenon_categories[TER].shape.copy()
+    terrain.confidence = 100
+    memory.phenomenon_memory.phenomena[TER] = terrain
+    memory.allocentric_memory.robot_point = np.array([400, 120, 0])
+    ego_shape = memory.terrain_centric_to_egocentric_points(terrain.shape)
+    np.testing.assert_allclose(ego_shape, np.apply_along_axis(memory.terrain_centric_to_egocentric, 1, terrain.shape),
+                               atol=1e-6)
+    rng = np.random.default_rng(0)
+    # Random polylines with vertical and horizontal segments and vertices on the axes
+    for points in [ego_shape, ego_shape - [ROBOT_FLOOR_SENSOR_X, 0, 0]] + \
+                  [rng.integers(-3, 4, (30, 3)) * 100. for _ in range(20)]:
+        expected = [x_intersection([points[i], points[i + 1]]) for i in np.where(np.diff(np.sign(points[:, 1])))[0]]
+        expected = [e for e in expected if e is not None]
+        np.testing.assert_allclose(x_intersections(points), np.array(expected).reshape(-1, 2))
+        expected = [y_intersection([points[i], points[i + 1]]) for i in np.where(np.diff(np.sign(points[:, 0])))[0]]
+        np.testing.assert_allclose(y_intersections(points), [e for e in expected if e is not None])
+
+
+def test_predict_candidates(workspace_fixture):
+    """Test that the batch prediction gives the predictions of the enactions and does not modify memory"""
+    memory = workspace_fixture.memory
+    terrain = Phenomenon(SimpleNamespace(point=np.array([150, -320, 0]), clock=0))
+    terrain.shape = memory.phenomenon_memory.phenomenon_categories[TER].shape.copy()
+    terrain.set_path()
+    terrain.confidence = 100
+    memory.phenomenon_memory.phenomena[TER] = terrain
+    memory.allocentric_memory.robot_point = np.array([400, 120, 0], dtype=float)
+    memory.egocentric_memory.prompt_point = np.array([50, 50, 0])
+    candidates = [(workspace_fixture.actions[code], prompt, direction, 40) for code in '82461-'
+                  for prompt in [None, [300, -200, 0], [-600, 700, 0]] for direction in [DIRECTION_FRONT, DIRECTION_BACK]]
+    grid, clock = np.asarray(memory.allocentric_memory.grid).copy(), memory.clock
+    what_ifs = predict_candidates(memory, candidates)
+    np.testing.assert_array_equal(np.asarray(memory.allocentric_memory.grid), grid)
+    np.testing.assert_array_equal(memory.allocentric_memory.robot_point, [400, 120, 0])
+    np.testing.assert_array_equal(memory.egocentric_memory.prompt_point, [50, 50, 0])
+    assert memory.clock == clock
+    assert any(what_if.predicted_outcome.floor > 0 for what_if in what_ifs)
+    for (action, prompt, direction, span), what_if in zip(candidates, what_ifs):
+        e_memory = memory.save()
+        e_memory.egocentric_memory.prompt_point = None if prompt is None else np.array(prompt)
+        enaction = Enaction(SimpleNamespace(action=action), e_memory, direction, span)
+        assert what_if.key == enaction.key
+        assert str(what_if.predicted_outcome) == str(enaction.predicted_outcome)
+        np.testing.assert_allclose(np.array(what_if.trajectory.body_quaternion),
+                                   np.array(e_memory.body_memory.body_quaternion))
+
+
+def test_rollout_engine(workspace_fixture):
+    """Test that the plans enacted in the worker processes give the same rollouts as in this process"""
+    memory = workspace_fixture.memory
+    actions = workspace_fixture.actions
+    plans = [[(actions['8'], None, DIRECTION_FRONT, 40), (actions['1'], [-100, 0, 0], DIRECTION_FRONT, 40)],
+             [(actions['-'], None, DIRECTION_FRONT, 40), (actions['4'], [0, 200, 0], DIRECTION_FRONT, 40),
+              (actions['2'], [-200, 0, 0], DIRECTION_FRONT, 40)],
+             []]
+    clock, robot_point = memory.clock, memory.allocentric_memory.robot_point.copy()
+    engine = RolloutEngine(2)
+    try:
+        rollouts = engine.evaluate(memory, plans, 60)
+    finally:
+        engine.shutdown()
+    assert memory.clock == clock
+    np.testing.assert_array_equal(memory.allocentric_memory.robot_point, robot_point)
+    for plan, rollout in zip(plans, rollouts):
+        expected = imagine(memory.save(is_prediction=True), plan)
+        assert rollout.keys == expected.keys and len(rollout.keys) == len(plan)
+        np.testing.assert_allclose(rollout.robot_point, expected.robot_point)
+        assert rollout.score(workspace_fixture.primitive_interactions) == \
+            sum(workspace_fixture.primitive_interactions[(a, o)].valence for a, _, o in expected.keys)
+
+
+def test_apply_status_to_cells():
+    """Test that applying a batch of statuses gives the same grid as applying them one by one"""
+    rng = np.random.default_rng(0)
+    cell_i = rng.integers(-5, 5, 200)
+    cell_j = rng.integers(-5, 5, 200)
+    statuses = rng.choice([EXPERIENCE_FLOOR, EXPERIENCE_PLACE, EXPERIENCE_ALIGNED_ECHO], 200)
+    clocks = rng.integers(0, 100, 200)
+    color_indexes = rng.integers(0, 7, 200)
+    memory1 = AllocentricMemory(GRID_WIDTH, GRID_HEIGHT, CELL_RADIUS)
+    memory2 = AllocentricMemory(GRID_WIDTH, GRID_HEIGHT, CELL_RADIUS)
+    for k in range(200):
+        memory1.apply_status_to_cell(cell_i[k], cell_j[k], statuses[k], clocks[k], color_indexes[k])
+    snapshot = memory2.save()
+    memory2.apply_status_to_cells(cell_i, cell_j, statuses, clocks, color_indexes)
+    np.testing.assert_array_equal(np.asarray(memory1.grid), np.asarray(memory2.grid))
+    # The snapshot is not modified
+    assert not np.asarray(snapshot.grid)[:, :, CLOCK_UPDATED].any()
+
+
+def test_terrain_mask(workspace_fixture):
+    """Test that the cached terrain mask gives the same answers as the terrain path"""
+    terrain = Phenomenon(SimpleNamespace(point=np.array([0, 0, 0]), clock=0))
+    terrain.shape = workspace_fixture.memory.phenomenon_memory.phenomenon_categories[TER].shape.copy()
+    terrain.set_path()
+    memory = AllocentricMemory(GRID_WIDTH, GRID_HEIGHT, CELL_RADIUS)
+    inside, _ = memory.terrain_mask(terrain)
+    i0, j0 = memory.terrain_mask_origin
+    for i, j in [(0, 0), (3, -2), (-10, 7), (5, 5), (-6, 5)]:
+        assert inside[i - i0, j - j0] == terrain.is_inside(memory.grid[i, j, POINT_X:POINT_Y + 1])
+    rng = np.random.default_rng(0)
+    for point in rng.uniform(-2000, 2000, (300, 3)):
+        assert memory.is_inside_terrain(terrain, point) == terrain.is_inside(point)
+    # The mask is recomputed when the path changes
+    assert memory.terrain_mask(terrain)[0] is inside
+    terrain.set_path()
+    assert memory.terrain_mask(terrain)[0] is not inside
+
+
+def test_floor_distance_field(workspace_fixture):
+    """Test the distance field of the FLOOR cells and terrain outline and the segments traced in it"""
+    terrain = Phenomenon(SimpleNamespace(point=np.array([150, -320, 0]), clock=0))
+    terrain.shape = workspace_fixture.memory.phenomenon_memory.phenomenon_categories[TER].shape.copy()
+    terrain.set_path()
+    memory = AllocentricMemory(GRID_WIDTH, GRID_HEIGHT, CELL_RADIUS)
+    rng = np.random.default_rng(0)
+    memory.apply_status_to_cells(rng.integers(-20, 20, 20), rng.integers(-20, 20, 20),
+                                 np.full(20, EXPERIENCE_FLOOR), np.ones(20, dtype=int), np.zeros(20, dtype=int))
+    field = memory.floor_field(terrain)
+    points = np.asarray(memory.grid)[:, :, POINT_X:POINT_Y + 1].reshape(-1, 2)
+    floor_points = points[np.asarray(memory.grid)[:, :, STATUS_FLOOR].flatten() == EXPERIENCE_FLOOR]
+    expected = np.minimum(np.linalg.norm(points[:, np.newaxis] - floor_points, axis=2).min(axis=1),
+                          terrain.path_distances(points - terrain.point[0:2]))
+    expected[~terrain.contains_points(points - terrain.point[0:2])] *= -1
+    np.testing.assert_allclose(field.distances.flatten(), expected)
+    # The field is rebuilt only when the FLOOR cells or the terrain change
+    memory.apply_status_to_cell(3, 4, EXPERIENCE_PLACE, 2, 0)
+    assert memory.floor_field(terrain) is field and memory.save().floor_field(terrain) is field
+    memory.apply_status_to_cell(3, 4, EXPERIENCE_FLOOR, 3, 0)
+    assert memory.floor_field(terrain) is not field
+    field = memory.floor_field(terrain)
+    # The segments that are clear do not pass over a FLOOR cell nor cross the terrain outline
+    for start, end in rng.uniform(-1500, 1500, (100, 2, 2)):
+        samples = start + np.linspace(0, 1, 200)[:, np.newaxis] * (end - start)
+        cells = [field.cell(p) for p in samples]
+        crossed = any(field.floor[c] for c in cells) or \
+            len(set(terrain.contains_points(samples - terrain.point[0:2]))) > 1
+        if field.free_distance(start, end) == np.inf:
+            assert not crossed
+        first_cell = field.first_floor_cell(start, end)
+        assert first_cell is None or field.floor[first_cell]
+    # A long tick does not jump over a FLOOR cell
+    i, j = point_to_cell(np.array([600, 600, 0]))
+    memory.apply_status_to_cell(i, j, EXPERIENCE_FLOOR, 4, 0)
+    assert memory.floor_field().first_floor_cell([0, 0], [1200, 1200]) == (i, j)
+
+
+def test_mark_echo_areas():
+    """Test that the batch of echo triangles marks the cells whose center is inside a triangle"""
+    triangles = [np.array([[400, 10, 0], [10, 170, 0], [10, -118, 0]]),
+                 np.array([[-300, 500, 0], [-900, 200, 0], [-700, 700, 0]])]
+    affordances = [SimpleNamespace(sensor_triangle=lambda t=t: t, clock=k + 1) for k, t in enumerate(triangles)]
+    memory = AllocentricMemory(GRID_WIDTH, GRID_HEIGHT, CELL_RADIUS)
+    memory.mark_echo_areas(affordances)
+    for k, triangle in enumerate(triangles):
+        path = mpath.Path(triangle[:, 0:2])
+        inside = path.contains_points(memory.grid[:, :, POINT_X:POINT_Y + 1].reshape(-1, 2))
+        assert inside.any()
+        np.testing.assert_array_equal(memory.grid[:, :, CLOCK_NO_ECHO].flatten()[inside], k + 1)
+    assert np.count_nonzero(memory.grid[:, :, STATUS_2]) == np.count_nonzero(memory.grid[:, :, CLOCK_NO_ECHO])
+
+
+def test_hex_grid_copy():
+    """Test that copying the grid copies the compact channels and shares the static channels"""
+    memory = AllocentricMemory(GRID_WIDTH, GRID_HEIGHT, CELL_RADIUS)
+    grid = memory.grid.copy()
+    grid[0, 3, STATUS_FLOOR] = EXPERIENCE_FLOOR
+    assert memory.grid[0, 3, STATUS_FLOOR] != EXPERIENCE_FLOOR
+    assert grid.channels[POINT_X] is memory.grid.channels[POINT_X]
+    assert grid.nbytes * 3 < GRID_WIDTH * GRID_HEIGHT * grid.shape[2] * 8
+    np.testing.assert_array_equal(grid[0, 3, POINT_X:POINT_Y + 1], cell_to_point(np.array([[0]]), np.array([[3]]),
+                                                                                   CELL_RADIUS)[0, 0].astype(int))
+
+
+def test_changed_cells():
+    """Test that the consumers pull only the cells written since their last sync"""
+    memory = AllocentricMemory(GRID_WIDTH, GRID_HEIGHT, CELL_RADIUS)
+    _, _, write_count = memory.changed_cells(-1)
+    memory.apply_status_to_cell(2, -3, EXPERIENCE_FLOOR, 1, 0)
+    memory.update_focus(np.array([300, 0, 0]), 1)
+    changed_i, changed_j, write_count = memory.changed_cells(write_count)
+    assert set(zip(changed_i.tolist(), changed_j.tolist())) == {(2, GRID_HEIGHT - 3), (4, GRID_HEIGHT - 2)}
+    assert len(memory.changed_cells(write_count)[0]) == 0
+    # The snapshot diff does not include the writes of the original memory
+    snapshot = memory.save()
+    memory.clear_cell(0, 0, 2)
+    snapshot.apply_status_to_cell(1, 1, EXPERIENCE_FLOOR, 2, 0)
+    changed_i, changed_j, _ = snapshot.changed_cells(write_count)
+    assert set(zip(changed_i.tolist(), changed_j.tolist())) == {(1, 1)}
+
+
+def test_allocentric_view_snapshot_swap():
+    """Test that the view refreshes only the cells written since the snapshot when the memory is swapped"""
+    memory = Memory("0", "1")
+    memory.clock = 100
+    memory.allocentric_memory.apply_status_to_cell(2, 3, EXPERIENCE_FLOOR, 0, 0)
+    updated_cells = []
+    ctrl_view = CtrlAllocentricView.__new__(CtrlAllocentricView)
+    ctrl_view.workspace = SimpleNamespace(memory=memory)
+    ctrl_view.view = SimpleNamespace(update_hexagon=lambda i, j, cell, clock: updated_cells.append((i, j)))
+    ctrl_view.synced_memory = None
+    ctrl_view.synced_write_count = -1
+    ctrl_view.recent_cells = set()
+    ctrl_view.update_view()
+    assert len(updated_cells) == GRID_WIDTH * GRID_HEIGHT
+    # The Enacter swaps in the snapshot after the live memory has shown the prompt
+    snapshot = memory.save()
+    memory.allocentric_memory.apply_status_to_cell(4, 5, EXPERIENCE_PLACE, 0, 0)
+    ctrl_view.workspace.memory = snapshot
+    snapshot.allocentric_memory.apply_status_to_cell(1, 1, EXPERIENCE_FLOOR, 0, 0)
+    updated_cells.clear()
+    ctrl_view.update_view()
+    assert set(updated_cells) == {(4, 5), (1, 1)}
+    # A new memory refreshes the cells written in the replaced memory
+    ctrl_view.workspace.memory = Memory("0", "1")
+    ctrl_view.workspace.memory.clock = 100
+    updated_cells.clear()
+    ctrl_view.update_view()
+    assert set(updated_cells) == {(2, 3), (1, 1)}
+
+
+def test_tiled_memory():
+    """Test that the tiled memory allocates only the tiles that are written and does not wrap around"""
+    memory = AllocentricMemory(GRID_WIDTH, GRID_HEIGHT, CELL_RADIUS, tiled=True)
+    assert memory.grid[-300, 500, STATUS_FLOOR] == 0
+    memory.apply_status_to_cells(np.array([2, 200, -300]), np.array([-3, 100, 500]),
+                                 np.array([EXPERIENCE_FLOOR] * 3), np.array([1, 2, 3]), np.array([0, 0, 0]))
+    assert len(memory.grid.tiles) == 3
+    assert memory.grid[200, 100, STATUS_FLOOR] == EXPERIENCE_FLOOR
+    assert memory.grid[200 - GRID_WIDTH, 100, STATUS_FLOOR] != EXPERIENCE_FLOOR
+    np.testing.assert_array_equal(memory.grid[200, 100, POINT_X:POINT_Y + 1],
+                                  cell_to_point(np.array([[200]]), np.array([[100]]), CELL_RADIUS)[0, 0].astype(int))
+    changed_i, changed_j, write_count = memory.changed_cells(0)
+    assert set(zip(changed_i.tolist(), changed_j.tolist())) == {(2, -3), (200, 100), (-300, 500)}
+    # The snapshot shares the tiles until they are written
+    snapshot = memory.save()
+    snapshot.apply_status_to_cell(201, 101, EXPERIENCE_PLACE, 4, 0)
+    assert memory.grid[201, 101, STATUS_FLOOR] != EXPERIENCE_PLACE
+    assert snapshot.grid.tiles[(-19, 31)] is memory.grid.tiles[(-19, 31)]
+    # The whole-grid operations only scan the allocated tiles
+    snapshot.clear_grid_status(5)
+    assert len(snapshot.grid.tiles) == 3
+
+
+def test_roll():
+    """Test that rolling the grid moves the origin like np.roll without copying the storage"""
+    memory = AllocentricMemory(GRID_WIDTH, GRID_HEIGHT, CELL_RADIUS)
+    rng = np.random.default_rng(0)
+    memory.apply_status_to_cells(rng.integers(-24, 25, 300), rng.integers(-24, 25, 300),
+                                 np.full(300, EXPERIENCE_FLOOR), rng.integers(1, 100, 300), rng.integers(0, 7, 300))
+    expected = np.asarray(memory.grid)
+    snapshot = memory.save()
+    for point in [np.array([300, 200, 0]), np.array([-1000, 800, 0]), np.array([2000, -600, 0])]:
+        i, j = point_to_cell(point)
+        xy = expected[i, j, POINT_X:POINT_Y + 1].copy()
+        expected = np.roll(expected, (-i, -j), axis=(0, 1))
+        expected[:, :, POINT_X:POINT_Y + 1] -= xy
+        channels = memory.grid.channels
+        memory.roll(point)
+        np.testing.assert_array_equal(np.asarray(memory.grid), expected)
+        # The storage is copied only once because it is shared with the snapshot
+        assert (memory.grid.channels[STATUS_FLOOR] is channels[STATUS_FLOOR]) == (point[0] != 300)
+    np.testing.assert_array_equal(memory.grid[5, -3], expected[5, -3])
+    memory.apply_status_to_cell(5, -3, EXPERIENCE_PLACE, 200, 0)
+    assert memory.grid[5, -3, STATUS_FLOOR] == EXPERIENCE_PLACE
+    changed_i, changed_j, _ = memory.changed_cells(memory.write_count - 1)
+    assert list(zip(changed_i.tolist(), changed_j.tolist())) == [(5, GRID_HEIGHT - 3)]
+    assert snapshot.grid[5, -3, STATUS_FLOOR] != EXPERIENCE_PLACE
+
+
+def test_pool_pyramid():
+    """Test that the pyramid updated from the written cells is the same as the pyramid computed from scratch"""
+    memory = AllocentricMemory(GRID_WIDTH, GRID_HEIGHT, CELL_RADIUS)
+    rng = np.random.default_rng(0)
+    memory.apply_status_to_cells(rng.integers(-24, 26, 300), rng.integers(-24, 26, 300),
+                                 rng.choice([EXPERIENCE_FLOOR, EXPERIENCE_PLACE, EXPERIENCE_ALIGNED_ECHO], 300),
+                                 rng.integers(1, 100, 300), np.zeros(300, dtype=int))
+    assert AllocentricMemory(GRID_WIDTH, GRID_HEIGHT, CELL_RADIUS).pool_summary(np.zeros(3), 3) == (0, 0, 0, 0)
+    i, j = point_to_cell(np.array([300, 200, 0]))
+    memory.apply_status_to_cell(i, j, EXPERIENCE_FLOOR, 120, 0)
+    summary = memory.pool_summary(np.array([300, 200, 0]), 3)
+    assert summary[POOL_MAX_CLOCK] == 120 and summary[POOL_FLOOR] > 0
+    memory.clear_cell(i, j, 130)
+    memory.roll(np.array([400, 300, 0]))
+    memory.pool_summary(np.array([0, 0, 0]), 1)
+    pyramid = PoolPyramid()
+    pyramid.update(memory)
+    assert pyramid.levels == memory.pool_pyramid.levels
+    # Each cell is in one pool of each level
+    nb_known = np.count_nonzero(np.any(np.asarray(memory.grid)[:, :, STATUS_FLOOR:STATUS_4 + 1] != 0, axis=2))
+    for level in pyramid.levels:
+        assert sum(summary[POOL_KNOWN] for summary in level.values()) == nb_known
@@ -1,9 +1,22 @@
 import math
+import multiprocessing
+import threading
 import numpy as np
 import pytest
 from petitbrain.Utils import polar_to_cartesian
+from types import SimpleNamespace
 from petitbrain.Memory.PlaceMemory.PlaceGeometry import transform_estimation_cue_to_cue, plot_compare, unscanned_direction, \
-    open_direction, point_to_polar_array, resample_by_diff
+    open_direction, point_to_polar_array, resample_by_diff, nearby_place_cell, nearest_place_cell
+from petitbrain.Memory.PlaceMemory import PlaceGeometry
+from petitbrain.Memory.PlaceMemory.PlaceMemory import PlaceMemory
+from petitbrain.Memory.PlaceMemory.PlanarICP import registration_icp_2d
+from petitbrain.Memory.PlaceMemory.PlaceRegistration import Registration, REGISTRATION_SCAN
+from petitbrain.Memory.PlaceMemory.PlotWorker import PlotWorker
+from petitbrain.Memory.PlaceMemory.PlaceCell import PlaceCell
+from petitbrain.Memory.PlaceMemory.Cue import Cue
+from petitbrain.Memory.EgocentricMemory.Experience import EXPERIENCE_LOCAL_ECHO, EXPERIENCE_CENTRAL_ECHO
+from petitbrain.Utils import translation_quaternion_to_matrix
+from pyrr import Quaternion
 
 
 def test_polar_to_cartesian():
@@ -32,8 +45,10 @@ def test_point_to_polar_array():
     assert np.mean(result) == pytest.approx(15.713484026367723)
 
 
-def test_transform_estimate():
+def test_transform_estimate(monkeypatch):
     """Test transformation estimation"""
+    pytest.importorskip("open3d")
+    monkeypatch.setattr(PlaceGeometry, "ICP_OPEN3D", True)
     cartesian1 = np.array([[0, -500, 0], [500, 0, 0], [500, 500, 0], [-500, 500, 0]])
     cartesian2 = np.array([[50, -500, 0], [500, 50, 0], [500, 600, 0], [-500, 600, 0]])
     reg_p2p = transform_estimation_cue_to_cue(cartesian1, cartesian2, 100)
@@ -45,6 +60,45 @@ def test_transform_estimate():
     # plot_compare(cartesian1, cartesian2, reg_p2p, 0, 0)
 
 
+
+def test_planar_icp():
+    """Test that the planar ICP gives the same registration as open3d on noisy echoes of a room"""
+    o3d = pytest.importorskip("open3d")
+    rng = np.random.default_rng(1)
+    for k in range(20):
+        # The echoes on the walls of a 3000 x 2000 room seen from the center
+        angles = rng.uniform(-math.pi, math.pi, 40)
+        distances = np.minimum(1500 / np.maximum(np.abs(np.cos(angles)), 1e-9),
+                               1000 / np.maximum(np.abs(np.sin(angles)), 1e-9))
+        points2 = polar_to_cartesian(np.column_stack((distances, angles))) + rng.normal(0, 15, (40, 3)) * [1, 1, 0]
+        # The same echoes seen from a position rotated and translated, partially observed
+        angle = math.radians(rng.uniform(-8, 8))
+        rotation = np.array([[math.cos(angle), -math.sin(angle), 0], [math.sin(angle), math.cos(angle), 0], [0, 0, 1]])
+        translation = np.append(rng.uniform(-150, 150, 2), 0)
+        points1 = ((points2 - translation) @ rotation)[rng.random(40) > 0.2].astype(int)
+        points2 = points2.astype(int)
+        trans_init = np.eye(4)
+        trans_init[0:3, 3] = translation.astype(int) if k % 2 else 0
+        result = registration_icp_2d(points1, points2, 100, trans_init)
+        pcd1 = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(points1))
+        pcd2 = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(points2))
+        expected = o3d.pipelines.registration.registration_icp(
+            pcd1, pcd2, 100, trans_init, o3d.pipelines.registration.TransformationEstimationPointToPoint())
+        # open3d sometimes flips the plane over, the planar ICP cannot
+        if expected.transformation[2, 2] > 0:
+            np.testing.assert_allclose(result.transformation, expected.transformation, atol=1e-6)
+            assert result.fitness == pytest.approx(expected.fitness)
+            assert result.inlier_rmse == pytest.approx(expected.inlier_rmse)
+            assert len(result.correspondence_set) == len(expected.correspondence_set)
+    # The points of test_transform_estimate match without flipping the plane
+    cartesian1 = np.array([[0, -500, 0], [500, 0, 0], [500, 500, 0], [-500, 500, 0]])
+    cartesian2 = np.array([[50, -500, 0], [500, 50, 0], [500, 600, 0], [-500, 600, 0]])
+    result = registration_icp_2d(cartesian1, cartesian2, 100)
+    assert np.array_equal(result.correspondence_set, [[0, 0], [1, 1], [2, 2]])
+    assert result.transformation[2, 2] == 1
+    # No points
+    assert np.array_equal(registration_icp_2d([], cartesian2, 100).transformation, np.eye(4))
+
 @pytest.fixture
 def scan_points_fix():
     points = [[1500, 0],
@@ -91,3 +145,115 @@ def test_open_direction(scan_points_fix):
     assert a == pytest.approx(-1.3846278732488349), "Should be -1.3846278732488349"
     assert min == pytest.approx(-4.188790204786391), "Should be -4.188790204786391"
     assert max == pytest.approx(1.2217304763960306), "Should be 1.2217304763960306"
+
+
+def place_cell(point, is_fully_observed=True, key=0):
+    """Return a minimal place cell at this point"""
+    cell = SimpleNamespace(point=np.array(point, dtype=float), is_fully_observed=lambda: is_fully_observed, key=key)
+    cell.save = lambda: place_cell(cell.point, is_fully_observed, key)
+    return cell
+
+
+def test_place_cell_index():
+    """Test that the indexed place cell queries give the same cells as the linear scan, with deterministic ties"""
+    rng = np.random.default_rng(0)
+    place_memory = PlaceMemory()
+    for k, point in enumerate(rng.integers(-3000, 3000, (300, 3)) // 50 * 50, start=1):
+        place_memory.place_cells[k] = place_cell(point * [1, 1, 0], k % 3 > 0)
+    index = place_memory.indexed_place_cells()
+    for point in np.concatenate((rng.uniform(-3000, 3000, (300, 3)) * [1, 1, 0],
+                                 [place_memory.place_cells[k].point + [25, 25, 0] for k in range(1, 30)])):
+        assert nearby_place_cell(point, place_memory.place_cells, index) == \
+            nearby_place_cell(point, place_memory.place_cells)
+    for k in place_memory.place_cells:
+        assert nearest_place_cell(k, place_memory.place_cells, index) == nearest_place_cell(k, place_memory.place_cells)
+    # Equal distances are won by the smallest id
+    place_memory.place_cells[301] = place_cell([5000, 100, 0])
+    place_memory.place_cells[302] = place_cell([5000, -100, 0])
+    assert nearby_place_cell([5100, 0, 0], place_memory.place_cells, place_memory.indexed_place_cells()) == 301
+    # Moving a place cell in a snapshot moves it in the index of the snapshot only
+    snapshot = place_memory.save()
+    snapshot.move_place_cell(301, np.array([-3000, 0, 0]))
+    assert nearby_place_cell([5100, 0, 0], snapshot.place_cells, snapshot.indexed_place_cells()) == 302
+    assert nearby_place_cell([5100, 0, 0], place_memory.place_cells, place_memory.indexed_place_cells()) == 301
+    assert snapshot.place_cell_index.points[301] == (2000, 100)
+
+
+def test_asynchronous_registration(monkeypatch):
+    """Test that the registration does not block and that its correction compensates the motion since the scan"""
+    is_estimated = threading.Event()
+    # The scan estimates the robot at (100, 50) relative to place cell 2
+    monkeypatch.setattr(Registration, "estimate", lambda self: is_estimated.wait() and np.array([100., 50., 0.]))
+    place_memory = PlaceMemory(True)
+    place_memory.place_cells = {1: place_cell([0, 0, 0], key=1), 2: place_cell([1000, 0, 0], key=2)}
+    adjusted_cells = []
+    memory = SimpleNamespace(allocentric_memory=SimpleNamespace(robot_point=np.array([1120., 40., 0.])),
+                             adjust_robot_position=lambda cell, previous_cell: adjusted_cells.append(
+                                 (cell.key, previous_cell.key, place_memory.position_pe.copy())))
+    place_memory.register(Registration(REGISTRATION_SCAN, place_memory.place_cells[2], place_memory.place_cells[1],
+                                       10, np.zeros((3, 3)), memory.allocentric_memory.robot_point), memory)
+    # The robot moves while the registration is running
+    memory.allocentric_memory.robot_point += [300, 0, 0]
+    place_memory.record_motion(np.array([300., 0., 0.]))
+    place_memory.apply_registrations(memory)
+    assert adjusted_cells == [] and len(place_memory.registrations) == 1
+    # The correction is applied on the next cycle after the registration completes
+    is_estimated.set()
+    place_memory.registrations[0].future.result(timeout=5)
+    place_memory.apply_registrations(memory)
+    assert len(place_memory.registrations) == 0
+    assert adjusted_cells[0][0:2] == (2, 1)
+    np.testing.assert_allclose(adjusted_cells[0][2], [-20, 10, 0])
+    place_memory.registration_executor.shutdown()
+
+
+def test_plot_worker(tmp_path, monkeypatch):
+    """Test that the plot worker saves the plot, can be disabled, and drops the oldest plot when full"""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "log").mkdir()
+    cartesian1 = np.array([[0, -500, 0], [500, 0, 0], [500, 500, 0], [-500, 500, 0]])
+    cartesian2 = np.array([[50, -500, 0], [500, 50, 0], [500, 600, 0], [-500, 600, 0]])
+    result = registration_icp_2d(cartesian1, cartesian2, 100)
+    # Not started
+    PlotWorker.submit(cartesian1, cartesian2, result, "Scan", 2, 6)
+    assert PlotWorker._process is None
+    PlotWorker.start()
+    PlotWorker.submit(cartesian1, cartesian2, result, "Scan", 2, 7)
+    PlotWorker.stop(30)
+    assert (tmp_path / "log" / "01_7_compare_Scan_2.pdf").exists()
+    # Disabled
+    monkeypatch.setattr(PlotWorker, "is_enabled", False)
+    PlotWorker.start()
+    assert PlotWorker._process is None
+    monkeypatch.setattr(PlotWorker, "is_enabled", True)
+    # A worker that falls behind keeps the most recent plots
+    monkeypatch.setattr(PlotWorker, "_process", "busy")
+    monkeypatch.setattr(PlotWorker, "_queue", multiprocessing.Queue(2))
+    monkeypatch.setattr(PlotWorker, "nb_dropped", 0)
+    for clock in range(3):
+        PlotWorker.submit(cartesian1, cartesian2, result, "Scan", 2, clock)
+    assert PlotWorker.nb_dropped == 1
+    assert [PlotWorker._queue.get(timeout=5)[5] for _ in range(2)] == [1, 2]
+
+
+def echo_cue(point):
+    """Return a local echo cue at this point relative to the place cell"""
+    return Cue(0, translation_quaternion_to_matrix(point, Quaternion()), EXPERIENCE_LOCAL_ECHO, 0, 0, [0, 0, 0])
+
+
+def test_incremental_echo_curve():
+    """Test that the incremental echo curve is the max of the polar arrays of all the echo cues"""
+    rng = np.random.default_rng(2)
+    points = np.column_stack((rng.uniform(-1500, 1500, (90, 2)), np.zeros(90)))
+    cell = PlaceCell(1, np.array([0, 0, 0]), [echo_cue(p) for p in points[:30]], 100)
+    cell.compute_echo_curve()
+    for k in range(30, 90, 20):
+        cell.cues.extend(echo_cue(p) for p in points[k:k + 20])
+        cell.compute_echo_curve()
+        expected = np.max([point_to_polar_array(p) for p in points[:k + 20]], axis=0)
+        np.testing.assert_array_equal(cell.polar_echo_curve[:, 0], expected)
+    # A cue that does not raise the curve does not recompute the central echoes
+    central_cues = [c for c in cell.cues if c.type == EXPERIENCE_CENTRAL_ECHO]
+    cell.cues.append(echo_cue([1, 1, 0]))
+    cell.compute_echo_curve()
+    assert [c for c in cell.cues if c.type == EXPERIENCE_CENTRAL_ECHO] == central_cues